@@ -0,0 +1,33 @@
+try:
+    from collections import namedtuple
+except ImportError:
+    from ucollections import namedtuple
+
+CWLAP_PREFIX = b"+CWLAP:("
+# AT+CWLAPOPT print mask: <ecn>, <ssid>, <rssi>, <mac>, <channel>
+CWLAP_MASK = 0x1F
+
+# A tuple per AP, much smaller than a dict or a class instance on MicroPython
+AccessPoint = namedtuple("AccessPoint", ("ssid", "rssi", "bssid", "channel", "ecn"))
+
+
+def parseCWLAP(line):
+    """
+    Parse one '+CWLAP:(<ecn>,"<ssid>",<rssi>,"<mac>",<channel>[,...])' line of a scan with CWLAP_MASK
+
+    Return:
+        AccessPoint with int rssi, channel & ecn, or None if the line is malformed
+    """
+    if not line.startswith(CWLAP_PREFIX):
+        return None
+    ssidStart = line.find(b'"') + 1
+    # The SSID may contain commas, so it ends at the quote before the RSSI
+    ssidEnd = line.find(b'",', ssidStart)
+    if ssidStart == 0 or ssidEnd < 0:
+        return None
+    fields = line[ssidEnd+2:].rstrip(b")").split(b",")
+    try:
+        return AccessPoint(str(line[ssidStart:ssidEnd], "utf-8"), int(fields[0]), str(fields[1].strip(b'"'), "utf-8"),
+                           int(fields[2]), int(line[len(CWLAP_PREFIX):ssidStart-2]))
+    except (IndexError, ValueError, UnicodeError):
+        return None
@@ -0,0 +1,390 @@
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+from esp import UART, Pin, UART_Tx_BUFFER_LENGTH, UART_Rx_BUFFER_LENGTH, ESP_OK_STATUS, ESP_ERROR_STATUS, ESP_FAIL_STATUS, ESP_BUSY_STATUS
+from esp import ESP_TERMINATORS, ESP_PROMPT_TERMINATORS, ESP_SEND_TERMINATORS, ESP_SEND_OK_TERMINATORS, ESP_MQTTPUB_TERMINATORS, ESP_CWJAP_URCS, ESP_MQTTCONN_URCS, ticks_ms, ticks_diff, _decode, _wifiResult
+from httpParser import HttpParser
+from requestBody import RequestBody
+from requestBuilder import RequestBuilder
+from atTokenizer import ATTokenizer, AT_DATA, AT_URC
+from urcDispatcher import URCDispatcher, splitURC
+
+
+class AsyncESP:
+    """
+    This is the asyncio variant of the ESP class.
+    While an AT command is in flight the coroutine awaits the UART stream, so the other tasks (sensor sampling, LEDs, ..)
+    keep running. All the AT traffic goes through one command queue, so the commands of concurrent tasks never interleave.
+
+    Attributes:
+        uartPort (int): The Uart port numbet of the RPI Pico's UART BUS [Default UART0]
+        baudRate (int): UART Baud-Rate for communncating between RPI Pico's & ESP8266 [Default 115200]
+        txPin (init): RPI Pico's Tx pin [Default Pin 0]
+        rxPin (init): RPI Pico's Rx pin [Default Pin 1]
+        urc (URCDispatcher): Receives the unsolicited results (WIFI DISCONNECT, +MQTTSUBRECV, ..), register callbacks or topic queues on it
+    """
+
+    def __init__(self, uartPort=0, baudRate=115200, txPin=(0), rxPin=(1), stream=None):
+        """
+        The constaructor for AsyncESP class
+
+        Parameters:
+            uartPort (int): The Uart port numbet of the RPI Pico's UART BUS [Default UART0]
+            baudRate (int): UART Baud-Rate for communncating between RPI Pico's & ESP8266 [Default 115200]
+            txPin (init): RPI Pico's Tx pin [Default Pin 0]
+            rxPin (init): RPI Pico's Rx pin [Default Pin 1]
+            stream (obj): Ready made stream [write(), async drain(), async readinto()], ex. fakeUart.FakeStream on a PC.
+                          When given, uartPort, baudRate, txPin & rxPin are ignored [Default None]
+        """
+        if stream == None:
+            uartObj = UART(uartPort, baudrate=baudRate, tx=Pin(txPin), rx=Pin(rxPin), txbuf=UART_Tx_BUFFER_LENGTH, rxbuf=UART_Rx_BUFFER_LENGTH)
+            stream = asyncio.StreamReader(uartObj)
+        self.__stream = stream
+        self.__tokenizer = ATTokenizer(UART_Rx_BUFFER_LENGTH)
+        self.__queue = asyncio.Lock()
+        # Reused for every response, see HttpParser.reset()
+        self.__httpResponse = HttpParser()
+        # Reused for every request, see RequestBuilder.httpRequest()
+        self.__builder = RequestBuilder()
+        self.__sendDelay = 5
+        self.urc = URCDispatcher()
+
+    def setDelay(self, delay):
+        """
+        Set the default response timeout (in seconds) of the AT commands [Default 5]
+        """
+        self.__sendDelay = delay
+
+    def _dispatchURC(self, line, reply=()):
+        """
+        Private function for handing over an unsolicited line to the URC dispatcher, +IPD headers & the CONNECT/CLOSED
+        of the request's socket stay with the driver. The URCs starting with a reply prefix aren't kept in the backlog.
+        """
+        if self.__tokenizer.msgLength > 0:
+            # Header of a long +MQTTSUBRECV, its payload follows as AT_DATA events
+            self.urc.beginMessage(line, self.__tokenizer.msgLength)
+        elif not line.startswith(b"+IPD") and line != b"CONNECT" and line != b"CLOSED":
+            self.urc.dispatch(line, reply)
+
+    async def _sendToESP(self, atCMD, delay=None, terminators=ESP_TERMINATORS, dataSink=None, replyURCs=()):
+        """
+        Private function for complete ESP AT command Send/Receive operation, the caller must hold the command queue.
+
+        Parameters:
+            dataSink (HttpParser): Takes the +IPD payload with feed(), the response is complete once feed() returns True [Default None]
+            replyURCs (tuple): Byte prefixes of the URCs answering this command, they only go to the URC callbacks [Default ()]
+
+        Return:
+            Response string, "ESP BUSY\r\n" if ESP is busy or None on timeout
+        """
+        if isinstance(atCMD, str):
+            atCMD = atCMD.encode()
+        self.__stream.write(atCMD)
+        await self.__stream.drain()
+
+        delayTime = self.__sendDelay
+        if delay != None:
+            delayTime = delay
+        startTime = ticks_ms()
+
+        rxLines = list()
+        while True:
+            event = self.__tokenizer.nextEvent()
+            if event == None:
+                timeLeft = delayTime - ticks_diff(ticks_ms(), startTime)/1000
+                if timeLeft <= 0:
+                    return None
+                try:
+                    nbytes = await asyncio.wait_for(self.__stream.readinto(self.__tokenizer.space()), timeLeft)
+                except asyncio.TimeoutError:
+                    return None
+                if nbytes:
+                    self.__tokenizer.commit(nbytes)
+            elif event[0] == AT_DATA:
+                if self.__tokenizer.msgLength > 0:
+                    self.urc.messageData(event[1])
+                elif dataSink != None and dataSink.feed(event[1]):
+                    break
+            elif event[1] in terminators:
+                rxLines.append(event[1])
+                break
+            elif event[0] == AT_URC:
+                self._dispatchURC(event[1], replyURCs)
+            else:
+                rxLines.append(event[1])
+
+        if len(rxLines) > 0 and rxLines[-1] == b"busy p...":
+            return "ESP BUSY\r\n"
+        rxLines.append(b"")
+        return _decode(b"\r\n".join(rxLines))
+
+    async def _command(self, atCMD, delay=None):
+        """
+        Private function for a single queued AT command, which only answers OK/ERROR
+
+        Return:
+            True if ESP answered OK, else False
+        """
+        async with self.__queue:
+            retData = await self._sendToESP(atCMD, delay)
+        if retData != None and ESP_OK_STATUS in retData:
+            return True
+        else:
+            return False
+
+    async def startUP(self):
+        """
+        This funtion use to check the communication with ESP
+
+        Return:
+            True if communication success with the ESP
+            False if unable to communication with the ESP
+        """
+        return await self._command("AT\r\n")
+
+    async def echoING(self, enable=False):
+        """
+        This function use to enable/diable AT command echo [Default set as false for diable Echo]
+
+        Return:
+            True if echo off/on command succefully initiate with the ESP
+            False if echo off/on command failed to initiate with the ESP
+        """
+        if enable==False:
+            return await self._command("ATE0\r\n")
+        else:
+            return await self._command("ATE1\r\n")
+
+    async def setCurrentWiFiMode(self, mode=3):
+        """
+        Set WiFi's current mode [1: STA, 2: SoftAP, 3: SoftAP+STA(default)]
+
+        Return:
+            True on successfully set the current wifi mode
+            False on failed set the current wifi mode
+        """
+        return await self._command("AT+CWMODE="+str(mode)+"\r\n")
+
+    async def connectWiFi(self, ssid, pwd):
+        """
+        Connect to a WiFi AccessPoins
+
+        Parameters:
+            ssid : WiFi AP's SSID
+            pwd : WiFi AP's Password
+
+        Retuns:
+            Same as ESP.connectWiFi()
+        """
+        txData='AT+CWJAP="{}","{}"\r\n'.format(ssid, pwd)
+        async with self.__queue:
+            retData = await self._sendToESP(txData, delay=20, replyURCs=ESP_CWJAP_URCS)
+        return _wifiResult(retData)
+
+    async def disconnectWiFi(self):
+        """
+        Disconnect WIFI
+
+        Return:
+            False on failed to disconnect the WiFi
+            True on successfully disconnected
+        """
+        return await self._command("AT+CWQAP\r\n")
+
+    async def _doHttp(self, host, port, request, body=None):
+        """
+        Private function for open the socket, send the HTTP request & parse the response, in one queue slot.
+        The request goes in one AT+CIPSEND, a body which didn't fit behind the header follows in AT+CIPSEND sized slices.
+        """
+        if request == None:
+            return 0, None
+        reqProtocol = "TCP"
+        if port == 443:
+            reqProtocol = "SSL"
+        async with self.__queue:
+            retData = await self._sendToESP('AT+CIPSTART="{}","{}",{}\r\n'.format(reqProtocol, host, str(port)), delay=10)
+            if retData == None or ESP_OK_STATUS not in retData:
+                await self._sendToESP("AT+CIPCLOSE\r\n")
+                return 0, None
+            parser = self.__httpResponse
+            parser.reset()
+            data = request
+            while data != None and not parser.isComplete():
+                retData = await self._sendToESP("AT+CIPSEND="+str(len(data))+"\r\n", terminators=ESP_PROMPT_TERMINATORS)
+                if retData != None and ">" in retData:
+                    # The server may answer before the body is complete, ex. 401 or 413
+                    retData = await self._sendToESP(data, delay=10, terminators=ESP_SEND_OK_TERMINATORS, dataSink=parser)
+                if not parser.isComplete() and (retData == None or "SEND OK" not in retData):
+                    await self._sendToESP("AT+CIPCLOSE\r\n")
+                    return 0, None
+                data = body.nextSlice() if body != None else None
+            if not parser.isComplete():
+                await self._sendToESP(b"", delay=10, terminators=ESP_SEND_TERMINATORS, dataSink=parser)
+            await self._sendToESP("AT+CIPCLOSE\r\n")
+            if not parser.isComplete():
+                # Connection: close was asked, a body without length ends with the connection
+                parser.finish()
+            if parser.isComplete():
+                return parser.getHTTPErrCode(), parser.getHTTPResponse()
+            return 0, None
+
+    async def doHttpGet(self, host, path, user_agent="RPi-Pico", port=80, headers=''):
+        """
+        Do the HTTP GET request, parameters & return values are same as ESP.doHttpGet()
+        """
+        getHeader, body = self.__builder.httpRequest(b"GET", host, path, user_agent, headers, b"close")
+        return await self._doHttp(host, port, getHeader)
+
+    async def doHttpPost(self, host, path, user_agent, content_type, content, port=80, headers=''):
+        """
+        Do HTTP POST request, parameters & return values are same as ESP.doHttpPost()
+        """
+        postHeader, body = self.__builder.httpRequest(b"POST", host, path, user_agent, headers, b"close", content_type, RequestBody(content))
+        return await self._doHttp(host, port, postHeader, body)
+
+    """
+    MQTT operations
+    """
+
+    def mqttRet(self, retData):
+        """
+        Return string for most of MQTT methods
+
+        Parameters:
+            retData (str): Return data from AT command
+        """
+        if retData == None:
+            return None
+        elif ESP_OK_STATUS in retData:
+            return "OK"
+        elif ESP_ERROR_STATUS in retData:
+            return "ERROR"
+        elif ESP_FAIL_STATUS in retData:
+            return "FAIL"
+        elif ESP_BUSY_STATUS in retData:
+            return "ESP BUSY\r\n"
+        else:
+            return None
+
+    async def _mqttCommand(self, txData, replyURCs=()):
+        async with self.__queue:
+            retData = await self._sendToESP(txData, replyURCs=replyURCs)
+        return self.mqttRet(retData)
+
+    async def mqttUserConf(self, scheme, clientId, userName, password):
+        """
+        Setting user configuration, parameters are same as ESP.mqttUserConf()
+
+        Return:
+            mqttRet string
+        """
+        return await self._mqttCommand('AT+MQTTUSERCFG=0,{},"{}","{}","{}",0,0,""\r\n'.format(scheme, clientId, userName, password))
+
+    async def mqttConnectionConf(self, host, port, reconnect=1):
+        """
+        Configure connection, parameters are same as ESP.mqttConnectionConf()
+
+        Return:
+            mqttRet string
+        """
+        return await self._mqttCommand('AT+MQTTCONN=0,"{}",{},{}\r\n'.format(host, str(port), str(reconnect)), ESP_MQTTCONN_URCS)
+
+    async def mqttPublish(self, topic, data, qos=1, retain=0):
+        """
+        Publish message to MQTT server, parameters are same as ESP.mqttPublish().
+        Bytes or a string with quotes or commas (ex. JSON) is sent raw with AT+MQTTPUBRAW.
+
+        Return:
+            mqttRet string
+        """
+        if isinstance(data, str) and '"' not in data and ',' not in data:
+            return await self._mqttCommand('AT+MQTTPUB=0,"{}","{}",{},{}\r\n'.format(topic, data, str(qos), str(retain)))
+        if isinstance(data, str):
+            data = data.encode()
+        async with self.__queue:
+            retData = await self._sendToESP('AT+MQTTPUBRAW=0,"{}",{},{},{}\r\n'.format(topic, len(data), qos, retain), terminators=ESP_PROMPT_TERMINATORS)
+            if retData == None or ">" not in retData:
+                return self.mqttRet(retData)
+            retData = await self._sendToESP(data, terminators=ESP_MQTTPUB_TERMINATORS)
+        if retData != None and "+MQTTPUB:OK" in retData:
+            return "OK"
+        if retData != None and "+MQTTPUB:FAIL" in retData:
+            return "FAIL"
+        return self.mqttRet(retData)
+
+    async def mqttSubscribe(self, topic, qos=1):
+        """
+        Subscribe to MQTT topic, parameters are same as ESP.mqttSubscribe()
+
+        Return:
+            mqttRet string
+        """
+        return await self._mqttCommand('AT+MQTTSUB=0,"{}",{}\r\n'.format(topic, str(qos)))
+
+    async def mqttClose(self):
+        """
+        Close MQTT connection
+
+        Return:
+            mqttRet string
+        """
+        return await self._mqttCommand("AT+MQTTCLEAN=0\r\n")
+
+    async def pollURC(self, delay=0.1):
+        """
+        Read the bytes received while no AT command was running & dispatch the URCs among them
+
+        Parameters:
+            delay (float): How long (in seconds) to wait for new bytes, while holding the command queue [Default 0.1]
+
+        Return:
+            Number of dispatched URCs
+        """
+        count = 0
+        async with self.__queue:
+            while True:
+                event = self.__tokenizer.nextEvent()
+                if event == None:
+                    if count > 0:
+                        return count
+                    try:
+                        nbytes = await asyncio.wait_for(self.__stream.readinto(self.__tokenizer.space()), delay)
+                    except asyncio.TimeoutError:
+                        return count
+                    if nbytes:
+                        self.__tokenizer.commit(nbytes)
+                elif event[0] == AT_DATA:
+                    # Socket data outside a request has no reader, only a long +MQTTSUBRECV is kept
+                    if self.__tokenizer.msgLength > 0 and self.urc.messageData(event[1]):
+                        count += 1
+                elif event[0] == AT_URC:
+                    self._dispatchURC(event[1])
+                    if self.__tokenizer.msgLength == 0:
+                        count += 1
+
+    async def runDispatcher(self, delay=0.1):
+        """
+        Dispatch the URCs in the background, start it as its own task: asyncio.create_task(esp.runDispatcher())
+        The command queue is released between the scans, so the AT commands of the other tasks still go through.
+        """
+        while True:
+            await self.pollURC(delay)
+            await asyncio.sleep(0)
+
+    async def listenForIncome(self, delay=0.1):
+        """
+        Wait for the next unsolicited line which no URC callback or topic queue took, without blocking the other tasks
+
+        Parameters:
+            delay (float): How long (in seconds) one scan holds the command queue, before it lets queued commands run [Default 0.1]
+
+        Return:
+            List containing: MQTT res type, Topic, length, Message
+        """
+        while True:
+            line = self.urc.getURC()
+            if line != None:
+                return splitURC(line)
+            await self.pollURC(delay)
+            await asyncio.sleep(0)
@@ -0,0 +1,264 @@
+AT_RESULT = 1
+AT_URC = 2
+AT_LINE = 3
+AT_DATA = 4
+
+AT_RESULT_LINES = (b"OK", b"ERROR", b"FAIL", b"SEND OK", b"SEND FAIL", b"busy p...", b"busy s...", b">")
+AT_URC_PREFIXES = (b"+IPD", b"WIFI ", b"+MQTTSUBRECV", b"+MQTTCONNECTED", b"+MQTTDISCONNECTED", b"CLOSED", b"CONNECT", b"ready", b"+STA_CONNECTED", b"+STA_DISCONNECTED", b"+DIST_STA_IP")
+
+_LF = 0x0A
+_CR = 0x0D
+_COLON = 0x3A
+_PROMPT = 0x3E
+_SPACE = 0x20
+_COMMA = 0x2C
+_QUOTE = 0x22
+
+
+def classifyLine(line):
+    """
+    Classify a complete AT response line (without CR/LF)
+
+    Return:
+        AT_RESULT for final results (OK, ERROR, FAIL, SEND OK, busy p..., > prompt)
+        AT_URC for unsolicited result codes (+IPD, WIFI ..., +MQTTSUBRECV, CLOSED, ...)
+        AT_LINE for every other (intermediate) response line
+    """
+    if line in AT_RESULT_LINES:
+        return AT_RESULT
+    # Multi connection mode prefixes the link ID, ex. "0,CONNECT" or "1,CLOSED"
+    if len(line) > 2 and line[1] == 0x2C:
+        line = line[2:]
+    for prefix in AT_URC_PREFIXES:
+        if line.startswith(prefix):
+            return AT_URC
+    return AT_LINE
+
+
+def parseIPDHeader(header):
+    """
+    Split an "+IPD,[<link ID>,]<length>[,<remote IP>,<remote port>]" header (without the ":")
+
+    Return:
+        (link ID, length) tuple, link ID is None in single connection mode
+    """
+    fields = header[5:].split(b",")
+    if len(fields) == 1 or fields[1].startswith(b'"'):
+        return None, int(fields[0])
+    return int(fields[0]), int(fields[1])
+
+
+class ATTokenizer:
+    """
+    This is a class for splitting the ESP's UART stream into AT response events, one byte at a time.
+    The received bytes are read into one preallocated buffer, so nothing is re-scanned or re-copied as data keeps coming.
+
+    Events returned by nextEvent():
+        (AT_RESULT, line): final result of the running command
+        (AT_URC, line): unsolicited result code. For "+IPD" the header is parsed into ipdLink & ipdLength and
+                        the following payload is returned as AT_DATA events
+        (AT_LINE, line): intermediate response line
+        (AT_LINE, "+CIPRECVDATA..."): passive mode read header, followed by its payload as AT_DATA events
+        (AT_DATA, memoryview): +IPD/+CIPRECVDATA/+MQTTSUBRECV payload chunk, only valid until the next nextEvent()/fill() call
+    The payload of "+MQTTSUBRECV:<LinkID>,"<topic>",<length>,<data>" is taken by its length, so CR/LF in it doesn't split
+    the URC. A message longer than the line buffer is returned as its header "+MQTTSUBRECV:<LinkID>,"<topic>",<length>,"
+    (AT_URC, with msgLength set) followed by the payload as AT_DATA events, see URCDispatcher.beginMessage().
+
+    Attributes:
+        ipdLink (int): Link ID of the latest +IPD frame [None in single connection mode]
+        ipdLength (int): Payload length of the latest +IPD frame
+        recvLength (int): Payload length of the latest +CIPRECVDATA reply
+        msgLength (int): Payload length of the +MQTTSUBRECV whose AT_DATA events follow, 0 while they're +IPD/+CIPRECVDATA payload
+    """
+
+    def __init__(self, bufSize=2048, lineSize=512):
+        """
+        The constaructor for ATTokenizer class
+
+        Parameters:
+            bufSize (int): Size of the receive buffer in bytes [Default 2048]
+            lineSize (int): Longest response line kept in one piece, longer lines are returned in parts as AT_LINE [Default 512]
+        """
+        self.__buf = bytearray(bufSize)
+        self.__mv = memoryview(self.__buf)
+        self.__start = 0
+        self.__end = 0
+        self.__line = bytearray(lineSize)
+        self.__lineLen = 0
+        self.__dataLeft = 0
+        self.__msgLeft = 0
+        self.msgLength = 0
+        self.ipdLink = None
+        self.ipdLength = 0
+        self.recvLength = 0
+
+    def reset(self):
+        """
+        Drop every buffered byte and partial line
+        """
+        self.__start = 0
+        self.__end = 0
+        self.__lineLen = 0
+        self.__dataLeft = 0
+        self.__msgLeft = 0
+        self.msgLength = 0
+
+    def pending(self):
+        """
+        Return the number of received bytes not tokenized yet
+        """
+        return self.__end - self.__start
+
+    def space(self):
+        """
+        Return a memoryview of the free part of the receive buffer, write new bytes into it and call commit()
+        """
+        if self.__start == self.__end:
+            self.__start = 0
+            self.__end = 0
+        elif self.__end == len(self.__buf):
+            # Move the unread tail to the front, the buffer itself never grows
+            length = self.__end - self.__start
+            self.__mv[0:length] = self.__mv[self.__start:self.__end]
+            self.__start = 0
+            self.__end = length
+        return self.__mv[self.__end:]
+
+    def commit(self, nbytes):
+        """
+        Mark nbytes of space() as received
+        """
+        self.__end += nbytes
+
+    def fill(self, uartObj):
+        """
+        Read the bytes waiting in the UART into the receive buffer
+
+        Return:
+            Number of bytes read
+        """
+        if uartObj.any() <= 0:
+            return 0
+        space = self.space()
+        if len(space) == 0:
+            return 0
+        nbytes = uartObj.readinto(space)
+        if not nbytes:
+            return 0
+        self.commit(nbytes)
+        return nbytes
+
+    def tail(self, nbytes):
+        """
+        Return the last nbytes received (memoryview), ex. the bytes of the latest fill()
+        """
+        return self.__mv[self.__end-nbytes:self.__end]
+
+    def _messageLength(self, lineLen):
+        """
+        Private function for reading the length field at the end of "+MQTTSUBRECV:<LinkID>,"<topic>",<length>" in place
+
+        Return:
+            The length or 0 if the line doesn't end with a length field
+        """
+        line = self.__line
+        length = 0
+        scale = 1
+        pos = lineLen - 1
+        while pos > 14 and 0x30 <= line[pos] <= 0x39:
+            length += (line[pos] - 0x30) * scale
+            scale *= 10
+            pos -= 1
+        if pos == lineLen - 1 or line[pos] != _COMMA or line[pos-1] != _QUOTE:
+            return 0
+        return length
+
+    def nextEvent(self):
+        """
+        Tokenize the buffered bytes up to the next event
+
+        Return:
+            (kind, data) tuple, or None if more bytes are needed
+        """
+        buf = self.__buf
+        line = self.__line
+        lineLen = self.__lineLen
+        start = self.__start
+        end = self.__end
+
+        if self.__dataLeft > 0 and start < end:
+            nbytes = min(self.__dataLeft, end - start)
+            self.__dataLeft -= nbytes
+            self.__start = start + nbytes
+            return AT_DATA, self.__mv[start:start+nbytes]
+
+        if self.__dataLeft == 0:
+            self.msgLength = 0
+        while start < end:
+            c = buf[start]
+            start += 1
+            if self.__msgLeft > 0:
+                # Binary +MQTTSUBRECV payload, it fits into the line (see below)
+                line[lineLen] = c
+                lineLen += 1
+                self.__msgLeft -= 1
+                if self.__msgLeft == 0:
+                    data = bytes(line[:lineLen])
+                    self.__start = start
+                    self.__lineLen = 0
+                    return AT_URC, data
+            elif c == _LF:
+                if lineLen > 0 and line[lineLen-1] == _CR:
+                    lineLen -= 1
+                if lineLen == 0:
+                    continue
+                data = bytes(line[:lineLen])
+                self.__start = start
+                self.__lineLen = 0
+                return classifyLine(data), data
+            elif lineLen == 0 and c == _PROMPT:
+                self.__start = start
+                return AT_RESULT, b">"
+            elif lineLen == 0 and c == _SPACE:
+                # Space after the > prompt
+                continue
+            elif c == _COLON and lineLen > 5 and line[0:5] == b"+IPD,":
+                data = bytes(line[:lineLen])
+                self.ipdLink, self.ipdLength = parseIPDHeader(data)
+                self.__dataLeft = self.ipdLength
+                self.__start = start
+                self.__lineLen = 0
+                return AT_URC, data
+            elif (c == _COLON or c == _COMMA) and lineLen > 13 and line[0:12] == b"+CIPRECVDATA" and line[12] == (_COMMA if c == _COLON else _COLON):
+                # AT+CIPRECVDATA reply, "+CIPRECVDATA,<len>:<data>" (ESP8266 NonOS AT) or "+CIPRECVDATA:<len>,<data>" (ESP-AT)
+                data = bytes(line[:lineLen])
+                self.recvLength = int(data[13:])
+                self.__dataLeft = self.recvLength
+                self.__start = start
+                self.__lineLen = 0
+                return AT_LINE, data
+            elif c == _COMMA and lineLen > 16 and line[0:13] == b"+MQTTSUBRECV:" and self._messageLength(lineLen) > 0:
+                # After the length field of "+MQTTSUBRECV:<LinkID>,"<topic>",<length>,"
+                length = self._messageLength(lineLen)
+                if length < len(line) - lineLen:
+                    line[lineLen] = c
+                    lineLen += 1
+                    self.__msgLeft = length
+                else:
+                    # Longer than the line, the header (with the comma) is returned & the payload follows as AT_DATA
+                    self.msgLength = length
+                    self.__dataLeft = length
+                    self.__start = start
+                    self.__lineLen = 0
+                    return AT_URC, bytes(line[:lineLen]) + b","
+            else:
+                line[lineLen] = c
+                lineLen += 1
+                if lineLen == len(line):
+                    self.__start = start
+                    self.__lineLen = 0
+                    return AT_LINE, bytes(line)
+
+        self.__start = start
+        self.__lineLen = lineLen
+        return None
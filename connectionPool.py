@@ -0,0 +1,174 @@
+import time
+
+POOL_MAX_LINKS = 5
+
+_LINK_HOST = 0
+_LINK_PORT = 1
+_LINK_BUSY = 2
+_LINK_LAST_USED = 3
+_LINK_RX_DATA = 4
+
+
+class ConnectionPool:
+    """
+    This is a class for handing out the ESP's socket connections (link IDs).
+    In single connection mode (AT+CIPMUX=0) the pool has one link, in multi connection mode (AT+CIPMUX=1) link ID 0-4.
+    An idle open link is handed out again for the same host:port, when every link is taken the least recently used
+    idle link is closed for the new connection. The ESP object owns the pool, see ESP.setMultiConnection().
+
+    Attributes:
+        idleTimeout (int): Seconds after which reclaimIdle() closes an unused link [Default 30]
+        bufferLength (int): Maximum number of unsolicited +IPD bytes kept per link for read() [Default 1024]
+    """
+
+    def __init__(self, esp, links=1, idleTimeout=30, bufferLength=1024):
+        """
+        The constaructor for ConnectionPool class
+
+        Parameters:
+            esp (ESP): The ESP object which opens & closes the connections
+            links (int): Number of link IDs [Default 1, single connection mode]
+            idleTimeout (int): Seconds after which reclaimIdle() closes an unused link [Default 30]
+            bufferLength (int): Maximum number of unsolicited +IPD bytes kept per link for read() [Default 1024]
+        """
+        self.idleTimeout = idleTimeout
+        self.bufferLength = bufferLength
+        self.__esp = esp
+        self.__links = [None]*links
+
+    def setLinks(self, links):
+        """
+        Resize the pool after switching the connection mode, every link must be closed before
+        """
+        self.__links = [None]*links
+
+    def acquire(self, host, port=80):
+        """
+        Get an open connection to host:port, mark it busy until release()
+
+        Return:
+            Link ID or None if no connection could be opened
+        """
+        self.__esp.pollURC()
+        free = None
+        for linkId in range(len(self.__links)):
+            link = self.__links[linkId]
+            if link == None:
+                if free == None:
+                    free = linkId
+            elif not link[_LINK_BUSY] and link[_LINK_HOST] == host and link[_LINK_PORT] == port:
+                link[_LINK_BUSY] = True
+                return linkId
+
+        if free == None:
+            free = self._leastRecentlyUsed()
+            if free == None:
+                return None
+            self.close(free)
+
+        if self.__esp._createTCPConnection(host, port, free) == True:
+            self.__links[free] = [host, port, True, time.time(), None]
+            return free
+        self.__esp._closeTCPConnection(free)
+        return None
+
+    def release(self, linkId, close=False):
+        """
+        Give back the link after the request, it stays open for the next request to the same host:port unless close is True
+        """
+        if close:
+            self.close(linkId)
+        elif self.__links[linkId] != None:
+            self.__links[linkId][_LINK_BUSY] = False
+            self.__links[linkId][_LINK_LAST_USED] = time.time()
+
+    def close(self, linkId):
+        """
+        Close the connection of the link
+        """
+        if self.__links[linkId] != None:
+            self.__esp._closeTCPConnection(linkId)
+            self.__links[linkId] = None
+
+    def closeHost(self, host, port=80):
+        """
+        Close the idle connections to host:port
+        """
+        for linkId in range(len(self.__links)):
+            link = self.__links[linkId]
+            if link != None and not link[_LINK_BUSY] and link[_LINK_HOST] == host and link[_LINK_PORT] == port:
+                self.close(linkId)
+
+    def closeAll(self):
+        """
+        Close every connection
+        """
+        for linkId in range(len(self.__links)):
+            self.close(linkId)
+
+    def reclaimIdle(self, idleTimeout=None):
+        """
+        Close the links which were not used for idleTimeout seconds
+
+        Return:
+            Number of closed links
+        """
+        if idleTimeout == None:
+            idleTimeout = self.idleTimeout
+        now = time.time()
+        count = 0
+        for linkId in range(len(self.__links)):
+            link = self.__links[linkId]
+            if link != None and not link[_LINK_BUSY] and now - link[_LINK_LAST_USED] >= idleTimeout:
+                self.close(linkId)
+                count += 1
+        return count
+
+    def _leastRecentlyUsed(self):
+        oldest = None
+        for linkId in range(len(self.__links)):
+            link = self.__links[linkId]
+            if link != None and not link[_LINK_BUSY]:
+                if oldest == None or link[_LINK_LAST_USED] < self.__links[oldest][_LINK_LAST_USED]:
+                    oldest = linkId
+        return oldest
+
+    def isOpen(self, linkId):
+        """
+        Return True if the link's connection is open
+        """
+        return self.__links[linkId] != None
+
+    def closed(self, linkId):
+        """
+        The ESP reported <linkId>,CLOSED, forget the connection
+        """
+        if linkId < len(self.__links):
+            self.__links[linkId] = None
+
+    def received(self, linkId, data):
+        """
+        Keep +IPD data which arrived for the link while no request was waiting for it
+        """
+        link = self.__links[linkId] if linkId < len(self.__links) else None
+        if link == None:
+            return
+        if link[_LINK_RX_DATA] == None:
+            link[_LINK_RX_DATA] = bytearray()
+        room = self.bufferLength - len(link[_LINK_RX_DATA])
+        link[_LINK_RX_DATA].extend(data[:max(0, room)])
+
+    def read(self, linkId):
+        """
+        Take the unsolicited +IPD data of the link
+
+        Return:
+            bytes or None if nothing was received
+        """
+        self.__esp.pollURC()
+        link = self.__links[linkId]
+        if link == None or link[_LINK_RX_DATA] == None:
+            return None
+        data = bytes(link[_LINK_RX_DATA])
+        link[_LINK_RX_DATA] = None
+        return data
@@ -0,0 +1,229 @@
+try:
+    import zlib
+except ImportError:
+    zlib = None
+try:
+    # MicroPython 1.21+
+    import deflate
+except ImportError:
+    deflate = None
+try:
+    import io
+    _IOBase = io.IOBase
+except (ImportError, AttributeError):
+    _IOBase = object
+
+# CPython: push decompressor, fed with every piece
+_decompressobj = getattr(zlib, "decompressobj", None)
+# Older MicroPython: pull decompressor on a stream
+_DecompIO = getattr(zlib, "DecompIO", None)
+_ZlibError = getattr(zlib, "error", OSError)
+
+_FORMAT_GZIP = 1
+_FORMAT_ZLIB = 2
+_FORMAT_RAW = 3
+
+# Compressed bytes kept ahead of a pull decompressor, so it never runs out of input in the middle of a block
+# (the code tables of a dynamic block take up to ~300 bytes)
+_INFLATE_RESERVE = 1024
+
+
+def decoderAvailable():
+    """
+    Return True if this port can decompress gzip/deflate (CPython zlib, MicroPython deflate or zlib.DecompIO)
+    """
+    return _decompressobj != None or deflate != None or _DecompIO != None
+
+
+class _InputStream(_IOBase):
+    """
+    Private class for the compressed bytes waiting for a pull decompressor, a stream it reads with readinto()
+    """
+
+    def __init__(self, bufferLength):
+        self.__buf = bytearray(bufferLength)
+        self.__mv = memoryview(self.__buf)
+        self.__start = 0
+        self.__end = 0
+
+    def reset(self):
+        self.__start = 0
+        self.__end = 0
+
+    def pending(self):
+        return self.__end - self.__start
+
+    def add(self, data):
+        """
+        Copy as much of data as fits
+
+        Return:
+            Number of copied bytes
+        """
+        if self.__start == self.__end:
+            self.__start = 0
+            self.__end = 0
+        elif self.__end == len(self.__buf):
+            length = self.__end - self.__start
+            self.__mv[0:length] = self.__mv[self.__start:self.__end]
+            self.__start = 0
+            self.__end = length
+        nbytes = min(len(data), len(self.__buf) - self.__end)
+        self.__mv[self.__end:self.__end+nbytes] = data[:nbytes]
+        self.__end += nbytes
+        return nbytes
+
+    def peek(self, nbytes):
+        """
+        Return the first nbytes pending bytes without taking them
+        """
+        return bytes(self.__mv[self.__start:self.__start+nbytes])
+
+    def take(self):
+        """
+        Return every pending byte (memoryview) & empty the stream
+        """
+        data = self.__mv[self.__start:self.__end]
+        self.__start = self.__end
+        return data
+
+    def readinto(self, buf):
+        nbytes = min(len(buf), self.__end - self.__start)
+        buf[0:nbytes] = self.__mv[self.__start:self.__start+nbytes]
+        self.__start += nbytes
+        return nbytes
+
+    def read(self, nbytes=-1):
+        if nbytes < 0:
+            nbytes = self.__end - self.__start
+        data = bytearray(min(nbytes, self.__end - self.__start))
+        self.readinto(data)
+        return bytes(data)
+
+
+class ContentDecoder:
+    """
+    This is a class for decompressing a gzip or deflate (Content-Encoding) response body piece by piece, as the +IPD
+    frames arrive. The decompressed pieces go to output() at most bufferLength bytes at a time, so only the window
+    (32 KB for wbits 15), the output buffer & a 2 KB input buffer are needed, whatever the size of the body.
+    CPython & MicroPython builds with zlib.decompressobj are fed directly. MicroPython's deflate.DeflateIO & zlib.DecompIO
+    pull the compressed bytes from a stream, they run only while more than 1 KB of input is buffered, the rest at the end.
+    HttpParser creates it for responses with Content-Encoding: gzip/deflate, see ESP.setCompression().
+
+    Attributes:
+        failed (bool): The compressed data was corrupt, the rest of the body is dropped
+    """
+
+    def __init__(self, output, bufferLength=256, wbits=15):
+        """
+        The constaructor for ContentDecoder class
+
+        Parameters:
+            output (function): Called with every decompressed piece (memoryview/bytes, only valid during the call)
+            bufferLength (int): Maximum size of a decompressed piece [Default 256]
+            wbits (int): Window size as power of two, the server's window must fit [Default 15, 32 KB]
+        """
+        self.failed = False
+        self.__output = output
+        self.__wbits = wbits
+        self.__outBuf = bytearray(bufferLength)
+        self.__outView = memoryview(self.__outBuf)
+        self.__input = _InputStream(2048)
+        self.__encoding = None
+        self.__decomp = None
+        self.__done = False
+
+    def reset(self, encoding):
+        """
+        Start a new body, encoding is the Content-Encoding ("gzip" or "deflate")
+        """
+        self.failed = False
+        self.__encoding = encoding
+        self.__decomp = None
+        self.__done = False
+        self.__input.reset()
+
+    def _create(self):
+        """
+        Private function for the decompressor, a "deflate" body can be zlib wrapped or raw (ex. IIS), its first 2 bytes tell
+        """
+        head = self.__input.peek(2)
+        if "gzip" in self.__encoding:
+            bodyFormat = _FORMAT_GZIP
+        elif head[0] & 0x0F == 8 and (head[0]*256 + head[1]) % 31 == 0:
+            bodyFormat = _FORMAT_ZLIB
+        else:
+            bodyFormat = _FORMAT_RAW
+
+        wbits = self.__wbits
+        if bodyFormat == _FORMAT_GZIP:
+            wbits += 16
+        elif bodyFormat == _FORMAT_RAW:
+            wbits = -wbits
+        if _decompressobj != None:
+            self.__decomp = _decompressobj(wbits)
+        elif deflate != None:
+            self.__decomp = deflate.DeflateIO(self.__input, (deflate.GZIP, deflate.ZLIB, deflate.RAW)[bodyFormat-1], self.__wbits)
+        else:
+            self.__decomp = _DecompIO(self.__input, wbits)
+
+    def _inflate(self, final):
+        """
+        Private function for decompressing the buffered input, a pull decompressor keeps the reserve unless final
+        """
+        if self.__decomp == None:
+            if self.__input.pending() < 2:
+                return
+            self._create()
+        if _decompressobj != None:
+            data = self.__input.take()
+            while len(data) > 0 and not self.__done:
+                piece = self.__decomp.decompress(data, len(self.__outBuf))
+                if piece:
+                    self.__output(piece)
+                data = self.__decomp.unconsumed_tail
+                self.__done = self.__decomp.eof
+            if final and not self.__done:
+                piece = self.__decomp.flush()
+                if piece:
+                    self.__output(piece)
+            return
+        while final or self.__input.pending() > _INFLATE_RESERVE:
+            nbytes = self.__decomp.readinto(self.__outView)
+            if not nbytes:
+                # End of the compressed data
+                self.__done = True
+                return
+            self.__output(self.__outView[:nbytes])
+
+    def feed(self, data):
+        """
+        Decompress the next piece of the body
+        """
+        if self.failed or self.__done:
+            return
+        pos = 0
+        try:
+            while pos < len(data):
+                pos += self.__input.add(data[pos:])
+                self._inflate(False)
+                if self.__done:
+                    return
+        except (OSError, ValueError, _ZlibError):
+            self.failed = True
+
+    def finish(self):
+        """
+        The body is complete, decompress the rest of it
+
+        Return:
+            False if the compressed data was corrupt or cut
+        """
+        if not self.failed and not self.__done:
+            try:
+                self._inflate(True)
+            except (OSError, ValueError, _ZlibError):
+                self.failed = True
+            if _decompressobj != None and self.__decomp != None and not self.__decomp.eof:
+                self.failed = True
+        return not self.failed
@@ -0,0 +1,78 @@
+import time
+
+_DNS_IP = 0
+_DNS_EXPIRES = 1
+
+
+def isIP(host):
+    """
+    Return True if host is a dotted IPv4 address [ex: "192.168.1.10"], which needs no DNS lookup
+    """
+    parts = host.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not part.isdigit() or int(part) > 255:
+            return False
+    return True
+
+
+class DNSCache:
+    """
+    This is a class for keeping the IP addresses the ESP resolved with AT+CIPDOMAIN, so AT+CIPSTART can connect by IP
+    instead of doing a DNS lookup for every request. An entry is used for ttl seconds, the ESP object drops it as soon as
+    a connect to its IP fails. Set it as ESP.dns, the ESP object fills it.
+
+    Attributes:
+        ttl (int): Seconds a resolved address is used [Default 300]
+        maxEntries (int): Maximum number of hosts, the entry expiring first is dropped for a new one [Default 16]
+    """
+
+    def __init__(self, ttl=300, maxEntries=16):
+        """
+        The constaructor for DNSCache class
+
+        Parameters:
+            ttl (int): Seconds a resolved address is used [Default 300]
+            maxEntries (int): Maximum number of hosts [Default 16]
+        """
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.__entries = dict()
+
+    def get(self, host):
+        """
+        Return the cached IP address of host, or None if it's unknown or expired
+        """
+        entry = self.__entries.get(host)
+        if entry == None:
+            return None
+        if time.time() >= entry[_DNS_EXPIRES]:
+            del self.__entries[host]
+            return None
+        return entry[_DNS_IP]
+
+    def put(self, host, ip, ttl=None):
+        """
+        Keep the IP address of host for ttl seconds [Default the cache's ttl]
+        """
+        if host not in self.__entries and len(self.__entries) >= self.maxEntries:
+            oldest = None
+            for name, entry in self.__entries.items():
+                if oldest == None or entry[_DNS_EXPIRES] < self.__entries[oldest][_DNS_EXPIRES]:
+                    oldest = name
+            del self.__entries[oldest]
+        self.__entries[host] = [ip, time.time() + (self.ttl if ttl == None else ttl)]
+
+    def invalidate(self, host):
+        """
+        Forget the address of host, the next connect resolves it again
+        """
+        if host in self.__entries:
+            del self.__entries[host]
+
+    def clear(self):
+        """
+        Forget every address, ex. after joining another network
+        """
+        self.__entries = dict()
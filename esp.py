@@ -1,6 +1,35 @@
-from machine import UART, Pin
+try:
+    from machine import UART, Pin
+except ImportError:
+    # Not running on the Pico, the caller must hand over a UART-like object (see fakeUart.py)
+    UART = None
+    Pin = None
 import time
+try:
+    import select
+except ImportError:
+    select = None
 from httpParser import HttpParser
+from atTokenizer import ATTokenizer, AT_DATA, AT_URC, parseIPDHeader
+from urcDispatcher import URCDispatcher, splitURC
+from httpSession import HttpSession
+from connectionPool import ConnectionPool, POOL_MAX_LINKS
+from requestBody import RequestBody
+from requestBuilder import RequestBuilder
+# The optional features (passthrough, AP scan, metrics, spool, DNS, worker, ..) import their module when first used,
+# so "import esp" only compiles the core driver
+
+try:
+    from time import ticks_ms, ticks_diff, sleep_ms
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic()*1000)
+
+    def ticks_diff(end, start):
+        return end-start
+
+    def sleep_ms(ms):
+        time.sleep(ms/1000)
 
 ESP_OK_STATUS = "OK\r\n"
 ESP_ERROR_STATUS = "ERROR\r\n"
@@ -10,10 +39,100 @@ ESP_WIFI_GOT_IP_CONNECTED="WIFI GOT IP\r\n"
 ESP_WIFI_DISCONNECTED="WIFI DISCONNECT\r\n"
 ESP_WIFI_AP_NOT_PRESENT="WIFI AP NOT FOUND\r\n"
 ESP_WIFI_AP_WRONG_PWD="WIFI AP WRONG PASSWORD\r\n"
+
+# URCs which are part of a command's reply, they aren't kept for listenForIncome()
+ESP_CWJAP_URCS = (b"WIFI ",)
+ESP_MQTTCONN_URCS = (b"+MQTTCONNECTED",)
 ESP_BUSY_STATUS="busy p...\r\n"
 UART_Tx_BUFFER_LENGTH = 1024
 UART_Rx_BUFFER_LENGTH = 1024*2
 
+# Response lines which end an AT command response, the reader returns as soon as one of them arrived
+ESP_TERMINATORS=(b"OK", b"ERROR", b"FAIL", b"busy p...")
+ESP_PROMPT_TERMINATORS=(b">", b"ERROR", b"busy p...")
+ESP_SEND_TERMINATORS=(b"CLOSED", b"SEND FAIL", b"ERROR")
+ESP_SEND_OK_TERMINATORS=(b"SEND OK", b"SEND FAIL", b"ERROR")
+ESP_MQTTPUB_TERMINATORS=(b"+MQTTPUB:OK", b"+MQTTPUB:FAIL", b"ERROR")
+# Response timeout (in seconds) per AT command, the commands not listed here wait the setDelay() time
+ESP_COMMAND_TIMEOUTS={
+    "AT": 1,
+    "ATE0": 1,
+    "ATE1": 1,
+    "AT+GMR": 1,
+    "AT+RESTORE": 5,
+    "AT+CWMODE_CUR": 1,
+    "AT+CWMODE_DEF": 1,
+    "AT+CWMODE": 1,
+    "AT+CWJAP": 20,
+    "AT+CWQAP": 2,
+    "AT+CWLAP": 10,
+    "AT+CWLAPOPT": 1,
+    "AT+UART_CUR": 1,
+    "AT+CIPMUX": 1,
+    "AT+CIPRECVMODE": 1,
+    "AT+CIPMODE": 1,
+    "AT+CIPDOMAIN": 5,
+    "AT+CIPSSLCSNI": 1,
+    "AT+CIPSTART": 10,
+    "AT+CIPCLOSE": 2,
+    "AT+CIPSEND": 2,
+    "AT+CIPSNTPCFG": 1,
+    "AT+CIPSNTPTIME": 2,
+    "AT+MQTTUSERCFG": 1,
+    "AT+MQTTCONN": 10,
+    "AT+MQTTPUB": 5,
+    "AT+MQTTPUBRAW": 2,
+    "AT+MQTTSUB": 5,
+    "AT+MQTTCLEAN": 2,
+}
+# Attempts for an AT command the ESP rejected with "busy p..." while it was still sending the previous message
+ESP_BUSY_RETRY=5
+# Room kept free in the UART Rx buffer for the "+CIPRECVDATA:<len>," header & the trailing OK of a passive mode read
+ESP_RECV_OVERHEAD=32
+# Baud-rates tried by negotiateBaudRate(), fastest first
+ESP_BAUD_RATES=(921600, 460800, 230400, 115200)
+# Time (in msec) the ESP needs to switch its UART after answering AT+UART_CUR
+ESP_BAUD_SWITCH_TIME=50
+# Silence (in msec) the ESP needs before & after "+++" to leave the transparent transmission mode
+ESP_PASSTHROUGH_GUARD_TIME=1000
+
+
+def _decode(data):
+    """
+    Decode the raw UART bytes into a string, non UTF-8 bytes (ex. ESP boot garbage) become "?"
+    """
+    try:
+        return str(data, "utf-8")
+    except UnicodeError:
+        return "".join([chr(c) if c < 0x80 else "?" for c in data])
+
+
+def _wifiResult(retData):
+    """
+    Map the AT+CWJAP response into the connectWiFi() return string
+    """
+    if(retData!=None):
+        if "+CWJAP:" in retData:
+            # +CWJAP:<error code> [1: timeout, 2: wrong password, 3: AP not found, 4: connect fail]
+            errCode = retData.partition("+CWJAP:")[2][0:1]
+            if errCode == "1":
+                return ESP_WIFI_DISCONNECTED
+            elif errCode == "2":
+                return ESP_WIFI_AP_WRONG_PWD
+            elif errCode == "3":
+                return ESP_WIFI_AP_NOT_PRESENT
+            elif errCode == "4":
+                return ESP_WIFI_DISCONNECTED
+            else:
+                return None
+        elif ESP_OK_STATUS in retData:
+            # The WIFI CONNECTED & WIFI GOT IP URCs go to the URC dispatcher, CWJAP only answers OK once the IP is obtained
+            return ESP_WIFI_CONNECTED
+        else:
+            return ESP_WIFI_DISCONNECTED
+    else:
+        return ESP_WIFI_DISCONNECTED
+
 
 class ESP:
     """
@@ -25,14 +144,16 @@ class ESP:
         baudRate (int): UART Baud-Rate for communncating between RPI Pico's & ESP8266 [Default 115200]
         txPin (init): RPI Pico's Tx pin [Default Pin 0]
         rxPin (init): RPI Pico's Rx pin [Default Pin 1]
+        urc (URCDispatcher): Receives the unsolicited results (WIFI DISCONNECT, +MQTTSUBRECV, ..), register callbacks or topic queues on it
+        pool (ConnectionPool): Hands out the socket connections (link IDs)
+        mqttQueue (PublishQueue): Batches MQTT messages for AT+MQTTPUBRAW, created on first use
     """
     
-    __rxData=None
     __txData=None
     __httpResponse=None
-    __sendDelay=1
+    __sendDelay=5
     
-    def __init__(self, uartPort=0 ,baudRate=115200, txPin=(0), rxPin=(1)):
+    def __init__(self, uartPort=0 ,baudRate=115200, txPin=(0), rxPin=(1), uartObj=None, ctsPin=None, rtsPin=None):
         """
         The constaructor for ESP class
         
@@ -41,63 +162,525 @@ class ESP:
             baudRate (int): UART Baud-Rate for communncating between RPI Pico's & ESP8266 [Default 115200]
             txPin (init): RPI Pico's Tx pin [Default Pin 0]
             rxPin (init): RPI Pico's Rx pin [Default Pin 1]
+            uartObj (obj): Ready made UART like object [write(), read(), any()], ex. fakeUart.FakeUART for testing on a PC.
+                           When given, uartPort, baudRate, txPin & rxPin are ignored [Default None]
+            ctsPin (int): RPI Pico's CTS pin, connected to the ESP's RTS (GPIO15) [Default None, no flow control]
+            rtsPin (int): RPI Pico's RTS pin, connected to the ESP's CTS (GPIO13) [Default None, no flow control]
         """
         self.__uartPort=uartPort
         self.__baudRate=baudRate
         self.__txPin=txPin
         self.__rxPin=rxPin
+        self.__ctsPin=ctsPin
+        self.__rtsPin=rtsPin
         #print(self.__uartPort, self.__baudRate, self.__txPin, self.__rxPin)
-        self.__uartObj = UART(self.__uartPort, baudrate=self.__baudRate, tx=Pin(self.__txPin), rx=Pin(self.__rxPin), txbuf=UART_Tx_BUFFER_LENGTH, rxbuf=UART_Rx_BUFFER_LENGTH)
+        self.__ownUART = uartObj == None
+        if uartObj != None:
+            self.__uartObj = uartObj
+        else:
+            self.__uartObj = UART(self.__uartPort, **self._uartConfig(self.__baudRate))
         #print(self.__uartObj)
+        self.__tokenizer = ATTokenizer(UART_Rx_BUFFER_LENGTH)
+        self.urc = URCDispatcher()
+        self.pool = ConnectionPool(self)
+        # PublishQueue of mqttQueue
+        self.__mqttQueue = None
+        self.__multiConnection = False
+        self.__passiveRecv = False
+        self.__recvNotified = [False]*POOL_MAX_LINKS
+        self.__sessions = dict()
+        # True once the ESP answered SEND OK for the whole latest request, see _requestSent()
+        self.__requestSent = False
+        # Reused for every request & AT+CIPSEND, see _buildRequest()
+        self.__builder = RequestBuilder()
+        self.__cmdBuilder = RequestBuilder(32)
+        # FlashQueue for the POST/publish payloads which couldn't be sent, see drainSpool()
+        self.spool = None
+        self.__draining = False
+        # HttpCache for doHttpGet() & HttpSession.get(), see httpCache.py
+        self.cache = None
+        # DNSCache, when set the connections are opened by IP, see resolve()
+        self.dns = None
+        self.__sniSupported = True
+        self.__compression = False
+        self.__sortedScan = None
+        self.__timeouts = dict(ESP_COMMAND_TIMEOUTS)
+        # ESPMetrics while enableMetrics() is on
+        self.metrics = None
+        # Trace hook, called with ("TX"/"RX", ticks_ms() timestamp, raw bytes) for every UART write & read.
+        # The frames are copied out of the reused UART/request buffers, so the hook may keep them
+        self.trace = None
+        # select.poll() object of the UART, False if the UART can't be polled (see _waitForRX())
+        self.__poller = None
+        
+    @property
+    def mqttQueue(self):
+        """
+        The PublishQueue for batched AT+MQTTPUBRAW publishing, created on first use
+        """
+        if self.__mqttQueue == None:
+            from publishQueue import PublishQueue
+            self.__mqttQueue = PublishQueue(self)
+        return self.__mqttQueue
         
     def _createHTTPParseObj(self):
         """
-        Private function for creating HTTP response before executing HTTP Post/Get request
+        Private function for creating HTTP response before executing HTTP Post/Get request, the parser is reused
         """
         if(self.__httpResponse != None):
-            del self.__httpResponse
-            self.__httpResponse=HttpParser()
+            self.__httpResponse.reset()
         else:
             self.__httpResponse=HttpParser()
 
+    def _uartConfig(self, baudRate):
+        """
+        Private function for the RPI Pico's UART settings at baudRate
+        """
+        config = dict(baudrate=baudRate, tx=Pin(self.__txPin), rx=Pin(self.__rxPin), txbuf=UART_Tx_BUFFER_LENGTH, rxbuf=UART_Rx_BUFFER_LENGTH)
+        if self._flowControl():
+            config["cts"] = Pin(self.__ctsPin)
+            config["rts"] = Pin(self.__rtsPin)
+            config["flow"] = UART.CTS | UART.RTS
+        return config
+    
+    def _flowControl(self):
+        """
+        Private function, True if the CTS & RTS pins are wired
+        """
+        return self.__ctsPin != None and self.__rtsPin != None
+    
+    def _switchUART(self, baudRate):
+        """
+        Private function for moving the RPI Pico's UART to baudRate, dropping everything received so far
+        """
+        if self.__ownUART:
+            self.__uartObj.init(**self._uartConfig(baudRate))
+        else:
+            self.__uartObj.init(baudrate=baudRate)
+        self.__baudRate = baudRate
+        while self.__uartObj.any() > 0:
+            self.__uartObj.read(UART_Rx_BUFFER_LENGTH)
+        self.__tokenizer.reset()
+    
+    def _checkLink(self, retry=3):
+        """
+        Private function for confirming the UART link with "AT"
+        
+        Return:
+            True if the ESP answered OK
+        """
+        for attempt in range(retry):
+            retData = self._sendToESP("AT\r\n", delay=0.5)
+            if retData != None and ESP_OK_STATUS in retData:
+                return True
+            self.__tokenizer.reset()
+        return False
+    
+    def getBaudRate(self):
+        """
+        Return the current UART baud-rate between the RPI Pico & the ESP
+        """
+        return self.__baudRate
+    
+    def setBaudRate(self, baudRate):
+        """
+        Switch the ESP (AT+UART_CUR, not saved in flash) & the RPI Pico's UART to baudRate & confirm the link with "AT".
+        With CTS & RTS pins given to the constructor, hardware flow control is switched on at both ends.
+        If the link doesn't work at the new baud-rate both ends go back to the previous one.
+        
+        Parameter:
+            baudRate (int): New baud-rate [ex: 921600]
+        
+        Return:
+            True on success, False if the previous baud-rate is kept
+        """
+        oldBaudRate = self.__baudRate
+        flow = 3 if self._flowControl() else 0
+        retData = self._sendToESP("AT+UART_CUR={},8,1,0,{}\r\n".format(baudRate, flow))
+        if retData == None or ESP_OK_STATUS not in retData:
+            return False
+        sleep_ms(ESP_BAUD_SWITCH_TIME)
+        self._switchUART(baudRate)
+        if self._checkLink():
+            return True
+        
+        # The link is not reliable at this baud-rate, move the ESP back (if it ever got the command) & then the Pico
+        self._sendToESP("AT+UART_CUR={},8,1,0,{}\r\n".format(oldBaudRate, flow), delay=0.5)
+        sleep_ms(ESP_BAUD_SWITCH_TIME)
+        self._switchUART(oldBaudRate)
+        self._checkLink()
+        return False
+    
+    def negotiateBaudRate(self, baudRates=ESP_BAUD_RATES):
+        """
+        Find the fastest baud-rate the link works at, see setBaudRate(). Call it after startUP().
+        
+        Parameter:
+            baudRates (tuple): Baud-rates to try, fastest first [Default 921600, 460800, 230400, 115200]
+        
+        Return:
+            The baud-rate in use
+        """
+        for baudRate in baudRates:
+            if baudRate == self.__baudRate or self.setBaudRate(baudRate):
+                break
+        return self.__baudRate
+    
     def setDelay(self, delay):
+        """
+        Set the default response timeout (in seconds) of the AT commands without their own timeout [Default 5]
+        """
         self.__sendDelay = delay
+    
+    def setCommandTimeout(self, command, timeout):
+        """
+        Set the response timeout of one AT command, see ESP_COMMAND_TIMEOUTS
+        
+        Parameters:
+            command (str): AT command name without parameters [ex: "AT+CWJAP"]
+            timeout (float): Maximum time (in seconds) to wait for its response, None to use the setDelay() time
+        """
+        if timeout == None:
+            self.__timeouts.pop(command, None)
+        else:
+            self.__timeouts[command] = timeout
+    
+    def _commandName(self, atCMD):
+        """
+        Private function for the name of an AT command, the part in front of "=", "?" or CR
+        
+        Return:
+            Command name [ex: "AT+CWJAP"] or None for raw data
+        """
+        if isinstance(atCMD, str):
+            atCMD = atCMD[:24].encode()
+        else:
+            atCMD = bytes(atCMD[:24])
+        if not atCMD.startswith(b"AT"):
+            return None
+        end = len(atCMD)
+        for separator in (b"=", b"?", b"\r"):
+            index = atCMD.find(separator, 0, end)
+            if index >= 0:
+                end = index
+        return str(atCMD[:end], "utf-8")
+    
+    def _commandTimeout(self, atCMD):
+        """
+        Private function for the response timeout of an AT command
+        """
+        name = self._commandName(atCMD)
+        if name == None:
+            return self.__sendDelay
+        return self.__timeouts.get(name, self.__sendDelay)
+    
+    def enableMetrics(self, enable=True):
+        """
+        Start (or stop) counting the per command latencies, timeouts, busy answers & UART bytes, see stats()
+        """
+        if enable:
+            from espMetrics import ESPMetrics
+            self.metrics = ESPMetrics()
+        else:
+            self.metrics = None
+    
+    def stats(self):
+        """
+        Return the counters of enableMetrics() as dict, see ESPMetrics.stats(), or None while metrics are off
+        """
+        if self.metrics == None:
+            return None
+        return self.metrics.stats()
+    
+    def _record(self, atCMD, startTime, timedOut=False, busy=False):
+        """
+        Private function for counting a finished command in the metrics
+        """
+        name = self._commandName(atCMD)
+        self.metrics.record("DATA" if name == None else name, ticks_diff(ticks_ms(), startTime), timedOut, busy)
+    
+    def _write(self, data):
+        """
+        Private function for writing to the UART, counted in the metrics & passed to the trace hook
+        
+        Return:
+            Number of written bytes, as the UART returns it
+        """
+        nbytes = self.__uartObj.write(data)
+        if self.metrics != None:
+            self.metrics.txBytes += len(data)
+        if self.trace != None:
+            self.trace("TX", ticks_ms(), data.encode() if isinstance(data, str) else bytes(data))
+        return nbytes
+    
+    def _fill(self):
+        """
+        Private function for reading the waiting UART bytes into the tokenizer, counted in the metrics & passed to the trace hook
+        
+        Return:
+            Number of bytes read
+        """
+        nbytes = self.__tokenizer.fill(self.__uartObj)
+        if nbytes > 0:
+            if self.metrics != None:
+                self.metrics.rxBytes += nbytes
+            if self.trace != None:
+                self.trace("RX", ticks_ms(), bytes(self.__tokenizer.tail(nbytes)))
+        return nbytes
+        
+    def _readInto(self, buf, nbytes=None):
+        """
+        Private function for reading the waiting UART bytes straight into buf, without the tokenizer (passthrough data),
+        counted in the metrics & passed to the trace hook
+        
+        Return:
+            Number of read bytes or None if nothing was waiting
+        """
+        if self.__uartObj.any() <= 0:
+            return None
+        if nbytes == None:
+            nbytes = self.__uartObj.readinto(buf)
+        else:
+            nbytes = self.__uartObj.readinto(buf, nbytes)
+        if nbytes:
+            if self.metrics != None:
+                self.metrics.rxBytes += nbytes
+            if self.trace != None:
+                self.trace("RX", ticks_ms(), bytes(memoryview(buf)[:nbytes]))
+        return nbytes
         
-    def _sendToESP(self, atCMD, delay=None):
+    def _sendToESP(self, atCMD, delay=None, terminators=ESP_TERMINATORS, dataSink=None, dataLink=0, lineSink=None, replyURCs=()):
         """
         Private function for complete ESP AT command Send/Receive operation.
+        
+        Parameters:
+            atCMD (str): AT command or raw data to send
+            delay (float): Maximum time (in seconds) to wait for the response [Default the command's timeout, see setCommandTimeout()]
+                           While +IPD payload for the dataSink keeps coming, it's the maximum time between two pieces
+            terminators (tuple): Byte tokens, the response is complete as soon as one of them received
+            dataSink (HttpParser): Takes the +IPD payload with feed(), the response is complete once feed() returns True [Default None]
+            dataLink (int): Link ID whose +IPD payload goes to dataSink, the payload of other links goes to the pool [Default 0]
+                            None for an AT+CIPRECVDATA read, all of its payload goes to dataSink & the response ends with OK
+            lineSink (function): Called with every intermediate response line (bytes) instead of keeping it in the response [Default None]
+            replyURCs (tuple): Byte prefixes of the URCs answering this command, they only go to the URC callbacks [Default ()]
+        
+        Return:
+            Response string, "ESP BUSY\r\n" if ESP is busy or None on timeout
         """
-        self.__rxData=str()
         self.__txData=atCMD
-        #print("---"+self.__txData)
-        self.__uartObj.write(self.__txData)
-        self.__rxData=bytes()
+        self._write(self.__txData)
         
-        delayTime = self.__sendDelay
         if delay != None:
             delayTime = delay
-        time.sleep(delayTime)
+        else:
+            delayTime = self._commandTimeout(atCMD)
+        startTime = ticks_ms()
+        activeTime = startTime
         
+        rxLines = list()
         while True:
-            #print(".")
-            if self.__uartObj.any()>0:
-                #print(self.__uartObj.any())
+            event = self.__tokenizer.nextEvent()
+            if event == None:
+                if self._fill() > 0:
+                    continue
+                if ticks_diff(ticks_ms(), activeTime) > delayTime*1000:
+                    if self.metrics != None:
+                        self._record(atCMD, startTime, timedOut=True)
+                    return None
+                sleep_ms(1)
+            elif event[0] == AT_DATA:
+                if self.__tokenizer.msgLength > 0:
+                    self.urc.messageData(event[1])
+                elif dataSink != None and dataLink == None:
+                    dataSink.feed(event[1])
+                elif dataSink != None and self._ipdLink() == dataLink:
+                    # A long download isn't cut by the timeout as long as data arrives
+                    activeTime = ticks_ms()
+                    if dataSink.feed(event[1]):
+                        break
+                else:
+                    self.pool.received(self._ipdLink(), event[1])
+            elif event[1] in terminators:
+                if event[0] == AT_URC:
+                    self._dispatchURC(event[1], replyURCs)
+                rxLines.append(event[1])
                 break
-        
-        while self.__uartObj.any()>0:
-            self.__rxData += self.__uartObj.read(UART_Rx_BUFFER_LENGTH)
+            elif event[0] == AT_URC:
+                self._dispatchURC(event[1], replyURCs)
+            elif lineSink != None:
+                lineSink(event[1])
+            else:
+                rxLines.append(event[1])
             
-        #print(self.__rxData)
-        if ESP_OK_STATUS in self.__rxData:
-            return self.__rxData
-        elif ESP_ERROR_STATUS in self.__rxData:
-            return self.__rxData
-        elif ESP_FAIL_STATUS in self.__rxData:
-            return self.__rxData
-        elif ESP_BUSY_STATUS in self.__rxData:
+        busy = len(rxLines) > 0 and rxLines[-1] == b"busy p..."
+        if self.metrics != None:
+            self._record(atCMD, startTime, busy=busy)
+        if busy:
             return "ESP BUSY\r\n"
-        else:
-            return None
+        rxLines.append(b"")
+        return _decode(b"\r\n".join(rxLines))
+        
+    def batch(self, commands, stopOnError=True):
+        """
+        Send a sequence of AT commands back to back, each as soon as the previous one answered, ex. the whole bring-up:
+        esp01.batch(["AT", "ATE0", "AT+CWMODE=1", 'AT+MQTTUSERCFG=0,1,"id","","",0,0,""', 'AT+MQTTCONN=0,"broker",1883,1'])
+        A command the ESP rejects with busy p... is sent again. Every command waits its own timeout, see setCommandTimeout().
+        
+        Parameters:
+            commands (list): AT commands (CR/LF is added when missing) or (command, expected response) tuples,
+                             the expected response is searched in the answer [Default "OK\r\n"]
+            stopOnError (bool): Skip the rest of the commands after the first one without its expected response [Default True]
+        
+        Return:
+            List of (passed, response) tuples in the order of commands, the skipped commands are left out
+        """
+        results = list()
+        for command in commands:
+            expected = ESP_OK_STATUS
+            if isinstance(command, tuple):
+                command, expected = command
+            if not command.endswith("\r\n"):
+                command += "\r\n"
+            for attempt in range(ESP_BUSY_RETRY):
+                retData = self._sendToESP(command)
+                if retData != "ESP BUSY\r\n":
+                    break
+                sleep_ms(10)
+            passed = retData != None and expected in retData
+            results.append((passed, retData))
+            if not passed and stopOnError:
+                break
+        return results
+    
+    def _ipdLink(self):
+        """
+        Private function for the link ID of the latest +IPD frame, 0 in single connection mode
+        """
+        if self.__tokenizer.ipdLink == None:
+            return 0
+        return self.__tokenizer.ipdLink
+        
+    def _dispatchURC(self, line, reply=()):
+        """
+        Private function for handing over an unsolicited line to the URC dispatcher.
+        +IPD headers & the CONNECT/CLOSED of the sockets stay with the driver.
+        The URCs starting with a reply prefix answer the running command & aren't kept in the backlog.
+        """
+        if self.__tokenizer.msgLength > 0:
+            # Header of a long +MQTTSUBRECV, its payload follows as AT_DATA events
+            self.urc.beginMessage(line, self.__tokenizer.msgLength)
+            return
+        if line.startswith(b"+IPD"):
+            if self.__passiveRecv:
+                # Passive receive mode only notifies "+IPD,[<link ID>,]<len>", the data waits in the ESP for AT+CIPRECVDATA
+                linkId = parseIPDHeader(line)[0]
+                self.__recvNotified[0 if linkId == None else linkId] = True
+            return
+        # Multi connection mode prefixes the link ID, ex. "1,CLOSED"
+        linkId = 0
+        status = line
+        if len(line) > 2 and line[1:2] == b",":
+            linkId = line[0] - 0x30
+            status = line[2:]
+        if status == b"CLOSED":
+            self.pool.closed(linkId)
+        elif status != b"CONNECT":
+            self.urc.dispatch(line, reply)
+
+    def pollURC(self):
+        """
+        Read the bytes received while no AT command was running & dispatch the URCs among them.
+        Call it from the main loop when the callbacks/topic queues of the URC dispatcher are used.
+        
+        Return:
+            Number of dispatched URCs
+        """
+        count = 0
+        while True:
+            event = self.__tokenizer.nextEvent()
+            if event == None:
+                if self._fill() == 0:
+                    return count
+            elif event[0] == AT_DATA:
+                if self.__tokenizer.msgLength == 0:
+                    self.pool.received(self._ipdLink(), event[1])
+                elif self.urc.messageData(event[1]):
+                    count += 1
+            elif event[0] == AT_URC:
+                self._dispatchURC(event[1])
+                if self.__tokenizer.msgLength == 0:
+                    count += 1
+            # Anything else is a late answer of a timed out command, drop it
+    
+    def _waitForRX(self, timeout, delay=None):
+        """
+        Private function for sleeping until the UART received bytes. The UART is registered with select.poll(), the CPU
+        then idles in the poll instead of scanning the UART. A UART-like object which can't be polled is checked every delay seconds.
+        
+        Parameters:
+            timeout (int): Maximum time (in msec) to wait, -1 waits forever
+            delay (float): Poll interval (in seconds) of a UART which can't be polled [Default 1 msec]
+        
+        Return:
+            True if bytes are waiting
+        """
+        if self.__uartObj.any() > 0:
+            return True
+        if self.__poller == None:
+            self.__poller = False
+            if select != None:
+                try:
+                    self.__poller = select.poll()
+                    self.__poller.register(self.__uartObj, select.POLLIN)
+                except (AttributeError, TypeError, ValueError, OSError):
+                    self.__poller = False
+        if self.__poller:
+            return len(self.__poller.poll(timeout)) > 0
+        waitTime = 1 if delay == None else int(delay*1000)
+        if timeout >= 0:
+            waitTime = min(waitTime, timeout)
+        sleep_ms(waitTime)
+        return self.__uartObj.any() > 0
+        
+    def _waitURC(self, take, timeout=None, delay=None):
+        """
+        Private function for dispatching the received URCs until take() returns one
+        
+        Parameters:
+            take (function): Returns the awaited entry or None
+            timeout (float): Maximum time (in seconds) to wait [Default None, wait forever]
+            delay (float): Poll interval (in seconds) of a UART which can't be polled [Default 1 msec]
+        
+        Return:
+            The entry or None on timeout
+        """
+        startTime = ticks_ms()
+        while True:
+            item = take()
+            if item != None:
+                return item
+            if self.pollURC() > 0:
+                continue
+            if timeout == None:
+                left = -1
+            else:
+                left = int(timeout*1000) - ticks_diff(ticks_ms(), startTime)
+                if left <= 0:
+                    return None
+            self._waitForRX(left, delay)
+    
+    def getMessage(self, topic, timeout=0):
+        """
+        Take the oldest received message of an MQTT topic, the topic queue must be added first with urc.addQueue(topic).
+        The data is returned as received, so binary payloads (CR/LF, commas, ..) arrive intact.
+        
+        Parameters:
+            timeout (float): Maximum time (in seconds) to wait for a message, None waits forever [Default 0, no wait]
+        
+        Return:
+            (topic, data) tuple or None if no message is waiting
+        """
+        return self._waitURC(lambda: self.urc.getMessage(topic), timeout)
         
     def startUP(self):
         """
@@ -125,9 +708,12 @@ class ESP:
             False if unable to reset the ESP
         """
         retData = self._sendToESP("AT+RST\r\n")
+        # The reset drops the AT+CWLAPOPT of scanAPs()
+        self.__sortedScan = None
         if(retData != None):
             if ESP_OK_STATUS in retData:
-                time.sleep(5)
+                # Wait for the boot banner instead of a fixed 5 sec sleep
+                self._sendToESP("", delay=5, terminators=(b"ready",))
                 return self.startUP()
             else:
                 return False
@@ -174,12 +760,9 @@ class ESP:
         retData = self._sendToESP("AT+GMR\r\n")
         if(retData != None):
             if ESP_OK_STATUS in retData:
-                #print(str(retData,"utf-8"))
-                retData = str(retData).partition(r"OK")[0]
-                #print(str(retData,"utf-8"))
-                retData = retData.split(r"\r\n")
-                retData[0] = retData[0].replace("b'","")
-                retData=str(retData[0]+"\r\n"+retData[1]+"\r\n"+retData[2])
+                retData = retData.partition(ESP_OK_STATUS)[0].strip("\r\n")
+                retData = retData.split("\r\n")
+                retData="\r\n".join(retData[0:3])
                 return retData
             else:
                 return None
@@ -194,6 +777,8 @@ class ESP:
             False on failed to restore ESP
         """
         retData = self._sendToESP("AT+RESTORE\r\n")
+        # The factory defaults drop the AT+CWLAPOPT of scanAPs()
+        self.__sortedScan = None
         if(retData != None):
             if ESP_OK_STATUS in retData:   
                 return True
@@ -301,32 +886,77 @@ class ESP:
         Retuns:
             List of Available APs or None
         """
-        retData = str(self._sendToESP("AT+CWLAP\r\n"))
+        retData = self._sendToESP("AT+CWLAP\r\n")
         if(retData != None):
-            retData = retData.replace("+CWLAP:", "")
-            retData = retData.replace(r"\r\n\r\nOK\r\n", "")
-            retData = retData.replace(r"\r\n","@")
-            retData = retData.replace("b'(","(").replace("'","")
-            retData = retData.split("@")
-            retData =list(retData)
+            retData = retData.partition(ESP_OK_STATUS)[0]
+            retData = retData.split("\r\n")
             apLists=list()
             
             for items in retData:
-                data=str(items).replace("(","").replace(")","").split(",")
-                data=tuple(data)
-                apLists.append(data)
+                if "+CWLAP:" in items:
+                    data=items.replace("+CWLAP:", "").replace("(","").replace(")","").split(",")
+                    data=tuple(data)
+                    apLists.append(data)
 
             return apLists
         else:
             return None
         
-    def connectWiFi(self,ssid,pwd):
+    def scanAPs(self, limit=None, ssid=None, minRSSI=None):
+        """
+        Scan the WiFi AccessPoins, strongest first. The ESP is set up once with AT+CWLAPOPT to print only the needed fields
+        sorted by RSSI, the lines are parsed as they arrive & after limit APs the rest is skipped without parsing.
+        
+        Parameters:
+            limit (int): Keep only the strongest limit APs [Default None, all]
+            ssid (str): Scan only for the APs of this SSID [Default None, all]
+            minRSSI (int): Skip the APs weaker than this [ex: -80, Default None]
+        
+        Return:
+            List of AccessPoint(ssid, rssi, bssid, channel, ecn) tuples or None on failure
+        """
+        from apScan import parseCWLAP, CWLAP_MASK
+        if self.__sortedScan == None:
+            retData = self._sendToESP("AT+CWLAPOPT=1,{}\r\n".format(CWLAP_MASK))
+            # An old firmware without AT+CWLAPOPT prints every field unsorted, the fields we use come first anyway
+            self.__sortedScan = retData != None and ESP_OK_STATUS in retData
+        
+        apList = list()
+        def collect(line):
+            if limit != None and self.__sortedScan and len(apList) >= limit:
+                return
+            ap = parseCWLAP(line)
+            if ap == None or (minRSSI != None and ap.rssi < minRSSI):
+                return
+            if limit != None and len(apList) >= limit:
+                # Unsorted scan, replace the weakest one
+                weakest = 0
+                for index in range(1, len(apList)):
+                    if apList[index].rssi < apList[weakest].rssi:
+                        weakest = index
+                if ap.rssi > apList[weakest].rssi:
+                    apList[weakest] = ap
+                return
+            apList.append(ap)
+        
+        if ssid != None:
+            txData = 'AT+CWLAP="{}"\r\n'.format(ssid)
+        else:
+            txData = "AT+CWLAP\r\n"
+        retData = self._sendToESP(txData, lineSink=collect)
+        if retData == None or ESP_OK_STATUS not in retData:
+            return None
+        apList.sort(key=lambda ap: ap.rssi, reverse=True)
+        return apList
+    
+    def connectWiFi(self,ssid,pwd,bssid=None):
         """
         Connect to a WiFi AccessPoins
         
         Parameters:
             ssid : WiFi AP's SSID
             pwd : WiFi AP's Password
+            bssid : MAC address of the AP [ex: "ca:d7:19:d8:a6:44"], picks this AP if several share the SSID [Default None]
         
         Retuns:
             WIFI DISCONNECT when failed connect with target AP's credential
@@ -334,35 +964,37 @@ class ESP:
             WIFI AP NOT FOUND when cann't find the target AP
             WIFI CONNECTED when successfully connect with the target AP
         """
-        txData='AT+CWJAP="{}","{}"\r\n'.format(ssid, pwd)
+        if bssid != None:
+            txData='AT+CWJAP="{}","{}","{}"\r\n'.format(ssid, pwd, bssid)
+        else:
+            txData='AT+CWJAP="{}","{}"\r\n'.format(ssid, pwd)
         #print(txData)
-        retData = self._sendToESP(txData)
+        retData = self._sendToESP(txData, replyURCs=ESP_CWJAP_URCS)
         #print(".....")
         #print(retData)
-        if(retData!=None):
-            if "+CWJAP" in retData:
-                if "1" in retData:
-                    return ESP_WIFI_DISCONNECTED
-                elif "2" in retData:
-                    return ESP_WIFI_AP_WRONG_PWD
-                elif "3" in retData:
-                    return ESP_WIFI_AP_NOT_PRESENT
-                elif "4" in retData:
-                    return ESP_WIFI_DISCONNECTED
-                else:
-                    return None
-            elif ESP_WIFI_CONNECTED in retData:
-                if ESP_WIFI_GOT_IP_CONNECTED in retData:
-                    return ESP_WIFI_CONNECTED
-                else:
-                    return ESP_WIFI_DISCONNECTED
-            else:
-                return ESP_WIFI_DISCONNECTED
-        else:
-                return ESP_WIFI_DISCONNECTED
+        return _wifiResult(retData)
             
         
         
+    def getConnectedAP(self):
+        """
+        Get the AP the ESP is connected to (AT+CWJAP?)
+        
+        Return:
+            (ssid, bssid, channel, rssi) tuple or None if not connected
+        """
+        retData = self._sendToESP("AT+CWJAP?\r\n")
+        if retData == None or "+CWJAP:\"" not in retData:
+            return None
+        line = retData.partition("+CWJAP:")[2].partition("\r\n")[0]
+        # The SSID may contain commas, the fields after it don't
+        ssidEnd = line.find('","')
+        fields = line[ssidEnd+2:].split(",")
+        try:
+            return line[1:ssidEnd], fields[0].strip('"'), int(fields[1]), int(fields[2])
+        except (IndexError, ValueError):
+            return None
+    
     def disconnectWiFi(self):
         """
         Disconnect WIFI
@@ -383,20 +1015,229 @@ class ESP:
     """
     HTTP operations [GET, POST]
     """
-    def _createTCPConnection(self, link, port=80):
+    def setMultiConnection(self, enable=True):
+        """
+        Switch between single (AT+CIPMUX=0) & multi connection mode (AT+CIPMUX=1, link ID 0-4).
+        In multi connection mode the sessions to different hosts stay open side by side.
+        Every open connection is closed first.
+        
+        Return:
+            True on successfully set the connection mode
+            False on failed to set the connection mode
+        """
+        self.pool.closeAll()
+        retData = self._sendToESP("AT+CIPMUX={}\r\n".format(1 if enable else 0))
+        if(retData != None):
+            if ESP_OK_STATUS in retData:
+                self.__multiConnection = enable
+                self.pool.setLinks(POOL_MAX_LINKS if enable else 1)
+                return True
+            else:
+                return False
+        else:
+            return False
+    
+    def setRecvMode(self, passive=True):
+        """
+        Switch between active (AT+CIPRECVMODE=0, ESP pushes +IPD data as it arrives) & passive receive mode (AT+CIPRECVMODE=1).
+        In passive mode the ESP keeps the received data & the driver pulls it with AT+CIPRECVDATA in pieces which
+        fit into the free space of the UART Rx buffer, so big downloads never overflow it.
+        
+        Return:
+            True on successfully set the receive mode
+            False on failed to set the receive mode
+        """
+        retData = self._sendToESP("AT+CIPRECVMODE={}\r\n".format(1 if passive else 0))
+        if(retData != None):
+            if ESP_OK_STATUS in retData:
+                self.__passiveRecv = passive
+                return True
+            else:
+                return False
+        else:
+            return False
+    
+    def _pullData(self, dataSink, linkId=0, delay=10):
+        """
+        Private function for pulling the received data of the link in passive receive mode, until the dataSink is complete
+        
+        Return:
+            True if dataSink reported complete
+        """
+        startTime = ticks_ms()
+        while not dataSink.isComplete():
+            if not self.__recvNotified[linkId]:
+                self.pollURC()
+            if not self.__recvNotified[linkId]:
+                if not self.pool.isOpen(linkId) or ticks_diff(ticks_ms(), startTime) > delay*1000:
+                    break
+                sleep_ms(1)
+                continue
+            # Never ask for more than what fits into the free part of the UART Rx buffer
+            readLength = UART_Rx_BUFFER_LENGTH - ESP_RECV_OVERHEAD - self.__uartObj.any()
+            self.__tokenizer.recvLength = 0
+            retData = self._sendToESP("AT+CIPRECVDATA={}{}\r\n".format(self._linkCMD(linkId), readLength), dataSink=dataSink, dataLink=None)
+            if retData == None or ESP_OK_STATUS not in retData or self.__tokenizer.recvLength == 0:
+                # Everything is read, wait for the next +IPD notification
+                self.__recvNotified[linkId] = False
+            else:
+                startTime = ticks_ms()
+        return dataSink.isComplete()
+    
+    def openPassthrough(self, host, port=80):
+        """
+        Open a socket connection in transparent transmission mode (AT+CIPMODE=1), for bulk transfers at full UART speed.
+        Only works in single connection mode. While the stream is open, no other ESP method may be used.
+        
+        Parameter:
+            host (str): Host URL or IP
+            port (int): Port number [Default port number 80, 443 uses SSL]
+        
+        Return:
+            PassthroughStream object [write(), readinto(), read(), close()] or None on failure
+        """
+        if self.__multiConnection:
+            return None
+        linkId = self.pool.acquire(host, port)
+        if linkId == None:
+            return None
+        retData = self._sendToESP("AT+CIPMODE=1\r\n")
+        if retData != None and ESP_OK_STATUS in retData:
+            retData = self._sendToESP("AT+CIPSEND\r\n", terminators=ESP_PROMPT_TERMINATORS)
+            if retData != None and ">" in retData:
+                # From here on the UART carries the raw socket data, nothing may stay in the tokenizer
+                self.__tokenizer.reset()
+                from passthrough import PassthroughStream
+                return PassthroughStream(self, self.__uartObj)
+        self._sendToESP("AT+CIPMODE=0\r\n")
+        self.pool.release(linkId, close=True)
+        return None
+    
+    def _closePassthrough(self):
+        """
+        Private function for leaving the transparent transmission mode, see PassthroughStream.close()
+        
+        Return:
+            True if the ESP is back in AT command mode
+        """
+        sleep_ms(ESP_PASSTHROUGH_GUARD_TIME)
+        self._write("+++")
+        sleep_ms(ESP_PASSTHROUGH_GUARD_TIME)
+        # Drop the socket data which was still on the way
+        self.__tokenizer.reset()
+        while self._fill() > 0:
+            self.__tokenizer.reset()
+        retData = self._sendToESP("AT+CIPMODE=0\r\n")
+        self.pool.release(0, close=True)
+        if retData != None and ESP_OK_STATUS in retData:
+            return True
+        return False
+    
+    def _linkCMD(self, linkId):
+        """
+        Private function for the link ID parameter of the socket AT commands, empty in single connection mode
+        """
+        if self.__multiConnection:
+            return str(linkId)+","
+        return ""
+    
+    def resolve(self, host):
+        """
+        Resolve a host name into its IP address with AT+CIPDOMAIN, through the DNS cache if one is set
+        
+        Parameters:
+            host (str): Host name [ex: "www.httpbin.org"]
+        
+        Return:
+            IP address [ex: "54.204.39.132"] or None if the lookup failed
+        """
+        from dnsCache import isIP
+        if isinstance(host, bytes):
+            host = str(host, "utf-8")
+        if isIP(host):
+            return host
+        if self.dns != None:
+            ip = self.dns.get(host)
+            if ip != None:
+                return ip
+        retData = self._sendToESP('AT+CIPDOMAIN="{}"\r\n'.format(host))
+        if retData == None or ESP_OK_STATUS not in retData:
+            return None
+        ip = retData.partition("+CIPDOMAIN:")[2].split("\r\n")[0].strip('"')
+        if not isIP(ip):
+            return None
+        if self.dns != None:
+            self.dns.put(host, ip)
+        return ip
+    
+    def preResolve(self, hosts):
+        """
+        Resolve the hosts into the DNS cache ahead, ex. at startup, so the first requests don't wait for DNS
+        
+        Parameters:
+            hosts (list): Host names
+        
+        Return:
+            Number of resolved hosts
+        """
+        count = 0
+        for host in hosts:
+            if self.resolve(host) != None:
+                count += 1
+        return count
+    
+    def _setSNI(self, linkId, host):
+        """
+        Private function for the SNI host name of an SSL connection opened by IP (AT+CIPSSLCSNI)
+        
+        Return:
+            False if the firmware doesn't support it, the connection must then be opened by name
+        """
+        if self.__sniSupported:
+            retData = self._sendToESP('AT+CIPSSLCSNI={}"{}"\r\n'.format(self._linkCMD(linkId), host))
+            if retData != None and ESP_OK_STATUS in retData:
+                return True
+            if retData != None and ESP_ERROR_STATUS in retData:
+                self.__sniSupported = False
+        return False
+    
+    def _createTCPConnection(self, link, port=80, linkId=0):
         """
         Creates a TCP connection between with the Host.
         Just like create a socket before complete the HTTP Get/Post requests.
+        Use pool.acquire() instead, it keeps track of the open connections.
+        With a DNS cache the connection is opened by the host's IP, the cached IP is dropped if that fails.
         
         Return:
             False on failed to create a socket connection
             True on successfully create and establish a socket connection.
         """
-        #self._sendToESP("AT+CIPMUX=0")
         reqProtocol = "TCP"
         if port == 443:
             reqProtocol = "SSL"
-        txData='AT+CIPSTART="{}","{}",{}\r\n'.format(reqProtocol, link, str(port))
+        if isinstance(link, bytes):
+            link = str(link, "utf-8")
+        address = link
+        if self.dns != None:
+            from dnsCache import isIP
+            if not isIP(link):
+                address = self.resolve(link)
+                if address == None or (reqProtocol == "SSL" and not self._setSNI(linkId, link)):
+                    # Let the ESP do the lookup itself
+                    address = link
+        if self._startConnection(reqProtocol, address, port, linkId):
+            return True
+        if address != link:
+            # The cached address may be stale
+            self.dns.invalidate(link)
+            return self._startConnection(reqProtocol, link, port, linkId)
+        return False
+    
+    def _startConnection(self, reqProtocol, link, port, linkId):
+        """
+        Private function for AT+CIPSTART
+        """
+        txData='AT+CIPSTART={}"{}","{}",{}\r\n'.format(self._linkCMD(linkId), reqProtocol, link, str(port))
         #print("txData:", txData)
         retData = self._sendToESP(txData)
         #print(retData)
@@ -406,7 +1247,183 @@ class ESP:
             else:
                 return False
         else:
-            False
+            return False
+    
+    def _closeTCPConnection(self, linkId=0):
+        """
+        Close the socket connection, use pool.close() instead
+        """
+        if self.__multiConnection:
+            self._sendToESP("AT+CIPCLOSE={}\r\n".format(linkId))
+        else:
+            self._sendToESP("AT+CIPCLOSE\r\n")
+    
+    def _cipsendCMD(self, linkId, length):
+        """
+        Private function for the "AT+CIPSEND=[<link ID>,]<length>" command, built without new strings
+        """
+        cmd = self.__cmdBuilder
+        cmd.reset()
+        cmd.add(b"AT+CIPSEND=")
+        if self.__multiConnection:
+            cmd.addInt(linkId)
+            cmd.add(b",")
+        cmd.addInt(length)
+        cmd.add(b"\r\n")
+        return cmd.getRequest()
+    
+    def setCompression(self, enable=True):
+        """
+        Ask for compressed responses (Accept-Encoding: gzip, deflate), they are decompressed on the fly as they arrive.
+        Fewer bytes cross the UART, ex. JSON shrinks 5-10x, at the cost of a 32 KB window while a response is decompressed.
+        
+        Return:
+            True if compression is on, False if the port can't decompress (no zlib/deflate module)
+        """
+        if enable:
+            from contentDecoder import decoderAvailable
+            enable = decoderAvailable()
+        self.__compression = enable
+        return self.__compression
+    
+    def _buildRequest(self, method, host, path, user_agent, headers, connection, content_type=None, body=None):
+        """
+        Private function for writing an HTTP request into the reused request buffer, see RequestBuilder.httpRequest()
+        
+        Return:
+            (request memoryview, RequestBody still to send or None), (None, None) if the header itself doesn't fit
+        """
+        return self.__builder.httpRequest(method, host, path, user_agent, headers, connection, content_type, body, self.__compression)
+    
+    def _sendSlice(self, data, parser, delay=10, linkId=0):
+        """
+        Private function for sending one AT+CIPSEND slice of a request, see _sendHTTPRequest()
+        
+        Return:
+            True if the ESP answered SEND OK or the response already arrived
+        """
+        retData = self._sendToESP(self._cipsendCMD(linkId, len(data)), terminators=ESP_PROMPT_TERMINATORS)
+        if retData == None or ">" not in retData:
+            return False
+        # The server may answer before the body is complete, ex. 401 or 413
+        retData = self._sendToESP(data, delay=delay, terminators=ESP_SEND_OK_TERMINATORS, dataSink=None if self.__passiveRecv else parser, dataLink=linkId)
+        return parser.isComplete() or (retData != None and "SEND OK" in retData)
+    
+    def _sendHTTPRequest(self, request, parser, delay=10, linkId=0, body=None):
+        """
+        Send an HTTP request over the open socket connection & feed the response into the parser
+        
+        Parameters:
+            request (bytes): Complete HTTP request, or only its header when body is given
+            parser (HttpParser): Parser for the response, reset by the caller
+            delay (float): Maximum time (in seconds) to wait for the response [Default 10]
+            linkId (int): Link ID of the connection [Default 0]
+            body (RequestBody): Body sent after the header, one AT+CIPSEND slice at a time [Default None]
+        
+        Return:
+            True if the complete response arrived
+        """
+        self.__requestSent = False
+        if body != None:
+            return self._sendHTTPBody(request, body, parser, delay, linkId)
+        retData = self._sendToESP(self._cipsendCMD(linkId, len(request)), terminators=ESP_PROMPT_TERMINATORS)
+        if retData == None or ">" not in retData:
+            return False
+        if self.__passiveRecv:
+            self.__recvNotified[linkId] = False
+            retData = self._sendToESP(request, delay=delay, terminators=ESP_SEND_OK_TERMINATORS)
+            if retData == None or "SEND OK" not in retData:
+                return False
+            self.__requestSent = True
+            return self._pullData(parser, linkId, delay)
+        closed = (self._linkCMD(linkId)+"CLOSED").encode()
+        self._sendToESP(request, delay=delay, terminators=(closed, b"SEND FAIL", b"ERROR"), dataSink=parser, dataLink=linkId, lineSink=self._sendLine)
+        return parser.isComplete()
+    
+    def _sendLine(self, line):
+        """
+        Private function for the response lines while a request is sent, SEND OK tells the ESP took it
+        """
+        if line == b"SEND OK":
+            self.__requestSent = True
+    
+    def _requestSent(self):
+        """
+        Private function telling whether the ESP took the whole latest request (SEND OK), so the server may have
+        processed it even if no response came, see HttpSession.request()
+        """
+        return self.__requestSent
+    
+    def _sendHTTPBody(self, header, body, parser, delay=10, linkId=0):
+        """
+        Private function for sending the request header & then the body slice by slice, see _sendHTTPRequest()
+        """
+        if self.__passiveRecv:
+            self.__recvNotified[linkId] = False
+        data = header
+        while data != None:
+            if not self._sendSlice(data, parser, delay, linkId):
+                return False
+            if parser.isComplete():
+                return True
+            data = body.nextSlice()
+        self.__requestSent = True
+        if self.__passiveRecv:
+            return self._pullData(parser, linkId, delay)
+        closed = (self._linkCMD(linkId)+"CLOSED").encode()
+        self._sendToESP(b"", delay=delay, terminators=(closed, b"SEND FAIL", b"ERROR"), dataSink=parser, dataLink=linkId)
+        return parser.isComplete()
+    
+    def _doHttp(self, host, port, request, body=None):
+        """
+        Private function for a one-shot HTTP request, the connection is closed afterwards
+        """
+        linkId = self.pool.acquire(host, port)
+        if linkId == None:
+            return 0, None
+        self._createHTTPParseObj()
+        if not self._sendHTTPRequest(request, self.__httpResponse, linkId=linkId, body=body):
+            # Connection: close was asked, a body without length ends with the connection
+            self.__httpResponse.finish()
+        self.pool.release(linkId, close=True)
+        if self.__httpResponse.isComplete():
+            return self.__httpResponse.getHTTPErrCode(), self.__httpResponse.getHTTPResponse()
+        return 0, None
+    
+    def startWorker(self, queueLength=8):
+        """
+        Run the driver on the second core, so the caller's loop never waits for the ESP. From now on call the ESP
+        methods through the worker: jobId = worker.post(...) / worker.publish(...) / worker.submit("method", ...),
+        then collect the (job ID, result) tuples with worker.poll().
+        
+        Parameter:
+            queueLength (int): Size of the request & response rings [Default 8]
+        
+        Return:
+            Started ESPWorker object or None if the port has no _thread
+        """
+        from espWorker import ESPWorker
+        worker = ESPWorker(self, queueLength)
+        if not worker.start():
+            return None
+        return worker
+    
+    def session(self, host, port=80, user_agent="RPi-Pico"):
+        """
+        Get the keep-alive HTTP session of host:port, its connection stays open between the requests
+        
+        Parameter:
+            host (str): Host URL [ex: www.httpbin.org]
+            port (int): HTTP port number [Default port number 80]
+            user_agent (str): User Agent Name [Default "RPi-Pico"]
+        
+        Return:
+            HttpSession object [get(), post(), close()]
+        """
+        key = (host, port)
+        if key not in self.__sessions:
+            self.__sessions[key] = HttpSession(self, host, port, user_agent)
+        return self.__sessions[key]
     
     def doHttpGet(self,host,path,user_agent="RPi-Pico", port=80, headers=''):
         """
@@ -421,29 +1438,65 @@ class ESP:
         
         Return:
             HTTP error code & HTTP response[If error not equal to 200 then the response is None]
-            On failed return 0 and None
+            On failed return 0 and None. With a cache set, a 304 Not Modified answer returns 200 & the cached response
         """
-
-        if(self._createTCPConnection(host, port) == True):
-            self._createHTTPParseObj()
-            getHeader='GET {} HTTP/1.1\r\n{}Host: {}\r\nUser-Agent: {}\r\n\r\n'.format(path, headers, host, user_agent)
-            print("Get header: ",getHeader,len(getHeader))
-            txData="AT+CIPSEND="+str(len(getHeader))+"\r\n"
-            retData = self._sendToESP(txData)
-            if(retData != None):
-                if ">" in retData:
-                    retData = self._sendToESP(getHeader, delay=2)
-                    self._sendToESP("AT+CIPCLOSE\r\n")
-                    retData=self.__httpResponse.parseHTTP(retData)
-                    return retData, self.__httpResponse.getHTTPResponse()
-                else:
-                    return 0, None
-            else:
-                return 0, None
-        else:
-            self._sendToESP("AT+CIPCLOSE\r\n")
+        if self.cache != None:
+            return self._cachedGet(host, port, path, headers, lambda headers: self._httpGet(host, path, user_agent, port, headers), lambda: self.__httpResponse)
+        return self._httpGet(host, path, user_agent, port, headers)
+    
+    def _httpGet(self, host, path, user_agent, port, headers):
+        getHeader, body = self._buildRequest(b"GET", host, path, user_agent, headers, b"close")
+        if getHeader == None:
             return 0, None
-            
+        return self._doHttp(host, port, getHeader)
+    
+    def _cachedGet(self, host, port, path, headers, fetch, getParser):
+        """
+        Private function for a GET through the HttpCache: a fresh entry is returned without a request, a stale one is revalidated
+        
+        Parameters:
+            fetch (function): Does the request with the given extra headers, returns (HTTP error code, HTTP response)
+            getParser (function): Returns the HttpParser of the response
+        """
+        entry = self.cache.lookup(host, port, path)
+        if entry != None:
+            if self.cache.isFresh(entry):
+                self.cache.hits += 1
+                return 200, self.cache.getBody(entry)
+            headers = headers + self.cache.validators(entry)
+        httpCode, httpRes = fetch(headers)
+        return self.cache.update(host, port, path, entry, httpCode, httpRes, getParser())
+        
+    def download(self, host, path, filePath, port=80, sha256=None, onProgress=None, attempts=3, bufferLength=512, user_agent="RPi-Pico", headers=''):
+        """
+        Download a file (ex. firmware) to the flash, streamed through one bufferLength buffer whatever its size.
+        A lost connection is resumed with a Range request, a later call also resumes the <filePath>.part file of a failed one.
+        
+        Parameter:
+            host (str): Host URL [ex: www.httpbin.org]
+            path (str): URL path of the file
+            filePath (str): Path of the file on the flash
+            port (int): HTTP port number [Default port number 80]
+            sha256 (str): Expected SHA-256 of the file as hex string, a corrupt file is deleted [Default None, not checked]
+            onProgress (function): Called with (received bytes, total bytes or None) after every written buffer [Default None]
+            attempts (int): Number of requests before giving up [Default 3]
+            bufferLength (int): Size of the write buffer [Default 512]
+            user_agent (str): User Agent Name [Default "RPi-Pico"]
+            headers (str): Extra headers, for example Authorization. Remember to add "\r\n" at the end.
+        
+        Return:
+            FileDownload object [complete, error, received, total, hexdigest(), throughput()]
+        """
+        from fileDownload import FileDownload
+        download = FileDownload(self, host, path, filePath, port, sha256, bufferLength, user_agent, headers)
+        # A Range of a compressed body isn't a Range of the file
+        compression = self.__compression
+        self.__compression = False
+        try:
+            download.run(attempts, onProgress)
+        finally:
+            self.__compression = compression
+        return download
         
     def doHttpPost(self,host,path,user_agent,content_type,content,port=80, headers=''):
         """
@@ -454,35 +1507,47 @@ class ESP:
             path (str): Get operation's URL path [ex: get operation URL: www.httpbin.org/ip. so, the path "/ip"]
             user-agent (str): User Agent Name [Default "RPi-Pico"]
             content_type (str): Post operation's upload content type [ex. "application/json", "application/x-www-form-urlencoded", "text/plain"
-            content (str): Post operation's upload content 
+            content (str): Post operation's upload content. Bigger than 2048 bytes, a file, a generator or a buffer is streamed, see doHttpUpload()
             post (int): HTTP post number [Default port number 80]
             headers (str): Extra headers, for example Authorization. Remember to add "\r\n" at the end.
         
         Return:
             HTTP error code & HTTP response[If error not equal to 200 then the response is None]
-            On failed return 0 and None
+            On failed return 0 and None, with a spool set the request is stored for drainSpool()
         
         """
-        if(self._createTCPConnection(host, port) == True):
-            self._createHTTPParseObj()
-            postHeader='POST {} HTTP/1.1\r\n{}Host: {}\r\nUser-Agent: {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n\r\n{}\r\n'.format(path, headers, host, user_agent, content_type, str(len(content)), content)
-            txData="AT+CIPSEND="+str(len(postHeader))+"\r\n"
-            retData = self._sendToESP(txData)
-            if(retData != None):
-                if ">" in retData:
-                    retData = self._sendToESP(postHeader, delay=2)
-                    #print(".......@@",retData)            
-                    self._sendToESP("AT+CIPCLOSE\r\n")
-                    #print(self.__httpResponse)
-                    retData=self.__httpResponse.parseHTTP(retData)
-                    return retData, self.__httpResponse.getHTTPResponse()
-                else:
-                    return 0, None
-            else:
-                return 0, None
-        else:
-            self._sendToESP("AT+CIPCLOSE\r\n")
+        httpCode, httpRes = self.doHttpUpload(host, path, user_agent, content_type, content, port, headers)
+        if httpCode == 0 and self.spool != None and not self.__draining and isinstance(content, (str, bytes)):
+            from flashQueue import FLASH_QUEUE_HTTP_POST
+            meta = "\0".join((host, str(port), path, user_agent, content_type, headers))
+            self.spool.append(FLASH_QUEUE_HTTP_POST, meta, content)
+        return httpCode, httpRes
+    
+    def doHttpUpload(self, host, path, user_agent, content_type, content, port=80, headers='', method="POST", length=None):
+        """
+        Do HTTP POST/PUT request. A body which doesn't fit into one AT+CIPSEND with the header is streamed: the header
+        & then the body are sent in AT+CIPSEND sized slices, so the body can be bigger than the free heap. A body with unknown length is sent with chunked transfer-encoding.
+        
+        Parameter:
+            host (str): Host URL [ex: www.httpbin.org]
+            path (str): URL path [ex: "/post"]
+            user-agent (str): User Agent Name
+            content_type (str): Upload content type [ex. "application/json", "text/plain"]
+            content (obj): Buffer (str, bytes, bytearray, memoryview), file opened in binary mode, generator of bytes or RequestBody
+            port (int): HTTP port number [Default port number 80]
+            headers (str): Extra headers, for example Authorization. Remember to add "\r\n" at the end.
+            method (str): HTTP method [Default "POST", ex. "PUT"]
+            length (int): Body length in bytes, if the content can't tell it itself [Default None]
+        
+        Return:
+            HTTP error code & HTTP response[If error not equal to 200 then the response is None]
+            On failed return 0 and None
+        """
+        body = content if isinstance(content, RequestBody) else RequestBody(content, length)
+        uploadHeader, body = self._buildRequest(method, host, path, user_agent, headers, b"close", content_type, body)
+        if uploadHeader == None:
             return 0, None
+        return self._doHttp(host, port, uploadHeader, body)
         
     """
     MQTT operations
@@ -495,7 +1560,9 @@ class ESP:
         Parameters:
             retData (str): Return data from AT command
         """
-        if ESP_OK_STATUS in retData:
+        if retData == None:
+            return None
+        elif ESP_OK_STATUS in retData:
             return "OK"
         elif ESP_ERROR_STATUS in retData:
             return "ERROR"
@@ -558,7 +1625,7 @@ class ESP:
             mqttRet string
         """
         txData='AT+MQTTCONN=0,"{}",{},{}\r\n'.format(host,str(port),str(reconnect))
-        retData = self._sendToESP(txData)
+        retData = self._sendToESP(txData, replyURCs=ESP_MQTTCONN_URCS)
         return self.mqttRet(retData)
         
     def mqttPublish(self, topic, data, qos=1, retain=0):
@@ -567,15 +1634,130 @@ class ESP:
 
         Parameters:
             topic (str): MQTT topic. Maximum length: 128 bytes.
-            data (str): MQTT message in string.
+            data (str/bytes): MQTT message. Bytes or a string with quotes or commas (ex. JSON) is sent raw with AT+MQTTPUBRAW.
             qos (int): QoS of message, which can be set to 0, 1, or 2. Default: 0.
             retain (int): retain flag.
 
         Return:
-            mqttRet string
+            mqttRet string, with a spool set a message which failed is stored for drainSpool()
+        """
+        if not isinstance(data, str) or '"' in data or ',' in data:
+            retData = self._mqttPublishRaw([(0, topic, data, qos, retain)])[0][1]
+        else:
+            txData='AT+MQTTPUB=0,"{}","{}",{},{}\r\n'.format(topic, data, str(qos), str(retain))
+            retData = self.mqttRet(self._sendToESP(txData))
+        if retData != "OK" and self.spool != None and not self.__draining:
+            from flashQueue import FLASH_QUEUE_MQTT_PUBLISH
+            self.spool.append(FLASH_QUEUE_MQTT_PUBLISH, "{}\0{}\0{}".format(topic, qos, retain), data)
+        return retData
+    
+    def drainSpool(self, batch=8):
+        """
+        Send the spooled POST requests & MQTT messages again, oldest first. Call it once the WiFi/MQTT link is back,
+        it stops at the first one which still fails.
+        
+        Parameter:
+            batch (int): Maximum number of records to send [Default 8]
+        
+        Return:
+            Number of sent records
+        """
+        if self.spool == None:
+            return 0
+        self.__draining = True
+        try:
+            return self.spool.drain(self._sendSpooled, batch)
+        finally:
+            self.__draining = False
+    
+    def _sendSpooled(self, kind, meta, data):
+        """
+        Private function for sending one spool record, see drainSpool()
+        
+        Return:
+            True once delivered
+        """
+        from flashQueue import FLASH_QUEUE_HTTP_POST, FLASH_QUEUE_MQTT_PUBLISH
+        fields = _decode(meta).split("\0")
+        if kind == FLASH_QUEUE_HTTP_POST:
+            host, port, path, user_agent, content_type, headers = fields
+            try:
+                # A text body goes out in one AT+CIPSEND again
+                data = str(data, "utf-8")
+            except UnicodeError:
+                pass
+            httpCode, httpRes = self.doHttpPost(host, path, user_agent, content_type, data, int(port), headers)
+            # Any HTTP answer means the server got it
+            return httpCode != 0
+        if kind == FLASH_QUEUE_MQTT_PUBLISH:
+            topic, qos, retain = fields
+            return self.mqttPublish(topic, data, int(qos), int(retain)) == "OK"
+        # Unknown record, don't let it block the queue
+        return True
+    
+    def _mqttPubResults(self, retData, unacked, results):
+        """
+        Private function for matching the +MQTTPUB results in retData with the oldest unacknowledged messages
+        """
+        if retData == None:
+            return
+        for line in retData.split("\r\n"):
+            self._mqttPubResult(line.encode(), unacked, results)
+    
+    def _mqttPubResult(self, line, unacked, results):
+        """
+        Private function for matching one +MQTTPUB result line (bytes) with the oldest unacknowledged message
         """
-        txData='AT+MQTTPUB=0,"{}","{}",{},{}\r\n'.format(topic, data, str(qos), str(retain))
-        retData = self.mqttRet(self._sendToESP(txData))
+        if unacked and line.startswith(b"+MQTTPUB:"):
+            results.append((unacked.pop(0), "OK" if line == b"+MQTTPUB:OK" else "FAIL"))
+    
+    def _mqttPublishRaw(self, messages):
+        """
+        Private function for publishing messages with AT+MQTTPUBRAW, see PublishQueue.flush()
+        
+        Parameters:
+            messages (list): (message ID, topic, data, qos, retain) items
+        
+        Return:
+            List of (message ID, result) tuples in the order of messages
+        """
+        results = list()
+        unacked = list()
+        # The results of the pipelined messages arrive before the prompt (or a busy p...), they're taken as they come
+        def collect(line):
+            self._mqttPubResult(line, unacked, results)
+        for msgId, topic, data, qos, retain in messages:
+            if isinstance(data, str):
+                data = data.encode()
+            txData = 'AT+MQTTPUBRAW=0,"{}",{},{},{}\r\n'.format(topic, len(data), qos, retain)
+            for attempt in range(ESP_BUSY_RETRY):
+                retData = self._sendToESP(txData, terminators=ESP_PROMPT_TERMINATORS, lineSink=collect)
+                if retData != "ESP BUSY\r\n":
+                    break
+                sleep_ms(10)
+            if retData == None or ">" not in retData:
+                results.append((msgId, "ESP BUSY\r\n" if retData == "ESP BUSY\r\n" else self.mqttRet(retData)))
+                continue
+            unacked.append(msgId)
+            if qos == 0:
+                self._write(data)
+            else:
+                # The ESP stays busy until the broker acknowledged the message
+                self._mqttPubResults(self._sendToESP(data, terminators=ESP_MQTTPUB_TERMINATORS), unacked, results)
+        
+        while unacked:
+            retData = self._sendToESP(b"", terminators=ESP_MQTTPUB_TERMINATORS)
+            if retData == None:
+                break
+            self._mqttPubResults(retData, unacked, results)
+        for msgId in unacked:
+            results.append((msgId, None))
+        
+        order = dict()
+        for index in range(len(messages)):
+            order[messages[index][0]] = index
+        results.sort(key=lambda result: order[result[0]])
+        return results
         
     def mqttSubscribe(self, topic, qos=1):
         """
@@ -597,34 +1779,22 @@ class ESP:
         """
         retData = self.mqttRet(self._sendToESP("AT+MQTTCLEAN=0"))
 
-    def listenForIncome(self, delay=None):
+    def listenForIncome(self, delay=None, timeout=None):
         """
-        Listen for incoming data
+        Listen for incoming data, returns the next unsolicited line which no URC callback or topic queue took.
+        It sleeps in select.poll() on the UART until bytes arrive, so the CPU stays idle between the messages.
 
         Parameters:
-            delay (float): Delay between scans
+            delay (float): Poll interval (in seconds) of a UART-like object which can't be polled [Default 1 msec]
+            timeout (float): Maximum time (in seconds) to wait [Default None, wait forever]
 
         Return: 
-            List containing: MQTT res type, Topic, length, Message
+            List containing: MQTT res type, Topic, length, Message. None on timeout
         """
-        self.__rxData=str()
-        self.__rxData=bytes()
-        
-        time.sleep(delay)
-        
-        while True:
-            #print(".")
-            if self.__uartObj.any()>0:
-                #print(self.__uartObj.any())
-                break
-        
-        while self.__uartObj.any()>0:
-            self.__rxData += self.__uartObj.read(UART_Rx_BUFFER_LENGTH)
-        
-        res = self.__rxData.decode('utf-8')
-        res = res.replace('\r\n', '')
-        res = res.split(',')
-        return res
+        line = self._waitURC(self.urc.getURC, timeout, delay)
+        if line == None:
+            return None
+        return splitURC(line)
         
         
     def __del__(self):
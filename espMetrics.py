@@ -0,0 +1,86 @@
+# Upper bounds (in msec) of the latency histogram buckets, the last bucket takes everything slower
+METRICS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_CMD_COUNT = 0
+_CMD_TOTAL = 1
+_CMD_MIN = 2
+_CMD_MAX = 3
+_CMD_TIMEOUTS = 4
+_CMD_BUSY = 5
+_CMD_HISTOGRAM = 6
+
+
+class ESPMetrics:
+    """
+    This is a class for counting what the ESP driver does: per AT command the number of calls, the latency
+    (min/avg/max & a histogram), timeouts & busy p... answers, plus the bytes sent & received over the UART.
+    Enable it with ESP.enableMetrics(), while it's off the driver only pays one None check per command.
+
+    Attributes:
+        txBytes (int): Bytes written to the ESP
+        rxBytes (int): Bytes read from the ESP
+    """
+
+    def __init__(self):
+        """
+        The constaructor for ESPMetrics class
+        """
+        self.txBytes = 0
+        self.rxBytes = 0
+        self.__commands = dict()
+
+    def reset(self):
+        """
+        Start counting from zero
+        """
+        self.txBytes = 0
+        self.rxBytes = 0
+        self.__commands = dict()
+
+    def record(self, command, elapsed, timedOut=False, busy=False):
+        """
+        Count one finished command
+
+        Parameters:
+            command (str): AT command name [ex: "AT+CIPSEND"], "DATA" for raw data
+            elapsed (int): Time (in msec) until the answer or the timeout
+            timedOut (bool): No answer within the timeout
+            busy (bool): The ESP answered busy p...
+        """
+        entry = self.__commands.get(command)
+        if entry == None:
+            entry = [0, 0, elapsed, elapsed, 0, 0, [0]*(len(METRICS_BUCKETS)+1)]
+            self.__commands[command] = entry
+        entry[_CMD_COUNT] += 1
+        entry[_CMD_TOTAL] += elapsed
+        if elapsed < entry[_CMD_MIN]:
+            entry[_CMD_MIN] = elapsed
+        if elapsed > entry[_CMD_MAX]:
+            entry[_CMD_MAX] = elapsed
+        if timedOut:
+            entry[_CMD_TIMEOUTS] += 1
+        if busy:
+            entry[_CMD_BUSY] += 1
+        bucket = 0
+        while bucket < len(METRICS_BUCKETS) and elapsed > METRICS_BUCKETS[bucket]:
+            bucket += 1
+        entry[_CMD_HISTOGRAM][bucket] += 1
+
+    def stats(self):
+        """
+        Return the counters as dict of plain numbers & lists, ready for json.dumps(), ex. for publishing over MQTT:
+        {"tx": bytes, "rx": bytes, "buckets": METRICS_BUCKETS,
+         "commands": {name: {"count", "min", "avg", "max", "timeouts", "busy", "histogram"}}}
+        """
+        commands = dict()
+        for command, entry in self.__commands.items():
+            commands[command] = {
+                "count": entry[_CMD_COUNT],
+                "min": entry[_CMD_MIN],
+                "avg": entry[_CMD_TOTAL] // entry[_CMD_COUNT],
+                "max": entry[_CMD_MAX],
+                "timeouts": entry[_CMD_TIMEOUTS],
+                "busy": entry[_CMD_BUSY],
+                "histogram": list(entry[_CMD_HISTOGRAM]),
+            }
+        return {"tx": self.txBytes, "rx": self.rxBytes, "buckets": list(METRICS_BUCKETS), "commands": commands}
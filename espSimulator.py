@@ -0,0 +1,472 @@
+import time
+import random
+import zlib
+from dnsCache import isIP
+
+# Processing time (in seconds) of the simulated ESP per AT command, before the final answer
+SIM_COMMAND_LATENCY = {
+    "AT": 0.002,
+    "ATE0": 0.002,
+    "ATE1": 0.002,
+    "AT+RST": 0.5,
+    "AT+RESTORE": 0.5,
+    "AT+GMR": 0.005,
+    "AT+CWMODE": 0.01,
+    "AT+CWMODE_CUR": 0.01,
+    "AT+CWMODE_DEF": 0.02,
+    "AT+CWJAP": 2.0,
+    "AT+CWQAP": 0.05,
+    "AT+CWLAP": 2.0,
+    "AT+CWLAPOPT": 0.002,
+    "AT+CIPDOMAIN": 0.15,
+    "AT+CIPSTART": 0.08,
+    "AT+CIPSEND": 0.002,
+    "AT+CIPCLOSE": 0.01,
+    "AT+MQTTCONN": 0.3,
+    "AT+MQTTPUB": 0.01,
+    "AT+MQTTPUBRAW": 0.002,
+    "AT+MQTTSUB": 0.05,
+}
+# Processing time for the commands not listed above
+SIM_DEFAULT_LATENCY = 0.005
+
+_VERSION = b"AT version:1.7.4.0(May 11 2020 19:13:04)\r\nSDK version:3.0.4(9532ceb)\r\ncompile time:May 27 2020 10:12:22\r\nBin version(Wroom 02):1.7.4\r\n"
+
+
+def defaultHttpHandler(method, path, headers, body):
+    """
+    HTTP server of the simulator: GET /bytes/<n> answers n bytes (Range requests too), everything else a small JSON echo
+
+    Return:
+        (status code, body bytes) or (status code, body bytes, extra header dict)
+    """
+    if path.startswith("/bytes/"):
+        length = int(path[7:])
+        if headers.get("range", "").startswith("bytes="):
+            first = int(headers["range"][6:].split("-")[0])
+            if first >= length:
+                return 416, b"", {"Content-Range": "bytes */{}".format(length)}
+            return 206, bytes(48 + index % 10 for index in range(first, length)), {"Content-Range": "bytes {}-{}/{}".format(first, length-1, length)}
+        return 200, bytes(48 + index % 10 for index in range(length))
+    return 200, '{{"method": "{}", "path": "{}", "length": {}}}'.format(method, path, len(body)).encode()
+
+
+class ESPSimulator:
+    """
+    This is a simulated ESP8266 running the AT firmware, a stand-in for machine.UART on a PC (CPython).
+    Unlike fakeUart.FakeUART it isn't scripted: it keeps the state of the WiFi link, the sockets & MQTT and answers
+    every command the ESP class uses with realistic timing.
+        - every answer byte takes the UART time of the baud-rate, & each command its processing time (SIM_COMMAND_LATENCY)
+        - HTTP responses come from httpHandler after networkLatency, cut into +IPD frames of ipdSize bytes
+        - a command written while the previous one is still processed is answered with busy p... & dropped,
+          busyRate adds random busy p... answers on top
+        - URCs: WIFI DISCONNECT (dropWiFi()), +MQTTSUBRECV (publish()) or any raw line (inject())
+    AT+CIPMODE=1 & AT+CIPRECVMODE=1 are not simulated, they answer ERROR.
+
+    Attributes:
+        baudrate (int): Baud-rate of the simulated UART [Default 115200]
+        timeScale (float): Factor for every delay, ex. 0.1 runs ten times faster [Default 1.0]
+        networkLatency (float): Seconds between a complete HTTP request & the first +IPD frame [Default 0.03]
+        ipdSize (int): Maximum payload of one +IPD frame [Default 1460]
+        busyRate (float): Chance of an extra busy p... answer per command [Default 0]
+        httpHandler (function): Called with (method, path, headers dict, body bytes), returns (status code, body bytes[, extra header dict])
+        commandLatency (dict): Processing time per command, a copy of SIM_COMMAND_LATENCY
+        aps (list): Simulated APs, (ssid, password, bssid, channel, rssi) tuples
+        compression (bool): Compress the responses of requests with Accept-Encoding: gzip/deflate [Default True]
+        hosts (dict): DNS entries, host name -> IP (None fails the lookup), other names resolve to a made up 10.x.x.x address
+        commands (int): Number of AT commands received
+        published (list): (topic, payload bytes) of every message published with AT+MQTTPUBRAW, in order
+    """
+
+    def __init__(self, baudRate=115200, timeScale=1.0, networkLatency=0.03, ipdSize=1460, busyRate=0, httpHandler=defaultHttpHandler, seed=1):
+        """
+        The constaructor for ESPSimulator class
+
+        Parameters:
+            baudRate (int): Baud-rate of the simulated UART [Default 115200]
+            timeScale (float): Factor for every delay [Default 1.0]
+            networkLatency (float): Seconds between a complete HTTP request & the first +IPD frame [Default 0.03]
+            ipdSize (int): Maximum payload of one +IPD frame [Default 1460]
+            busyRate (float): Chance of an extra busy p... answer per command [Default 0]
+            httpHandler (function): HTTP server, see defaultHttpHandler()
+            seed (int): Seed of the busy p... randomness, for repeatable runs [Default 1]
+        """
+        self.baudrate = baudRate
+        self.timeScale = timeScale
+        self.networkLatency = networkLatency
+        self.ipdSize = ipdSize
+        self.busyRate = busyRate
+        self.httpHandler = httpHandler
+        self.commandLatency = dict(SIM_COMMAND_LATENCY)
+        self.aps = [("ssid", "pwd", "ca:d7:19:d8:a6:44", 6, -52), ("neighbour", "secret", "b4:75:0e:11:22:33", 1, -71), ("cafe, guest", "", "00:11:22:33:44:55", 11, -83)]
+        self.compression = True
+        self.hosts = dict()
+        self.commands = 0
+        self.published = list()
+        self.__random = random.Random(seed)
+        self.__pending = list()
+        self.__rxData = bytearray()
+        self.__lineEnd = 0
+        self.__busyUntil = 0
+        self.__line = bytearray()
+        self.__echo = True
+        self.__mux = False
+        self.__wifi = None
+        self.__links = dict()
+        self.__sendLeft = 0
+        self.__sendData = bytearray()
+        self.__sendTarget = None
+        self.__sendTopic = None
+
+    def _now(self):
+        return time.monotonic()
+
+    def _emit(self, data, delay=0):
+        """
+        Private function for queueing answer bytes, they follow the previous answer at the UART speed
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        start = max(self._now() + delay*self.timeScale, self.__lineEnd)
+        self.__lineEnd = start + len(data)*10.0/self.baudrate*self.timeScale
+        self.__pending.append([start, self.__lineEnd, data])
+        return self.__lineEnd
+
+    def _release(self):
+        now = self._now()
+        while self.__pending and self.__pending[0][0] <= now:
+            start, end, data = self.__pending[0]
+            if now >= end:
+                self.__rxData += data
+                self.__pending.pop(0)
+            else:
+                # Partly on the wire
+                nbytes = int(len(data)*(now-start)/(end-start))
+                self.__rxData += data[:nbytes]
+                self.__pending[0] = [now, end, data[nbytes:]]
+                break
+
+    def inject(self, data, delay=0):
+        """
+        Send an unsolicited line (ex. "WIFI DISCONNECT\r\n") after delay seconds
+        """
+        self._emit(data, delay)
+
+    def dropWiFi(self, delay=0):
+        """
+        Lose the WiFi link after delay seconds, the sockets are closed
+        """
+        self.__wifi = None
+        for linkId in list(self.__links):
+            self._close(linkId, delay)
+        self._emit("WIFI DISCONNECT\r\n", delay)
+
+    def publish(self, topic, data, delay=0):
+        """
+        Deliver an MQTT message of a subscribed topic (+MQTTSUBRECV) after delay seconds
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        self._emit(b'+MQTTSUBRECV:0,"' + topic.encode() + b'",' + str(len(data)).encode() + b"," + data + b"\r\n", delay)
+
+    def init(self, baudrate=115200, **kwargs):
+        """
+        Like machine.UART.init(), the simulated ESP follows the baud-rate
+        """
+        self.baudrate = baudrate
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        data = bytes(data)
+        pos = 0
+        while pos < len(data):
+            if self.__sendLeft > 0:
+                take = min(self.__sendLeft, len(data)-pos)
+                self.__sendData += data[pos:pos+take]
+                self.__sendLeft -= take
+                pos += take
+                if self.__sendLeft == 0:
+                    self._sendComplete()
+                continue
+            c = data[pos]
+            pos += 1
+            self.__line.append(c)
+            if c == 0x0A:
+                line = bytes(self.__line).rstrip(b"\r\n")
+                self.__line = bytearray()
+                if line:
+                    self._command(line)
+        return len(data)
+
+    def any(self):
+        self._release()
+        return len(self.__rxData)
+
+    def read(self, nbytes=None):
+        self._release()
+        if not self.__rxData:
+            return None
+        if nbytes == None:
+            nbytes = len(self.__rxData)
+        data = bytes(self.__rxData[:nbytes])
+        del self.__rxData[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        self._release()
+        if not self.__rxData:
+            return None
+        if nbytes == None:
+            nbytes = len(buf)
+        nbytes = min(nbytes, len(buf), len(self.__rxData))
+        buf[0:nbytes] = self.__rxData[:nbytes]
+        del self.__rxData[:nbytes]
+        return nbytes
+
+    def _answer(self, name, data):
+        """
+        Private function for the final answer of a command after its processing time, the ESP is busy until then
+        """
+        self.__busyUntil = self._emit(data, self.commandLatency.get(name, SIM_DEFAULT_LATENCY))
+
+    def _linkId(self, params):
+        """
+        Private function for splitting the link ID off the parameters in multi connection mode
+        """
+        if not self.__mux:
+            return 0, params
+        linkId, _, params = params.partition(",")
+        return int(linkId), params
+
+    def _linkPrefix(self, linkId):
+        return "{},".format(linkId) if self.__mux else ""
+
+    def _resolve(self, host):
+        """
+        Private function for the DNS lookup of a host name
+        """
+        if host in self.hosts:
+            return self.hosts[host]
+        checksum = sum(host.encode())
+        return "10.{}.{}.{}".format(len(host) % 256, checksum // 256 % 256, checksum % 256)
+
+    def _close(self, linkId, delay=0):
+        if linkId in self.__links:
+            del self.__links[linkId]
+            self._emit("{}CLOSED\r\n".format(self._linkPrefix(linkId)), delay)
+
+    def _command(self, line):
+        """
+        Private function for executing one AT command line
+        """
+        self.commands += 1
+        if self.__echo:
+            self._emit(line + b"\r\n")
+        if self._now() < self.__busyUntil or (self.busyRate > 0 and self.__random.random() < self.busyRate):
+            self._emit("busy p...\r\n")
+            return
+        try:
+            text = str(line, "utf-8")
+        except UnicodeError:
+            self._emit("\r\nERROR\r\n")
+            return
+        end = len(text)
+        for separator in ("=", "?"):
+            index = text.find(separator)
+            if 0 <= index < end:
+                end = index
+        name = text[:end]
+        params = text[end+1:]
+        query = text[end:end+1] == "?"
+
+        if name == "AT" or name in ("AT+CWLAPOPT", "AT+MQTTUSERCFG", "AT+MQTTSUB", "AT+MQTTCLEAN", "AT+CIPSNTPCFG", "AT+CWMODE_DEF"):
+            self._answer(name, "\r\nOK\r\n")
+        elif name == "ATE0" or name == "ATE1":
+            self.__echo = name == "ATE1"
+            self._answer(name, "\r\nOK\r\n")
+        elif name == "AT+RST" or name == "AT+RESTORE":
+            self.__wifi = None
+            self.__links = dict()
+            self.__mux = False
+            self.__echo = True
+            self._answer(name, "\r\nOK\r\n")
+            self._emit("\r\n ets Jan  8 2013,rst cause:2, boot mode:(3,6)\r\n\r\nready\r\n", 0.3)
+        elif name == "AT+GMR":
+            self._answer(name, _VERSION + b"\r\nOK\r\n")
+        elif name.startswith("AT+CWMODE"):
+            self._answer(name, "+{}:3\r\n\r\nOK\r\n".format(name[3:]) if query else "\r\nOK\r\n")
+        elif name == "AT+CWJAP":
+            self._joinAP(name, params, query)
+        elif name == "AT+CWQAP":
+            self.__wifi = None
+            self._answer(name, "\r\nOK\r\nWIFI DISCONNECT\r\n")
+        elif name == "AT+CWLAP":
+            lines = "".join('+CWLAP:(3,"{}",{},"{}",{})\r\n'.format(ap[0], ap[4], ap[2], ap[3]) for ap in sorted(self.aps, key=lambda ap: -ap[4]))
+            self._answer(name, lines + "\r\nOK\r\n")
+        elif name == "AT+UART_CUR":
+            self._answer(name, "\r\nOK\r\n")
+            self.baudrate = int(params.split(",")[0])
+        elif name == "AT+CIPMUX":
+            self.__mux = params == "1"
+            self._answer(name, "\r\nOK\r\n")
+        elif name == "AT+CIPDOMAIN":
+            ip = self._resolve(params.strip('"')) if self.__wifi != None else None
+            self._answer(name, "+CIPDOMAIN:{}\r\n\r\nOK\r\n".format(ip) if ip != None else "DNS Fail\r\n\r\nERROR\r\n")
+        elif name == "AT+CIPSSLCSNI":
+            self._answer(name, "\r\nOK\r\n")
+        elif name == "AT+CIPMODE" or name == "AT+CIPRECVMODE":
+            self._answer(name, "\r\nOK\r\n" if params == "0" else "\r\nERROR\r\n")
+        elif name == "AT+CIPSTART":
+            linkId, params = self._linkId(params)
+            if self.__wifi == None:
+                self._answer(name, "\r\nERROR\r\nCLOSED\r\n")
+            elif linkId in self.__links:
+                self._answer(name, "ALREADY CONNECTED\r\n\r\nERROR\r\n")
+            else:
+                host = params.split(",")[1].strip('"')
+                if not isIP(host):
+                    if self._resolve(host) == None:
+                        self._answer(name, "DNS Fail\r\n\r\nERROR\r\n")
+                        return
+                    # The ESP looks the name up first
+                    self._emit("", self.commandLatency["AT+CIPDOMAIN"])
+                self.__links[linkId] = bytearray()
+                if params.startswith('"SSL"'):
+                    # The TLS handshake delays the answer
+                    self._emit("", 0.8)
+                self._answer(name, "{}CONNECT\r\n\r\nOK\r\n".format(self._linkPrefix(linkId)))
+        elif name == "AT+CIPSEND":
+            linkId, params = self._linkId(params)
+            if linkId not in self.__links:
+                self._answer(name, "link is not valid\r\n\r\nERROR\r\n")
+            else:
+                self._answer(name, "\r\nOK\r\n> ")
+                self.__sendTarget = linkId
+                self.__sendLeft = int(params)
+                self.__sendData = bytearray()
+        elif name == "AT+CIPCLOSE":
+            linkId, params = self._linkId(params if params else "0")
+            if linkId in self.__links:
+                self._close(linkId)
+                self._answer(name, "\r\nOK\r\n")
+            else:
+                self._answer(name, "\r\nERROR\r\n")
+        elif name == "AT+CIPSNTPTIME":
+            self._answer(name, "+CIPSNTPTIME:Thu Jan 01 00:00:00 1970\r\nOK\r\n")
+        elif name == "AT+MQTTCONN":
+            if self.__wifi == None:
+                self._answer(name, "\r\nERROR\r\n")
+            else:
+                self._answer(name, "\r\nOK\r\n")
+        elif name == "AT+MQTTPUB":
+            self._answer(name, "\r\nOK\r\n" if self.__wifi != None else "\r\nERROR\r\n")
+        elif name == "AT+MQTTPUBRAW":
+            if self.__wifi == None:
+                self._answer(name, "\r\nERROR\r\n")
+            else:
+                self._answer(name, "\r\nOK\r\n\r\n>")
+                self.__sendTarget = "MQTT"
+                self.__sendTopic = params.split('"')[1]
+                self.__sendLeft = int(params.rsplit(",", 3)[1])
+                self.__sendData = bytearray()
+        else:
+            self._answer(name, "\r\nERROR\r\n")
+
+    def _joinAP(self, name, params, query):
+        """
+        Private function for AT+CWJAP, the network exists if it's one of aps with the right password
+        """
+        if query:
+            if self.__wifi == None:
+                self._answer(name, "No AP\r\n\r\nOK\r\n")
+            else:
+                ap = self.__wifi
+                self._answer(name, '+CWJAP:"{}","{}",{},{}\r\n\r\nOK\r\n'.format(ap[0], ap[2], ap[3], ap[4]))
+            return
+        fields = [field.strip('"') for field in params.split('","')]
+        for ap in self.aps:
+            if ap[0] == fields[0] and (len(fields) < 3 or fields[2] == ap[2]):
+                if ap[1] != fields[1]:
+                    self._answer(name, "+CWJAP:2\r\n\r\nFAIL\r\n")
+                    return
+                # A known BSSID skips the scan
+                latency = self.commandLatency[name] / (4 if len(fields) >= 3 else 1)
+                self._emit("WIFI CONNECTED\r\n", latency/2)
+                self.__busyUntil = self._emit("WIFI GOT IP\r\n\r\nOK\r\n", latency/2)
+                self.__wifi = ap
+                return
+        self._answer(name, "+CWJAP:3\r\n\r\nFAIL\r\n")
+
+    def _sendComplete(self):
+        """
+        Private function for the data of AT+CIPSEND/AT+MQTTPUBRAW, once all of it was written
+        """
+        data = bytes(self.__sendData)
+        self.__sendData = bytearray()
+        if self.__sendTarget == "MQTT":
+            self.published.append((self.__sendTopic, data))
+            # The ESP takes the next command while the broker's answer is pending (pipelined QoS 0)
+            self._emit("\r\n+MQTTPUB:OK\r\n", self.commandLatency["AT+MQTTPUB"])
+            return
+        linkId = self.__sendTarget
+        self._emit("\r\nRecv {} bytes\r\n".format(len(data)))
+        self.__busyUntil = self._emit("\r\nSEND OK\r\n", len(data)*10.0/self.baudrate)
+        if linkId not in self.__links:
+            return
+        request = self.__links[linkId]
+        request += data
+        self._serveHttp(linkId, request)
+
+    def _serveHttp(self, linkId, request):
+        """
+        Private function for answering the request of the link once it's complete
+        """
+        headerEnd = request.find(b"\r\n\r\n")
+        if headerEnd < 0:
+            return
+        lines = str(bytes(request[:headerEnd]), "utf-8").split("\r\n")
+        headers = dict()
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = bytes(request[headerEnd+4:])
+        if "content-length" in headers:
+            if len(body) < int(headers["content-length"]):
+                return
+            body = body[:int(headers["content-length"])]
+        elif "chunked" in headers.get("transfer-encoding", ""):
+            if not body.endswith(b"0\r\n\r\n"):
+                return
+            decoded = bytearray()
+            pos = 0
+            while True:
+                sizeEnd = body.find(b"\r\n", pos)
+                size = int(body[pos:sizeEnd], 16)
+                if size == 0:
+                    break
+                decoded += body[sizeEnd+2:sizeEnd+2+size]
+                pos = sizeEnd + 4 + size
+            body = bytes(decoded)
+        del request[:]
+
+        method, path = lines[0].split(" ")[0:2]
+        result = self.httpHandler(method, path, headers, body)
+        status, responseBody = result[0], result[1]
+        accept = headers.get("accept-encoding", "")
+        encoded = len(result) > 2 and "Content-Encoding" in result[2]
+        if self.compression and not encoded and len(responseBody) > 0 and ("gzip" in accept or "deflate" in accept):
+            encoding = "gzip" if "gzip" in accept else "deflate"
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+            responseBody = compressor.compress(responseBody) + compressor.flush()
+            result = (status, responseBody, dict(result[2] if len(result) > 2 else (), **{"Content-Encoding": encoding}))
+        extra = "".join("{}: {}\r\n".format(name, value) for name, value in (result[2].items() if len(result) > 2 else ()))
+        close = headers.get("connection", "").lower() == "close"
+        response = "HTTP/1.1 {} {}\r\nContent-Length: {}\r\nConnection: {}\r\n{}\r\n".format(status, "OK" if status == 200 else "Status", len(responseBody), "close" if close else "keep-alive", extra).encode() + responseBody
+        delay = self.networkLatency
+        for pos in range(0, len(response), self.ipdSize):
+            frame = response[pos:pos+self.ipdSize]
+            self._emit("\r\n+IPD,{}{}:".format(self._linkPrefix(linkId), len(frame)).encode() + frame, delay)
+            delay = 0
+        if close:
+            self._close(linkId)
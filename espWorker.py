@@ -0,0 +1,194 @@
+try:
+    import _thread
+except ImportError:
+    _thread = None
+try:
+    from time import sleep_ms
+except ImportError:
+    import time
+
+    def sleep_ms(ms):
+        time.sleep(ms/1000)
+
+
+class RingBuffer:
+    """
+    This is a class for a bounded single producer, single consumer queue between two cores (or threads) without a lock.
+    The producer only moves the tail, the consumer only moves the head, and a slot is filled before the tail moves past it,
+    so neither side ever sees a half written entry. One slot stays empty to tell a full ring from an empty one.
+    """
+
+    def __init__(self, size=8):
+        """
+        The constaructor for RingBuffer class
+
+        Parameters:
+            size (int): Maximum number of entries [Default 8]
+        """
+        self.__slots = [None]*(size+1)
+        self.__head = 0
+        self.__tail = 0
+
+    def put(self, item):
+        """
+        Append an entry (not None), producer side
+
+        Return:
+            False if the ring is full
+        """
+        tail = self.__tail
+        nextTail = (tail + 1) % len(self.__slots)
+        if nextTail == self.__head:
+            return False
+        self.__slots[tail] = item
+        self.__tail = nextTail
+        return True
+
+    def get(self):
+        """
+        Take the oldest entry, consumer side
+
+        Return:
+            The entry or None if the ring is empty
+        """
+        head = self.__head
+        if head == self.__tail:
+            return None
+        item = self.__slots[head]
+        self.__slots[head] = None
+        self.__head = (head + 1) % len(self.__slots)
+        return item
+
+    def pending(self):
+        """
+        Return the number of entries in the ring
+        """
+        return (self.__tail - self.__head) % len(self.__slots)
+
+
+class ESPWorker:
+    """
+    This is a class for running the ESP driver on the RP2040's second core, started with _thread (on CPython a thread).
+    Core 0 only puts jobs into the request ring & takes the results from the response ring, it never waits for the UART,
+    the ESP or a sleep of the driver. Core 1 runs the jobs one after the other & dispatches the URCs in between, so the
+    URC callbacks run on core 1.
+    While the worker runs, every ESP call must go through it. Start it with ESP.startWorker() instead of creating it directly.
+
+    Attributes:
+        queueLength (int): Size of the request & response rings
+    """
+
+    def __init__(self, esp, queueLength=8):
+        """
+        The constaructor for ESPWorker class
+
+        Parameters:
+            esp (ESP): The ESP object run by the worker
+            queueLength (int): Size of the request & response rings [Default 8]
+        """
+        self.queueLength = queueLength
+        self.__esp = esp
+        self.__requests = RingBuffer(queueLength)
+        self.__responses = RingBuffer(queueLength)
+        self.__nextId = 0
+        self.__running = False
+        self.__stopped = True
+
+    def start(self):
+        """
+        Start the worker on core 1
+
+        Return:
+            False if the port has no _thread
+        """
+        if _thread == None:
+            return False
+        if not self.__stopped:
+            return True
+        self.__running = True
+        self.__stopped = False
+        _thread.start_new_thread(self._run, ())
+        return True
+
+    def stop(self, wait=True):
+        """
+        Let the worker end after the running job, the queued jobs wait for the next start()
+
+        Parameters:
+            wait (bool): Return once the worker has ended [Default True]
+        """
+        self.__running = False
+        while wait and not self.__stopped:
+            sleep_ms(1)
+
+    def isRunning(self):
+        """
+        Return True while the worker thread runs
+        """
+        return not self.__stopped
+
+    def submit(self, method, *args):
+        """
+        Queue a call of an ESP method, without waiting
+
+        Parameters:
+            method (str): Name of the ESP method [ex: "doHttpPost", "mqttPublish"]
+            args: Its arguments
+
+        Return:
+            Job ID, the key of its result in poll(), or None if the request ring is full
+        """
+        jobId = self.__nextId
+        if not self.__requests.put((jobId, method, args)):
+            return None
+        self.__nextId += 1
+        return jobId
+
+    def post(self, host, path, user_agent, content_type, content, port=80, headers=''):
+        """
+        Queue an ESP.doHttpPost(), see submit()
+        """
+        return self.submit("doHttpPost", host, path, user_agent, content_type, content, port, headers)
+
+    def publish(self, topic, data, qos=1, retain=0):
+        """
+        Queue an ESP.mqttPublish(), see submit()
+        """
+        return self.submit("mqttPublish", topic, data, qos, retain)
+
+    def poll(self):
+        """
+        Take the result of the oldest finished job, without waiting
+
+        Return:
+            (job ID, result) tuple or None if no job finished. An exception raised by the job is returned as its result
+        """
+        return self.__responses.get()
+
+    def pending(self):
+        """
+        Return the number of jobs queued & not started yet
+        """
+        return self.__requests.pending()
+
+    def _run(self):
+        """
+        Private function, the loop of core 1
+        """
+        try:
+            while self.__running:
+                job = self.__requests.get()
+                if job == None:
+                    if self.__esp.pollURC() == 0:
+                        sleep_ms(1)
+                    continue
+                jobId, method, args = job
+                try:
+                    result = getattr(self.__esp, method)(*args)
+                except Exception as error:
+                    result = error
+                # Wait for core 0 to take results if the response ring is full
+                while not self.__responses.put((jobId, result)) and self.__running:
+                    sleep_ms(1)
+        finally:
+            self.__stopped = True
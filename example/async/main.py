@@ -0,0 +1,61 @@
+'''
+AsyncESP example: a "sensor" task keeps sampling every 10 msec while the ESP connects to WiFi & does HTTP requests.
+On the Pico it uses the real UART, on a PC (CPython) it runs against the scripted fake UART and prints the sampling jitter.
+'''
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+from asyncEsp import AsyncESP
+import time
+
+try:
+    import machine
+    esp01 = AsyncESP()
+except ImportError:
+    from fakeUart import FakeUART, FakeStream
+    uart = FakeUART(latency=0.005)
+    uart.addResponse("AT\r\n", "\r\nOK\r\n")
+    uart.addResponse("ATE0\r\n", "\r\nOK\r\n")
+    uart.addResponse("AT+CWMODE=", "\r\nOK\r\n")
+    uart.addResponse("AT+CWJAP=", ["WIFI CONNECTED\r\n", "WIFI GOT IP\r\n\r\nOK\r\n"], latency=0.5)
+    uart.addResponse("AT+CIPSTART=", "CONNECT\r\n\r\nOK\r\n", latency=0.1)
+    uart.addResponse("AT+CIPSEND=", "\r\nOK\r\n> ")
+    httpResponse = "HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+    uart.addResponse("GET ", ["\r\nSEND OK\r\n", "\r\n+IPD,{}:{}".format(len(httpResponse), httpResponse), "CLOSED\r\n"], latency=0.1)
+    uart.addResponse("AT+CIPCLOSE\r\n", "\r\nERROR\r\n")
+    esp01 = AsyncESP(stream=FakeStream(uart))
+
+def ticks():
+    try:
+        return time.ticks_ms()
+    except AttributeError:
+        return int(time.monotonic()*1000)
+
+async def sensor(period, stats):
+    last = ticks()
+    while True:
+        await asyncio.sleep(period/1000)
+        now = ticks()
+        stats["samples"] += 1
+        stats["worst"] = max(stats["worst"], now-last-period)
+        last = now
+
+async def network():
+    print("StartUP", await esp01.startUP())
+    print("Echo-Off", await esp01.echoING())
+    print("WiFi Mode", await esp01.setCurrentWiFiMode())
+    print("WiFi", await esp01.connectWiFi("ssid", "pwd"))
+    for _ in range(3):
+        httpCode, httpRes = await esp01.doHttpGet("www.httpbin.org", "/get", "RaspberryPi-Pico")
+        print("HTTP Code:", httpCode, "HTTP Response:", httpRes)
+
+async def main():
+    stats = {"samples": 0, "worst": 0}
+    sampler = asyncio.create_task(sensor(10, stats))
+    start = ticks()
+    await network()
+    sampler.cancel()
+    print("Network took {} ms, sensor sampled {} times, worst sampling jitter {} ms".format(ticks()-start, stats["samples"], stats["worst"]))
+
+asyncio.run(main())
@@ -0,0 +1,37 @@
+'''
+UART throughput benchmark: downloads the same body at every baud-rate and prints the bytes per second.
+Wire the ESP's RTS (GPIO15) to the Pico's GP3 & the ESP's CTS (GPIO13) to GP2 for hardware flow control,
+or drop ctsPin/rtsPin to run without it (above 230400 baud bytes may get lost then).
+'''
+from esp import ESP
+import time
+
+BODY_LENGTH = 32768
+
+esp01 = ESP(ctsPin=2, rtsPin=3)
+print("StartUP", esp01.startUP())
+print("Echo-Off", esp01.echoING())
+esp01.setCurrentWiFiMode()
+print("WiFi", esp01.connectWiFi("ssid", "pwd"))
+esp01.setRecvMode(passive=True)
+
+buf = bytearray(512)
+received = [0]
+
+def count(chunk):
+    received[0] += len(chunk)
+
+for baudRate in (115200, 230400, 460800, 921600):
+    if baudRate != esp01.getBaudRate() and not esp01.setBaudRate(baudRate):
+        print("{:>7} baud  link check failed".format(baudRate))
+        continue
+    api = esp01.session("www.httpbin.org", 80)
+    received[0] = 0
+    start = time.ticks_ms()
+    httpCode, _ = api.get("/bytes/{}".format(BODY_LENGTH), onBody=count, bodyBuffer=buf)
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    api.close()
+    print("{:>7} baud  HTTP {}  {:>6} bytes  {:>6} ms  {:>7} bytes/s".format(baudRate, httpCode, received[0], elapsed, received[0]*1000//max(elapsed, 1)))
+
+# Back to the power-on baud-rate, so the next run starts from a known state
+esp01.setBaudRate(115200)
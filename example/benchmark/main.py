@@ -0,0 +1,81 @@
+'''
+Benchmark of the ESP driver on a PC (CPython) against the simulated ESP of espSimulator.py.
+Per operation it prints the latency (median & 95th percentile), the throughput & the Python heap the driver allocates.
+Add the repo root to PYTHONPATH (or copy the library files next to this file) and run: python3 main.py [iterations] [timeScale]
+    timeScale 0 (default) leaves out the UART & network time, so only the driver's own overhead is measured.
+    timeScale 1 runs with the simulated 115200 baud UART & network latency, like on the device.
+The heap columns come from tracemalloc & include the buffers of the simulator, "heap kept" is mostly the last response.
+Keep the output of a release & compare, a slower median or a bigger heap peak is a regression.
+'''
+from esp import ESP
+from espSimulator import ESPSimulator
+import sys
+import time
+import tracemalloc
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+TIME_SCALE = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+sim = ESPSimulator(timeScale=TIME_SCALE)
+esp01 = ESP(uartObj=sim)
+esp01.startUP()
+esp01.echoING()
+esp01.setCurrentWiFiMode(1)
+esp01.connectWiFi("ssid", "pwd")
+esp01.mqttUserConf(1, "bench", "", "")
+esp01.mqttConnectionConf("broker", 1883)
+
+postBody = '{"sensor": "bench", "values": [' + ", ".join(str(value) for value in range(100)) + ']}'
+
+def httpGet():
+    httpCode, httpRes = esp01.doHttpGet("bench", "/bytes/4096")
+    return len(httpRes) if httpCode == 200 else 0
+
+def httpPost():
+    httpCode, httpRes = esp01.doHttpPost("bench", "/post", "RPi-Pico", "application/json", postBody)
+    return len(postBody) if httpCode == 200 else 0
+
+def mqttPublish():
+    return 64 if esp01.mqttPublish("bench/data", "x"*64, qos=0) == "OK" else 0
+
+def listenForIncome():
+    sim.publish("bench/in", "y"*64)
+    return 64 if esp01.listenForIncome()[0] == "+MQTTSUBRECV:0" else 0
+
+def run(name, operation):
+    latencies = list()
+    nbytes = 0
+    failed = 0
+    # Warm up, the first call allocates the reused buffers
+    operation()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for count in range(ITERATIONS):
+        opStart = time.perf_counter()
+        done = operation()
+        latencies.append((time.perf_counter() - opStart) * 1000)
+        if done:
+            nbytes += done
+        else:
+            failed += 1
+    total = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    print("{:<16} {:>9.3f} {:>9.3f} {:>9.1f} {:>10.1f} {:>10} {:>10} {:>6}".format(
+        name, latencies[len(latencies)//2], latencies[int(len(latencies)*0.95)], ITERATIONS/total,
+        nbytes/total/1024, peak - before, current - before, failed))
+
+# URCs nobody claimed so far (WIFI CONNECTED, ..) would be taken by listenForIncome()
+while esp01.urc.getURC() != None:
+    pass
+
+print("{} iterations, time scale {}".format(ITERATIONS, TIME_SCALE))
+print("{:<16} {:>9} {:>9} {:>9} {:>10} {:>10} {:>10} {:>6}".format(
+    "operation", "med ms", "p95 ms", "ops/s", "KiB/s", "heap peak", "heap kept", "failed"))
+run("doHttpGet", httpGet)
+run("doHttpPost", httpPost)
+run("mqttPublish", mqttPublish)
+run("listenForIncome", listenForIncome)
+print("{} AT commands".format(sim.commands))
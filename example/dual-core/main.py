@@ -0,0 +1,69 @@
+'''
+Main loop jitter with the ESP driver on the caller's core vs. on the second core (ESP.startWorker()).
+A sampling loop runs every 10 msec & posts a reading every 25th sample, the lateness of each sample is the jitter.
+On a PC (CPython) the ESP is simulated by espSimulator.py at 115200 baud & the worker runs as a thread.
+Add the repo root to PYTHONPATH (or copy the library files next to this file) and run: python3 main.py
+'''
+from esp import ESP
+import time
+
+PERIOD_MS = 10
+SAMPLES = 500
+POST_EVERY = 25
+
+try:
+    from time import ticks_us, ticks_diff, sleep_us
+    import machine
+    esp01 = ESP()
+    esp01.echoING()
+    esp01.setCurrentWiFiMode(1)
+    print("WiFi", esp01.connectWiFi("ssid", "pwd"))
+    host = "www.httpbin.org"
+except ImportError:
+    from espSimulator import ESPSimulator
+    def ticks_us():
+        return int(time.perf_counter()*1000000)
+    def ticks_diff(end, start):
+        return end-start
+    def sleep_us(us):
+        time.sleep(us/1000000)
+    esp01 = ESP(uartObj=ESPSimulator())
+    esp01.echoING()
+    esp01.connectWiFi("ssid", "pwd")
+    host = "sim"
+
+def sampleLoop(post):
+    lateness = list()
+    deadline = ticks_us()
+    for count in range(SAMPLES):
+        deadline += PERIOD_MS*1000
+        wait = ticks_diff(deadline, ticks_us())
+        if wait > 0:
+            sleep_us(wait)
+        lateness.append(max(0, ticks_diff(ticks_us(), deadline)))
+        if count % POST_EVERY == 0:
+            post('{{"sample": {}}}'.format(count))
+    lateness.sort()
+    return lateness[len(lateness)//2], lateness[len(lateness)*99//100], lateness[-1]
+
+def report(name, result):
+    print("{:<12} median {:>7} us   p99 {:>8} us   max {:>8} us".format(name, *result))
+
+report("same core", sampleLoop(lambda data: esp01.doHttpPost(host, "/post", "RPi-Pico", "application/json", data)))
+
+worker = esp01.startWorker()
+results = list()
+def postOnWorker(data):
+    worker.post(host, "/post", "RPi-Pico", "application/json", data)
+    result = worker.poll()
+    while result != None:
+        results.append(result)
+        result = worker.poll()
+report("worker", sampleLoop(postOnWorker))
+while worker.pending() > 0 or len(results) < SAMPLES // POST_EVERY:
+    result = worker.poll()
+    if result != None:
+        results.append(result)
+    time.sleep(0.01)
+worker.stop()
+print("{} posts, {} with HTTP 200".format(len(results), len([result for result in results if result[1][0] == 200])))
@@ -0,0 +1,35 @@
+'''
+Run the ESP library on a PC (CPython) against a scripted fake UART.
+Copy esp.py, httpParser.py & fakeUart.py next to this file (or add the repo root to PYTHONPATH) and run: python3 main.py
+'''
+from fakeUart import FakeUART
+from esp import ESP
+import time
+
+uart = FakeUART(latency=0.005)
+uart.addResponse("AT\r\n", "\r\nOK\r\n")
+uart.addResponse("ATE0\r\n", "ATE0\r\n\r\nOK\r\n")
+uart.addResponse("AT+GMR\r\n", "AT version:1.7.4.0\r\nSDK version:3.0.4\r\ncompile time:May 20 2020\r\n\r\nOK\r\n")
+uart.addResponse("AT+CWMODE=", "\r\nOK\r\n")
+uart.addResponse("AT+CWJAP=", ["WIFI CONNECTED\r\n", "WIFI GOT IP\r\n\r\nOK\r\n"], latency=0.2)
+uart.addResponse("AT+CIPSTART=", "CONNECT\r\n\r\nOK\r\n", latency=0.05)
+uart.addResponse("AT+CIPSEND=", "\r\nOK\r\n> ")
+httpBody = "{\n  \"origin\": \"203.0.113.7\"\n}\n"
+httpResponse = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n{}".format(len(httpBody), httpBody)
+uart.addResponse("GET ", ["\r\nRecv 92 bytes\r\n\r\nSEND OK\r\n", "\r\n+IPD,{}:{}".format(len(httpResponse), httpResponse), "CLOSED\r\n"], latency=0.05)
+uart.addResponse("AT+CIPCLOSE\r\n", "\r\nERROR\r\n")
+
+esp01 = ESP(uartObj=uart)
+
+def timed(name, func, *args):
+    start = time.monotonic()
+    ret = func(*args)
+    print("{:<12} {:>8.1f} ms  {}".format(name, (time.monotonic()-start)*1000, repr(ret)))
+    return ret
+
+timed("StartUP", esp01.startUP)
+timed("Echo-Off", esp01.echoING)
+timed("Version", esp01.getVersion)
+timed("WiFi Mode", esp01.setCurrentWiFiMode)
+timed("WiFi", esp01.connectWiFi, "ssid", "pwd")
+timed("HTTP Get", esp01.doHttpGet, "www.httpbin.org", "/ip", "RaspberryPi-Pico")
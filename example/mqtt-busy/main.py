@@ -0,0 +1,38 @@
+'''
+Check of the pipelined AT+MQTTPUBRAW publishing (ESP.mqttQueue) while the ESP answers busy p... now & then.
+The +MQTTPUB results which arrive before a busy p... must still go to their own message, so every message ID gets
+its own result & the broker gets exactly the messages reported "OK", once & in order.
+On a PC (CPython) the ESP is simulated by espSimulator.py with random busy p... answers.
+Add the repo root to PYTHONPATH (or copy the library files next to this file) and run: python3 main.py [busyRate] [rounds]
+'''
+from esp import ESP
+from espSimulator import ESPSimulator
+import sys
+import time
+
+BUSY_RATE = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+MESSAGES = 8
+
+sim = ESPSimulator(timeScale=0.05, busyRate=BUSY_RATE)
+esp01 = ESP(uartObj=sim)
+esp01.batch(["AT", "ATE0", "AT+CWMODE=1", 'AT+CWJAP="ssid","pwd"', 'AT+MQTTUSERCFG=0,1,"busy","","",0,0,""', 'AT+MQTTCONN=0,"broker",1883,1'], stopOnError=False)
+
+failed = 0
+start = time.time()
+for round in range(ROUNDS):
+    del sim.published[:]
+    sent = dict()
+    for count in range(MESSAGES):
+        data = "round {} message {}".format(round, count)
+        sent[esp01.mqttQueue.publish("busy/test", data)] = data.encode()
+    results = esp01.mqttQueue.flush()
+    # A message the ESP still refused after the busy retries reports "ESP BUSY", but never None or another's result
+    if [msgId for msgId, result in results] != list(sent) or None in [result for msgId, result in results]:
+        print("round", round, "wrong results", results)
+        failed += 1
+    elif [data for topic, data in sim.published] != [sent[msgId] for msgId, result in results if result == "OK"]:
+        print("round", round, "results", results, "but broker got", sim.published)
+        failed += 1
+
+print("{} rounds of {} messages at busyRate {}: {} failed, {:.2f} s".format(ROUNDS, MESSAGES, BUSY_RATE, failed, time.time()-start))
@@ -0,0 +1,58 @@
+'''
+Heap soak test: 10000 keep-alive GET requests, printing the free heap every 500 requests.
+The request buffer & the HTTP parser are reused, so after the first requests gc.mem_free() should stay flat.
+On a PC (CPython) it runs against the scripted fake UART and prints the traced Python heap instead.
+'''
+from esp import ESP
+import gc
+import time
+
+REQUESTS = 10000
+REPORT_EVERY = 500
+
+try:
+    import machine
+    uart = None
+    esp01 = ESP()
+    print("StartUP", esp01.startUP())
+    print("Echo-Off", esp01.echoING())
+    esp01.setCurrentWiFiMode()
+    print("WiFi", esp01.connectWiFi("ssid", "pwd"))
+    host = "www.httpbin.org"
+except ImportError:
+    from fakeUart import FakeUART
+    uart = FakeUART(latency=0)
+    uart.addResponse("AT+CIPSTART=", "CONNECT\r\n\r\nOK\r\n")
+    uart.addResponse("AT+CIPSEND=", "\r\nOK\r\n> ")
+    httpResponse = "HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}"
+    uart.addResponse("GET ", ["\r\nSEND OK\r\n", "\r\n+IPD,{}:{}".format(len(httpResponse), httpResponse)])
+    esp01 = ESP(uartObj=uart)
+    host = "fake"
+
+def memFree():
+    try:
+        return gc.mem_free()
+    except AttributeError:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return -tracemalloc.get_traced_memory()[0]
+
+def discard(chunk):
+    pass
+
+api = esp01.session(host, 80)
+buf = bytearray(256)
+failed = 0
+print("Start mem_free", memFree())
+start = time.time()
+for count in range(1, REQUESTS+1):
+    httpCode, _ = api.get(b"/get", onBody=discard, bodyBuffer=buf)
+    if httpCode != 200:
+        failed += 1
+    if count % REPORT_EVERY == 0:
+        if uart != None:
+            # The fake UART records every write, don't count that as a leak
+            del uart.written[:]
+        gc.collect()
+        print("{:>6} requests  {:>4} failed  mem_free {:>8}  {:>5} s".format(count, failed, memFree(), int(time.time()-start)))
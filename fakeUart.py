@@ -0,0 +1,140 @@
+import time
+import asyncio
+
+
+class FakeUART:
+    """
+    This is a stand-in for machine.UART, used to run the ESP class on a PC (CPython) without a Pico or ESP8266.
+    Every write() is matched against the scripted responses and the matching response becomes readable after its latency.
+
+    Attributes:
+        latency (float): Default delay (in seconds) before a scripted response becomes readable [Default 0.005]
+        baudrate (int): Baud-rate set by init(), only recorded [Default 115200]
+    """
+
+    def __init__(self, latency=0.005):
+        """
+        The constaructor for FakeUART class
+
+        Parameters:
+            latency (float): Default delay (in seconds) before a scripted response becomes readable [Default 0.005]
+        """
+        self.latency=latency
+        self.__rules=list()
+        self.__pending=list()
+        self.__rxData=bytearray()
+        self.written=list()
+        self.baudrate=115200
+
+    def addResponse(self, command, response, latency=None, once=False):
+        """
+        Script the ESP's answer to a command
+
+        Parameters:
+            command (str/bytes): Prefix of the written data this response belongs to
+            response (str/bytes/list): Response data, a list gives segments which are released one after another
+            latency (float): Delay (in seconds) between the write and each response segment [Default FakeUART latency]
+            once (bool): Drop the rule after its first use, ex. for scripting a retry sequence [Default False]
+        """
+        if isinstance(command, str):
+            command = command.encode()
+        if not isinstance(response, list):
+            response = [response]
+        self.__rules.append([command, response, latency, once])
+
+    def inject(self, data, latency=0):
+        """
+        Queue unsolicited data (ex. "WIFI DISCONNECT\r\n") which becomes readable after latency seconds
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        self.__pending.append((time.monotonic()+latency, data))
+        self.__pending.sort(key=lambda item: item[0])
+
+    def init(self, baudrate=115200, **kwargs):
+        """
+        Record the new baud-rate, like machine.UART.init()
+        """
+        self.baudrate=baudrate
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.written.append(bytes(data))
+        for rule in self.__rules:
+            if bytes(data).startswith(rule[0]):
+                latency = self.latency if rule[2] == None else rule[2]
+                readyAt = time.monotonic()
+                for segment in rule[1]:
+                    readyAt += latency
+                    if isinstance(segment, str):
+                        segment = segment.encode()
+                    self.__pending.append((readyAt, segment))
+                self.__pending.sort(key=lambda item: item[0])
+                if rule[3]:
+                    self.__rules.remove(rule)
+                break
+        return len(data)
+
+    def _release(self):
+        now = time.monotonic()
+        while self.__pending and self.__pending[0][0] <= now:
+            self.__rxData += self.__pending.pop(0)[1]
+
+    def any(self):
+        self._release()
+        return len(self.__rxData)
+
+    def read(self, nbytes=None):
+        self._release()
+        if not self.__rxData:
+            return None
+        if nbytes == None:
+            nbytes = len(self.__rxData)
+        data = bytes(self.__rxData[:nbytes])
+        del self.__rxData[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        self._release()
+        if not self.__rxData:
+            return None
+        if nbytes == None:
+            nbytes = len(buf)
+        nbytes = min(nbytes, len(buf), len(self.__rxData))
+        buf[0:nbytes] = self.__rxData[:nbytes]
+        del self.__rxData[:nbytes]
+        return nbytes
+
+
+class FakeStream:
+    """
+    This is a stand-in for the MicroPython asyncio UART stream, used to run AsyncESP under CPython asyncio.
+    It wraps a FakeUART and waits for its scripted responses without blocking the event loop.
+
+    Attributes:
+        uartObj (FakeUART): The scripted fake UART
+        pollDelay (float): Time (in seconds) between checks for new bytes [Default 0.001]
+    """
+
+    def __init__(self, uartObj, pollDelay=0.001):
+        """
+        The constaructor for FakeStream class
+
+        Parameters:
+            uartObj (FakeUART): The scripted fake UART
+            pollDelay (float): Time (in seconds) between checks for new bytes [Default 0.001]
+        """
+        self.uartObj=uartObj
+        self.pollDelay=pollDelay
+
+    def write(self, data):
+        self.uartObj.write(data)
+
+    async def drain(self):
+        pass
+
+    async def readinto(self, buf):
+        while self.uartObj.any() == 0:
+            await asyncio.sleep(self.pollDelay)
+        return self.uartObj.readinto(buf)
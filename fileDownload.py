@@ -0,0 +1,225 @@
+import os
+try:
+    import hashlib
+except ImportError:
+    hashlib = None
+from binascii import hexlify
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    import time
+
+    def ticks_ms():
+        return int(time.monotonic()*1000)
+
+    def ticks_diff(end, start):
+        return end-start
+
+# The file is written as <filePath>.part & renamed once it's complete & verified
+DOWNLOAD_PART_SUFFIX = ".part"
+
+DOWNLOAD_ERROR_HTTP = "HTTP"
+DOWNLOAD_ERROR_CONNECTION = "CONNECTION"
+DOWNLOAD_ERROR_SIZE = "SIZE"
+DOWNLOAD_ERROR_SHA256 = "SHA256"
+# sha256 was given but the port has no hashlib.sha256 to check it
+DOWNLOAD_ERROR_NO_HASHLIB = "NO_HASHLIB"
+
+
+class FileDownload:
+    """
+    This is a class for downloading a file bigger than the heap (ex. firmware) straight to the flash.
+    The body goes through one fixed buffer into <filePath>.part while its SHA-256 is updated piece by piece, so the RAM
+    use doesn't depend on the file size. A cut transfer goes on with a "Range: bytes=<size of the .part file>-" request,
+    also after a reboot. Once complete & verified the .part file is renamed to filePath.
+    Start it with ESP.download() instead of creating it directly.
+
+    Attributes:
+        received (int): Bytes in the file so far
+        total (int): File size, None until the server told it
+        httpCode (int): HTTP status code of the latest response, 0 if the connection was lost
+        complete (bool): True once the file is downloaded & verified
+        error (str): Why the download failed [DOWNLOAD_ERROR_HTTP, _CONNECTION, _SIZE, _SHA256, _NO_HASHLIB], None on success
+    """
+
+    def __init__(self, esp, host, path, filePath, port=80, sha256=None, bufferLength=512, user_agent="RPi-Pico", headers=''):
+        """
+        The constaructor for FileDownload class
+
+        Parameters:
+            esp (ESP): The ESP object used for the requests
+            host (str): Host URL [ex: www.httpbin.org]
+            path (str): URL path of the file
+            filePath (str): Path of the file on the flash
+            port (int): HTTP port number [Default port number 80]
+            sha256 (str): Expected SHA-256 of the file as hex string, needs hashlib.sha256 [Default None, not checked]
+            bufferLength (int): Size of the write buffer [Default 512]
+            user_agent (str): User Agent Name [Default "RPi-Pico"]
+            headers (str): Extra headers, for example Authorization. Remember to add "\r\n" at the end.
+        """
+        self.received = 0
+        self.total = None
+        self.httpCode = None
+        self.complete = False
+        self.error = None
+        self.__esp = esp
+        self.__host = host
+        self.__path = path
+        self.__filePath = filePath
+        self.__partPath = filePath + DOWNLOAD_PART_SUFFIX
+        self.__port = port
+        self.__sha256 = sha256.lower() if sha256 != None else None
+        self.__userAgent = user_agent
+        self.__headers = headers
+        self.__buf = bytearray(bufferLength)
+        self.__hash = None
+        self.__digest = None
+        self.__file = None
+        self.__parser = None
+        self.__onProgress = None
+        self.__startBytes = 0
+        self.__startTime = 0
+        self.__elapsed = 0
+
+    def _resume(self):
+        """
+        Private function for picking up the .part file of an earlier download, its bytes are hashed again through the buffer
+        """
+        self.__hash = hashlib.sha256() if hashlib != None else None
+        self.received = 0
+        try:
+            partFile = open(self.__partPath, "rb")
+        except OSError:
+            return
+        mv = memoryview(self.__buf)
+        with partFile:
+            while True:
+                nbytes = partFile.readinto(self.__buf)
+                if not nbytes:
+                    break
+                if self.__hash != None:
+                    self.__hash.update(mv[:nbytes])
+                self.received += nbytes
+
+    def _onBody(self, data):
+        """
+        Private function taking the body pieces, the first one of a response decides between append & start over
+        """
+        if self.__file == None:
+            httpCode = self.__parser.getHTTPErrCode()
+            if httpCode != 200 and httpCode != 206:
+                # Error page, not the file
+                return
+            if httpCode == 200 and self.received > 0:
+                # The server ignored the Range, the file comes from the start
+                self.__hash = hashlib.sha256() if hashlib != None else None
+                self.received = 0
+                self.__startBytes = 0
+            self.__file = open(self.__partPath, "ab" if httpCode == 206 else "wb")
+        self.__file.write(data)
+        if self.__hash != None:
+            self.__hash.update(data)
+        self.received += len(data)
+        if self.__onProgress != None:
+            self.__onProgress(self.received, self.total)
+
+    def _readTotal(self):
+        """
+        Private function for the file size, from "Content-Range: bytes <first>-<last>/<size>" or the Content-Length
+        """
+        contentRange = self.__parser.getHeader("content-range")
+        if contentRange != None and "/" in contentRange:
+            size = contentRange.rpartition("/")[2]
+            if size.isdigit():
+                self.total = int(size)
+        elif self.__parser.getHTTPErrCode() == 200 and self.__parser.getHeader("content-length") != None:
+            self.total = int(self.__parser.getHeader("content-length"))
+
+    def run(self, attempts=3, onProgress=None):
+        """
+        Download the file, a lost connection is resumed from the received bytes
+
+        Parameters:
+            attempts (int): Number of requests before giving up [Default 3]
+            onProgress (function): Called with (received bytes, total bytes or None) after every written buffer [Default None]
+
+        Return:
+            True once the file is complete & verified
+        """
+        self.__onProgress = onProgress
+        self.error = None
+        if self.__sha256 != None and hashlib == None:
+            # Without a digest every complete file would count as a mismatch & be downloaded again
+            self.error = DOWNLOAD_ERROR_NO_HASHLIB
+            return False
+        if self.__hash == None:
+            self._resume()
+        session = self.__esp.session(self.__host, self.__port, self.__userAgent)
+        self.__parser = session.getParser()
+        self.__startBytes = self.received
+        self.__startTime = ticks_ms()
+        for attempt in range(attempts):
+            headers = self.__headers
+            if self.received > 0:
+                headers += "Range: bytes={}-\r\n".format(self.received)
+            self.__file = None
+            try:
+                self.httpCode, _ = session.request("GET", self.__path, headers, onBody=self._onBody, bodyBuffer=self.__buf)
+            finally:
+                if self.__file != None:
+                    self.__file.close()
+                    self.__file = None
+            self._readTotal()
+            if self.httpCode == 200 or self.httpCode == 206:
+                break
+            if self.httpCode == 416 and self.total == self.received:
+                # The .part file already holds the whole file
+                break
+            if self.httpCode != 0:
+                self.error = DOWNLOAD_ERROR_HTTP
+                break
+        self.__elapsed = ticks_diff(ticks_ms(), self.__startTime)
+        if self.error != None:
+            return False
+        if self.httpCode == 0:
+            self.error = DOWNLOAD_ERROR_CONNECTION
+            return False
+        return self._finish()
+
+    def _finish(self):
+        """
+        Private function for checking size & SHA-256, then moving the .part file to its place
+        """
+        if self.total != None and self.received != self.total:
+            self.error = DOWNLOAD_ERROR_SIZE
+            return False
+        if self.__hash != None:
+            # MicroPython's digest() ends the hash
+            self.__digest = str(hexlify(self.__hash.digest()), "ascii")
+            self.__hash = None
+        if self.__sha256 != None and self.__digest != self.__sha256:
+            # Corrupt, start from scratch next time
+            self.error = DOWNLOAD_ERROR_SHA256
+            os.remove(self.__partPath)
+            return False
+        try:
+            os.remove(self.__filePath)
+        except OSError:
+            pass
+        os.rename(self.__partPath, self.__filePath)
+        self.complete = True
+        return True
+
+    def hexdigest(self):
+        """
+        Return the SHA-256 of the complete file as hex string, None before or if the port has no hashlib.sha256
+        """
+        return self.__digest
+
+    def throughput(self):
+        """
+        Return the download speed of the latest run() in bytes per second
+        """
+        if self.__elapsed <= 0:
+            return 0
+        return (self.received - self.__startBytes) * 1000 // self.__elapsed
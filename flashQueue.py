@@ -0,0 +1,261 @@
+import os
+import struct
+try:
+    from binascii import crc32
+except ImportError:
+    # Port without CRC32 in binascii, a plain sum still finds torn records
+    def crc32(data, crc=0):
+        for c in data:
+            crc = (crc + c) & 0xFFFFFFFF
+        return crc
+
+FLASH_QUEUE_HTTP_POST = 1
+FLASH_QUEUE_MQTT_PUBLISH = 2
+
+_FILE_MAGIC = b"ESPQ"
+# "ESPQ" + generation
+_FILE_HEADER = "<4sI"
+_FILE_HEADER_LENGTH = 8
+_RECORD_MAGIC = 0xA5
+# magic, kind, meta length, data length, CRC32 of meta + data
+_RECORD_HEADER = "<BBHHI"
+_RECORD_HEADER_LENGTH = 10
+# generation, ack cursor
+_ACK_FORMAT = "<II"
+
+
+class FlashQueue:
+    """
+    This is a class for keeping outgoing messages on the Pico's flash while the ESP can't send them.
+    The records are appended to <path>.dat, each with a fixed 10 byte header (kind, meta & data length, CRC32).
+    <path>.ack holds the ack cursor, the offset of the oldest record not sent yet, so sending a record only rewrites
+    these 8 bytes. A record torn by a power loss fails its length or CRC check & is dropped on the next start.
+    Once every record is sent the data file starts over, when it's full the sent records are cut off by copying the
+    rest to a new file. Only one record is in RAM at a time, whatever the size of the backlog.
+
+    Attributes:
+        maxBytes (int): Maximum size of the data file [Default 32768]
+        dropped (int): Number of records not stored because the queue was full
+        corrupted (int): Number of records skipped because of a wrong CRC
+    """
+
+    def __init__(self, path="spool", maxBytes=32768, bufferLength=256):
+        """
+        The constaructor for FlashQueue class
+
+        Parameters:
+            path (str): Path of the queue files without extension [Default "spool"]
+            maxBytes (int): Maximum size of the data file [Default 32768]
+            bufferLength (int): Size of the copy buffer used when the data file is compacted [Default 256]
+        """
+        self.maxBytes = maxBytes
+        self.dropped = 0
+        self.corrupted = 0
+        self.__dataPath = path + ".dat"
+        self.__ackPath = path + ".ack"
+        self.__tmpPath = path + ".tmp"
+        self.__bufferLength = bufferLength
+        self.__gen = 0
+        self.__ack = _FILE_HEADER_LENGTH
+        self.__end = _FILE_HEADER_LENGTH
+        self.__peekEnd = None
+        self._open()
+
+    def _fileSize(self, path):
+        try:
+            return os.stat(path)[6]
+        except OSError:
+            return None
+
+    def _open(self):
+        """
+        Private function for loading the cursors & dropping a torn record at the end of the data file
+        """
+        if self._fileSize(self.__dataPath) == None and self._fileSize(self.__tmpPath) != None:
+            # Power loss in the middle of _compact()
+            os.rename(self.__tmpPath, self.__dataPath)
+        try:
+            with open(self.__dataPath, "rb") as dataFile:
+                header = dataFile.read(_FILE_HEADER_LENGTH)
+        except OSError:
+            header = b""
+        if len(header) != _FILE_HEADER_LENGTH or header[:4] != _FILE_MAGIC:
+            self._create(0)
+            return
+        self.__gen = struct.unpack(_FILE_HEADER, header)[1]
+
+        self.__ack = _FILE_HEADER_LENGTH
+        try:
+            with open(self.__ackPath, "rb") as ackFile:
+                gen, ack = struct.unpack(_ACK_FORMAT, ackFile.read(8))
+            if gen == self.__gen:
+                self.__ack = ack
+        except (OSError, ValueError):
+            pass
+
+        self.__end = self._scan()
+        if self.__end != self._fileSize(self.__dataPath):
+            self._compact()
+
+    def _create(self, gen):
+        """
+        Private function for starting an empty data file
+        """
+        with open(self.__dataPath, "wb") as dataFile:
+            dataFile.write(struct.pack(_FILE_HEADER, _FILE_MAGIC, gen))
+        self.__gen = gen
+        self.__ack = _FILE_HEADER_LENGTH
+        self.__end = _FILE_HEADER_LENGTH
+        self._writeAck()
+
+    def _writeAck(self):
+        with open(self.__ackPath, "wb") as ackFile:
+            ackFile.write(struct.pack(_ACK_FORMAT, self.__gen, self.__ack))
+
+    def _scan(self):
+        """
+        Private function for the end of the last complete record, checking only the headers
+
+        Return:
+            Offset of the write cursor
+        """
+        size = self._fileSize(self.__dataPath)
+        pos = self.__ack
+        with open(self.__dataPath, "rb") as dataFile:
+            dataFile.seek(pos)
+            while True:
+                header = dataFile.read(_RECORD_HEADER_LENGTH)
+                if len(header) != _RECORD_HEADER_LENGTH or header[0] != _RECORD_MAGIC:
+                    return pos
+                magic, kind, metaLen, dataLen, crc = struct.unpack(_RECORD_HEADER, header)
+                if pos + _RECORD_HEADER_LENGTH + metaLen + dataLen > size:
+                    return pos
+                pos += _RECORD_HEADER_LENGTH + metaLen + dataLen
+                dataFile.seek(pos)
+
+    def _compact(self):
+        """
+        Private function for copying the records not sent yet into a new data file
+        """
+        buf = bytearray(self.__bufferLength)
+        mv = memoryview(buf)
+        gen = self.__gen + 1
+        left = self.__end - self.__ack
+        with open(self.__dataPath, "rb") as src:
+            src.seek(self.__ack)
+            with open(self.__tmpPath, "wb") as dst:
+                dst.write(struct.pack(_FILE_HEADER, _FILE_MAGIC, gen))
+                while left > 0:
+                    nbytes = src.readinto(mv[:min(left, len(buf))])
+                    if not nbytes:
+                        break
+                    dst.write(mv[:nbytes])
+                    left -= nbytes
+        os.remove(self.__dataPath)
+        os.rename(self.__tmpPath, self.__dataPath)
+        self.__gen = gen
+        self.__end = _FILE_HEADER_LENGTH + self.__end - self.__ack
+        self.__ack = _FILE_HEADER_LENGTH
+        self.__peekEnd = None
+        self._writeAck()
+
+    def append(self, kind, meta, data):
+        """
+        Store a record at the end of the queue
+
+        Parameters:
+            kind (int): Record type [ex: FLASH_QUEUE_HTTP_POST, FLASH_QUEUE_MQTT_PUBLISH]
+            meta (str/bytes): Everything needed to send the data again, ex. host & path [Maximum 65535 bytes]
+            data (str/bytes): Payload [Maximum 65535 bytes]
+
+        Return:
+            True if stored, False if the queue is full
+        """
+        if isinstance(meta, str):
+            meta = meta.encode()
+        if isinstance(data, str):
+            data = data.encode()
+        length = _RECORD_HEADER_LENGTH + len(meta) + len(data)
+        if self.__end + length > self.maxBytes and self.__ack > _FILE_HEADER_LENGTH:
+            self._compact()
+        if self.__end + length > self.maxBytes or len(meta) > 0xFFFF or len(data) > 0xFFFF:
+            self.dropped += 1
+            return False
+        with open(self.__dataPath, "ab") as dataFile:
+            dataFile.write(struct.pack(_RECORD_HEADER, _RECORD_MAGIC, kind, len(meta), len(data), crc32(data, crc32(meta))))
+            dataFile.write(meta)
+            dataFile.write(data)
+        self.__end += length
+        return True
+
+    def isEmpty(self):
+        """
+        Return True if every record is sent
+        """
+        return self.__ack >= self.__end
+
+    def pendingBytes(self):
+        """
+        Return the number of bytes of the records not sent yet
+        """
+        return self.__end - self.__ack
+
+    def peek(self):
+        """
+        Read the oldest record not sent yet, call ack() once it is sent
+
+        Return:
+            (kind, meta, data) tuple with meta & data as bytes, or None if the queue is empty
+        """
+        pos = self.__ack
+        with open(self.__dataPath, "rb") as dataFile:
+            while pos < self.__end:
+                dataFile.seek(pos)
+                magic, kind, metaLen, dataLen, crc = struct.unpack(_RECORD_HEADER, dataFile.read(_RECORD_HEADER_LENGTH))
+                meta = dataFile.read(metaLen)
+                data = dataFile.read(dataLen)
+                pos += _RECORD_HEADER_LENGTH + metaLen + dataLen
+                if crc32(data, crc32(meta)) == crc:
+                    self.__peekEnd = pos
+                    return kind, meta, data
+                self.corrupted += 1
+                self.__ack = pos
+        return None
+
+    def ack(self, persist=True):
+        """
+        Mark the record of the latest peek() as sent
+
+        Parameters:
+            persist (bool): Write the ack cursor to flash now, with False a power loss sends the record again [Default True]
+        """
+        if self.__peekEnd == None:
+            return
+        self.__ack = self.__peekEnd
+        self.__peekEnd = None
+        if self.__ack >= self.__end:
+            self._create(self.__gen + 1)
+        elif persist:
+            self._writeAck()
+
+    def drain(self, send, batch=8):
+        """
+        Send up to batch records, oldest first, stop at the first one send() couldn't deliver
+
+        Parameters:
+            send (function): Called with (kind, meta, data), returns True once delivered
+            batch (int): Maximum number of records to send [Default 8]
+
+        Return:
+            Number of sent records
+        """
+        count = 0
+        while count < batch:
+            record = self.peek()
+            if record == None or not send(*record):
+                break
+            self.ack(persist=False)
+            count += 1
+        if count > 0 and not self.isEmpty():
+            self._writeAck()
+        return count
@@ -0,0 +1,230 @@
+import os
+import time
+
+_ENTRY_ETAG = 0
+_ENTRY_MODIFIED = 1
+_ENTRY_EXPIRES = 2
+_ENTRY_BODY = 3
+_ENTRY_SIZE = 4
+_ENTRY_FILE = 5
+
+
+def _maxAge(cacheControl):
+    """
+    Private function for the freshness (in seconds) of a Cache-Control header
+
+    Return:
+        Seconds the response may be used without asking the server, 0 to always revalidate, None for no-store
+    """
+    maxAge = 0
+    for directive in cacheControl.lower().split(","):
+        directive = directive.strip()
+        if directive == "no-store":
+            return None
+        if directive == "no-cache":
+            return 0
+        if directive.startswith("max-age="):
+            try:
+                maxAge = int(directive[8:])
+            except ValueError:
+                pass
+    return maxAge
+
+
+class HttpCache:
+    """
+    This is a class for caching GET responses, keyed by host, port & path.
+    A response is kept with its ETag, Last-Modified & Cache-Control max-age. Within max-age it is returned without any
+    request, after that the request asks with If-None-Match/If-Modified-Since and a "304 Not Modified" answer is served
+    from the cache, so only the header crosses the UART. Responses with Cache-Control: no-store, or without validators
+    & max-age, are not kept.
+    Bodies of flashThreshold bytes & more go to files on the flash if a path is given, the others stay in RAM. When a
+    store is full the least recently used entries of it are dropped.
+    Set it as ESP.cache to use it for doHttpGet() & HttpSession.get().
+
+    Attributes:
+        maxBytes (int): Budget for the bodies in RAM [Default 4096]
+        maxFlashBytes (int): Budget for the bodies on the flash [Default 32768]
+        flashThreshold (int): Bodies of this size & bigger go to the flash [Default 1024]
+        hits (int): Responses served within max-age, without a request
+        revalidated (int): Responses served after a 304 Not Modified
+        misses (int): Responses downloaded in full
+    """
+
+    def __init__(self, maxBytes=4096, path=None, maxFlashBytes=32768, flashThreshold=1024):
+        """
+        The constaructor for HttpCache class
+
+        Parameters:
+            maxBytes (int): Budget for the bodies in RAM [Default 4096]
+            path (str): Path prefix of the body files on the flash, ex. "/cache" [Default None, RAM only]
+            maxFlashBytes (int): Budget for the bodies on the flash [Default 32768]
+            flashThreshold (int): Bodies of this size & bigger go to the flash [Default 1024]
+        """
+        self.maxBytes = maxBytes
+        self.maxFlashBytes = maxFlashBytes
+        self.flashThreshold = flashThreshold
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.__path = path
+        self.__entries = dict()
+        # Keys, least recently used first
+        self.__order = list()
+        self.__ramBytes = 0
+        self.__flashBytes = 0
+        self.__nextFile = 0
+
+    def _key(self, host, port, path):
+        if isinstance(host, bytes):
+            host = str(host, "utf-8")
+        if isinstance(path, bytes):
+            path = str(path, "utf-8")
+        return "{}:{}{}".format(host, port, path)
+
+    def lookup(self, host, port, path):
+        """
+        Find the cached response of host:port/path, it becomes the most recently used
+
+        Return:
+            Cache entry or None
+        """
+        key = self._key(host, port, path)
+        entry = self.__entries.get(key)
+        if entry != None:
+            self.__order.remove(key)
+            self.__order.append(key)
+        return entry
+
+    def isFresh(self, entry):
+        """
+        Return True if the entry may be used without asking the server (within max-age)
+        """
+        return time.time() < entry[_ENTRY_EXPIRES]
+
+    def validators(self, entry):
+        """
+        Return the If-None-Match/If-Modified-Since header fields for revalidating the entry
+        """
+        headers = ""
+        if entry[_ENTRY_ETAG] != None:
+            headers += "If-None-Match: {}\r\n".format(entry[_ENTRY_ETAG])
+        if entry[_ENTRY_MODIFIED] != None:
+            headers += "If-Modified-Since: {}\r\n".format(entry[_ENTRY_MODIFIED])
+        return headers
+
+    def getBody(self, entry):
+        """
+        Return the cached body (str), read from the flash if it's stored there
+        """
+        if entry[_ENTRY_FILE] == None:
+            return entry[_ENTRY_BODY]
+        with open(entry[_ENTRY_FILE], "rb") as bodyFile:
+            return str(bodyFile.read(), "utf-8")
+
+    def update(self, host, port, path, entry, httpCode, httpRes, parser):
+        """
+        Take the response of a request, a 304 Not Modified is answered from the cache & a 200 is stored
+
+        Parameters:
+            entry (list): Cache entry used for the validators, or None
+            httpCode (int): HTTP status code of the response
+            httpRes (str): Response body
+            parser (HttpParser): Parser of the response, for its headers
+
+        Return:
+            HTTP error code & HTTP response, 200 & the cached body for a 304
+        """
+        if httpCode == 304 and entry != None:
+            maxAge = _maxAge(parser.getHeader("cache-control", ""))
+            if maxAge != None:
+                entry[_ENTRY_EXPIRES] = time.time() + maxAge
+            entry[_ENTRY_ETAG] = parser.getHeader("etag", entry[_ENTRY_ETAG])
+            entry[_ENTRY_MODIFIED] = parser.getHeader("last-modified", entry[_ENTRY_MODIFIED])
+            self.revalidated += 1
+            return 200, self.getBody(entry)
+        if httpCode == 200 and httpRes != None:
+            self.misses += 1
+            self.store(host, port, path, httpRes, parser.getHeader("etag"), parser.getHeader("last-modified"), parser.getHeader("cache-control", ""))
+        return httpCode, httpRes
+
+    def store(self, host, port, path, body, etag=None, lastModified=None, cacheControl=""):
+        """
+        Keep a response body, dropping the least recently used entries if the store is full
+
+        Return:
+            True if cached
+        """
+        key = self._key(host, port, path)
+        self.remove(key)
+        maxAge = _maxAge(cacheControl)
+        if maxAge == None or (maxAge == 0 and etag == None and lastModified == None):
+            return False
+        size = len(body)
+        onFlash = self.__path != None and size >= self.flashThreshold
+        if size > (self.maxFlashBytes if onFlash else self.maxBytes):
+            return False
+        self._evict(onFlash, size)
+
+        entry = [etag, lastModified, time.time() + maxAge, None, size, None]
+        if onFlash:
+            entry[_ENTRY_FILE] = "{}{}.bin".format(self.__path, self.__nextFile)
+            self.__nextFile += 1
+            try:
+                with open(entry[_ENTRY_FILE], "wb") as bodyFile:
+                    bodyFile.write(body.encode())
+            except OSError:
+                return False
+            self.__flashBytes += size
+        else:
+            entry[_ENTRY_BODY] = body
+            self.__ramBytes += size
+        self.__entries[key] = entry
+        self.__order.append(key)
+        return True
+
+    def _evict(self, onFlash, size):
+        """
+        Private function for dropping the least recently used entries of a store until size bytes fit into it
+        """
+        index = 0
+        while index < len(self.__order):
+            if onFlash and self.__flashBytes + size <= self.maxFlashBytes:
+                return
+            if not onFlash and self.__ramBytes + size <= self.maxBytes:
+                return
+            key = self.__order[index]
+            if (self.__entries[key][_ENTRY_FILE] != None) == onFlash:
+                self.remove(key)
+            else:
+                index += 1
+
+    def remove(self, key):
+        """
+        Drop one entry, key is "<host>:<port><path>"
+        """
+        entry = self.__entries.pop(key, None)
+        if entry == None:
+            return
+        self.__order.remove(key)
+        if entry[_ENTRY_FILE] != None:
+            self.__flashBytes -= entry[_ENTRY_SIZE]
+            try:
+                os.remove(entry[_ENTRY_FILE])
+            except OSError:
+                pass
+        else:
+            self.__ramBytes -= entry[_ENTRY_SIZE]
+
+    def clear(self):
+        """
+        Drop every entry
+        """
+        while self.__order:
+            self.remove(self.__order[0])
+
+    def usedBytes(self):
+        """
+        Return (bytes in RAM, bytes on the flash) of the cached bodies
+        """
+        return self.__ramBytes, self.__flashBytes
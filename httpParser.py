@@ -1,8 +1,36 @@
 
+from atTokenizer import parseIPDHeader
+
+_STATE_HEADER = 0
+_STATE_BODY = 1
+_STATE_CHUNK_SIZE = 2
+_STATE_CHUNK_DATA = 3
+_STATE_CHUNK_END = 4
+_STATE_TRAILER = 5
+_STATE_DONE = 6
+
+
+def _decode(data):
+    """
+    Decode the response bytes into a string, non UTF-8 bytes (ex. a binary or latin-1 body) become "?"
+    """
+    try:
+        return str(data, "utf-8")
+    except UnicodeError:
+        return "".join([chr(c) if c < 0x80 else "?" for c in data])
+
+
 class HttpParser:
     """
     This is a class for parse HTTP response, coming from ESP8266 after complete the Post/Get operation
     Using this class, you parse the HTTP Post/Get operation's response and get HTTP status code, Response.
+    
+    A complete response is parsed with parseHTTP(). For a response which arrives in pieces (ex. on a keep-alive connection)
+    call reset(), then feed() every piece until isComplete() tells the response is over (Content-Length or chunked end reached).
+    
+    By default the body is kept in RAM. For bodies bigger than the free heap set a body callback with setBodySink(),
+    then the body is handed over piece by piece (chunked transfer-encoding already decoded) and never kept whole.
+    A body with Content-Encoding: gzip or deflate is decompressed on the fly, if the port can (see contentDecoder.py).
     """
     
     __httpErrorCode=None
@@ -18,6 +46,278 @@ class HttpParser:
         self.__httpHeader=None
         self.__httpResponseLength=None
         self.__httpResponse=None
+        self.__onBody=None
+        self.__bodyBuffer=None
+        self.__decoder=None
+        # Reused for every response, reset() only empties them
+        self.__headers=dict()
+        self.__pending=bytearray()
+        self.__body=bytearray()
+        self.reset()
+        
+    def setBodySink(self, onBody, bodyBuffer=None):
+        """
+        Stream the body into a callback instead of keeping it in RAM
+        
+        Parameters:
+            onBody (function): Called with every body piece (memoryview, only valid during the call), None keeps the body in RAM again
+            bodyBuffer (bytearray): Caller supplied buffer, when given the pieces are collected into it & onBody
+                                    is called with a memoryview of it each time it is full (and once with the rest at the end) [Default None]
+        """
+        self.__onBody=onBody
+        self.__bodyBuffer=bodyBuffer
+        if bodyBuffer != None:
+            self.__bodyView=memoryview(bodyBuffer)
+        
+    def reset(self):
+        """
+        Prepare the parser for a new response, before the first feed()
+        """
+        self.__httpErrCode=None
+        self.__httpHeader=None
+        self.__httpResponse=None
+        self.__headers.clear()
+        self.__state=_STATE_HEADER
+        del self.__pending[:]
+        del self.__body[:]
+        self.__headerEnd=0
+        self.__bodyLeft=None
+        self.__bodyReceived=0
+        self.__bufferLength=0
+        self.__decoding=False
+        
+    def _parseHeader(self, header):
+        """
+        Private function for parse the status line & header fields
+        """
+        self.__httpHeader=_decode(header)
+        lines=self.__httpHeader.split("\r\n")
+        for code in lines[0].split():
+            if code.isdigit():
+                self.__httpErrCode=int(code)
+                break
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            self.__headers[name.strip().lower()] = value.strip()
+        
+        encoding = self.__headers.get("content-encoding", "").lower()
+        if encoding == "gzip" or encoding == "x-gzip" or encoding == "deflate":
+            # contentDecoder.py is only loaded once a compressed response shows up
+            from contentDecoder import ContentDecoder, decoderAvailable
+            if decoderAvailable():
+                if self.__decoder == None:
+                    # Kept for the next responses, only the decompressor is new for every body
+                    self.__decoder = ContentDecoder(self._output)
+                self.__decoder.reset(encoding)
+                self.__decoding = True
+        
+        if self.__httpErrCode == 204 or self.__httpErrCode == 304 or (self.__httpErrCode != None and self.__httpErrCode < 200):
+            self.__state=_STATE_DONE
+        elif "chunked" in self.__headers.get("transfer-encoding", "").lower():
+            self.__state=_STATE_CHUNK_SIZE
+        elif "content-length" in self.__headers:
+            try:
+                self.__bodyLeft=int(self.__headers["content-length"])
+            except ValueError:
+                self._fail()
+                return
+            self.__state=_STATE_BODY if self.__bodyLeft > 0 else _STATE_DONE
+        else:
+            # No length given, the body ends when the server closes the connection
+            self.__state=_STATE_BODY
+        
+    def _takeHeader(self, data, pos):
+        """
+        Private function for collect the header into the pending buffer up to the blank line, the CR/LF/CR/LF matched
+        so far is kept in __headerEnd, so the end is found across pieces without searching the buffer again
+        
+        Return:
+            Position after the consumed bytes
+        """
+        end=len(data)
+        headerEnd=self.__headerEnd
+        while pos < end and headerEnd < 4:
+            c=data[pos]
+            pos+=1
+            self.__pending.append(c)
+            if c == (0x0D if headerEnd % 2 == 0 else 0x0A):
+                headerEnd+=1
+            elif c == 0x0D:
+                headerEnd=1
+            else:
+                headerEnd=0
+        self.__headerEnd=headerEnd
+        return pos
+        
+    def _takeLine(self, data, pos):
+        """
+        Private function for collect a CRLF terminated line into the pending buffer
+        
+        Return:
+            (position after the consumed bytes, True if the line is complete)
+        """
+        end=len(data)
+        while pos < end:
+            c=data[pos]
+            pos+=1
+            if c == 0x0A:
+                return pos, True
+            if c != 0x0D:
+                self.__pending.append(c)
+        return pos, False
+        
+    def feed(self, data):
+        """
+        Parse the next piece of the HTTP response
+        
+        Parameters:
+            data (bytes/bytearray/memoryview): Raw response bytes, as they are received
+        
+        Return:
+            True once the response is complete
+        """
+        pos=0
+        end=len(data)
+        while pos < end and self.__state != _STATE_DONE:
+            if self.__state == _STATE_HEADER:
+                pos=self._takeHeader(data, pos)
+                if self.__headerEnd < 4:
+                    break
+                # Without the blank line
+                del self.__pending[-4:]
+                self._parseHeader(self.__pending)
+                del self.__pending[:]
+            elif self.__state == _STATE_BODY or self.__state == _STATE_CHUNK_DATA:
+                take=end-pos
+                if self.__bodyLeft != None:
+                    take=min(take, self.__bodyLeft)
+                    self.__bodyLeft-=take
+                self._deliver(data[pos:pos+take])
+                pos+=take
+                if self.__bodyLeft == 0:
+                    self.__state=_STATE_DONE if self.__state == _STATE_BODY else _STATE_CHUNK_END
+            elif self.__state == _STATE_CHUNK_END:
+                pos, complete = self._takeLine(data, pos)
+                if complete:
+                    del self.__pending[:]
+                    self.__state=_STATE_CHUNK_SIZE
+            else:
+                pos, complete = self._takeLine(data, pos)
+                if not complete:
+                    break
+                line=bytes(self.__pending)
+                del self.__pending[:]
+                if self.__state == _STATE_TRAILER:
+                    if len(line) == 0:
+                        self.__state=_STATE_DONE
+                else:
+                    try:
+                        self.__bodyLeft=int(line.split(b";")[0].strip(), 16)
+                    except ValueError:
+                        self._fail()
+                        break
+                    self.__state=_STATE_CHUNK_DATA if self.__bodyLeft > 0 else _STATE_TRAILER
+        
+        if self.__state == _STATE_DONE:
+            self._complete()
+            return True
+        return False
+        
+    def _fail(self):
+        """
+        Private function for a malformed response (ex. a broken Content-Length or chunk size), it ends here with status 0
+        """
+        self.__httpErrCode=0
+        self.__state=_STATE_DONE
+        
+    def _deliver(self, data):
+        """
+        Private function for hand over a body piece to the decompressor or straight to _output()
+        """
+        if self.__decoding:
+            self.__decoder.feed(data)
+        else:
+            self._output(data)
+        
+    def _output(self, data):
+        """
+        Private function for hand over a (decompressed) body piece to the body sink, or keep it in RAM
+        """
+        self.__bodyReceived+=len(data)
+        if self.__onBody == None:
+            self.__body.extend(data)
+        elif self.__bodyBuffer == None:
+            self.__onBody(memoryview(data))
+        else:
+            pos=0
+            size=len(self.__bodyBuffer)
+            while pos < len(data):
+                take=min(len(data)-pos, size-self.__bufferLength)
+                self.__bodyView[self.__bufferLength:self.__bufferLength+take]=data[pos:pos+take]
+                self.__bufferLength+=take
+                pos+=take
+                if self.__bufferLength == size:
+                    self.__onBody(self.__bodyView)
+                    self.__bufferLength=0
+        
+    def finish(self):
+        """
+        Tell the parser that the connection was closed, a body without length ends here
+        
+        Return:
+            HTTP status code, 0 if the response was cut
+        """
+        if self.__state == _STATE_BODY and self.__bodyLeft == None:
+            self.__state=_STATE_DONE
+            self._complete()
+        if self.__state != _STATE_DONE:
+            return 0
+        return self.__httpErrCode
+        
+    def _complete(self):
+        if self.__decoding and not self.__decoder.finish():
+            # Corrupt compressed body, there is no usable response
+            self.__httpErrCode=0
+        if self.__bufferLength > 0:
+            self.__onBody(self.__bodyView[:self.__bufferLength])
+            self.__bufferLength=0
+        if self.__httpErrCode == 200 and self.__onBody == None:
+            self.__httpResponse=_decode(self.__body)
+        else:
+            self.__httpResponse=None
+        
+    def isComplete(self):
+        """
+        Return True once the fed response is complete
+        """
+        return self.__state == _STATE_DONE
+        
+    def isKeepAlive(self):
+        """
+        Return False if the server is going to close the connection after this response, or it was malformed
+        """
+        if self.__httpErrCode == 0:
+            # The rest of a broken response would be taken for the next one
+            return False
+        return self.__headers.get("connection", "").lower() != "close"
+        
+    def getHeader(self, name, default=None):
+        """
+        This funtion use to get a header field of the latest fed response [Name is case insensitive]
+        """
+        return self.__headers.get(name.lower(), default)
+        
+    def getBodyReceived(self):
+        """
+        Return the number of body bytes received so far (after chunked decoding)
+        """
+        return self.__bodyReceived
+        
+    def getBody(self):
+        """
+        Return the raw body bytes of the latest fed response, the buffer is reused & only valid until the next reset()
+        """
+        return self.__body
         
     def parseHTTP(self, httpRes):
         """
@@ -28,21 +328,21 @@ class HttpParser:
         """
         #print(">>>>",httpRes)
         if(httpRes != None):
-            retParseResponse=str(httpRes).partition("+IPD,")[2]
-            #print(">>>>>>>>>>>>>>>>>",retParseResponse)
-            retParseResponse=retParseResponse.split(r"\r\n\r\n");
-            #print(">>>>>>>>>>>>>>>>>",retParseResponse[0])
-            self.__httpResponse = retParseResponse[1]
-            #print(">>>>>>>>>>>>>>>>>???",retParseResponse[1])  
-            self.__httpHeader=str(retParseResponse[0]).partition(":")[2]
-            #print("--",self.__httpHeader)
-            for code in str(self.__httpHeader.partition(r"\r\n")[0]).split():
-                if code.isdigit():
-                    self.__httpErrCode=int(code)
-                    
-            if(self.__httpErrCode != 200):
-                self.__httpResponse=None
-                
+            if isinstance(httpRes, str):
+                httpRes = httpRes.encode()
+            self.reset()
+            # Reassemble the "+IPD,<len>:" frames, exactly <len> bytes of each (anything in between, ex. CLOSED, is not the response)
+            ipdIndex = httpRes.find(b"+IPD,")
+            if ipdIndex < 0:
+                self.feed(httpRes)
+            while ipdIndex >= 0:
+                dataIndex = httpRes.find(b":", ipdIndex)
+                ipdLength = parseIPDHeader(httpRes[ipdIndex:dataIndex])[1]
+                self.feed(memoryview(httpRes)[dataIndex+1:dataIndex+1+ipdLength])
+                ipdIndex = httpRes.find(b"+IPD,", dataIndex+1+ipdLength)
+            self.finish()
+            if self.__httpErrCode == None:
+                return 0
             return self.__httpErrCode
         else:
             return 0
@@ -0,0 +1,110 @@
+from httpParser import HttpParser
+from requestBody import RequestBody
+
+
+class HttpSession:
+    """
+    This is a class for HTTP/1.1 keep-alive requests to one host:port.
+    The TCP/SSL connection is opened on the first request and reused by the next ones, so the ESP doesn't pay a new
+    (TLS) handshake for every request. When the server closes the connection it is reopened on the next request.
+    Get the session of a host with ESP.session(host, port) instead of creating it directly.
+
+    Attributes:
+        host (str): Host URL [ex: www.httpbin.org]
+        port (int): HTTP port number
+        user_agent (str): User Agent Name
+    """
+
+    def __init__(self, esp, host, port=80, user_agent="RPi-Pico"):
+        """
+        The constaructor for HttpSession class
+
+        Parameters:
+            esp (ESP): The ESP object used for the requests
+            host (str): Host URL [ex: www.httpbin.org]
+            port (int): HTTP port number [Default port number 80]
+            user_agent (str): User Agent Name [Default "RPi-Pico"]
+        """
+        self.host = host
+        self.port = port
+        self.user_agent = user_agent
+        self.__esp = esp
+        self.__httpResponse = HttpParser()
+        # Encoded once, so a request copies them without new strings
+        self.__hostBytes = host.encode()
+        self.__userAgentBytes = user_agent.encode()
+
+    def getParser(self):
+        """
+        Return the HttpParser of the latest response, ex. for reading its headers
+        """
+        return self.__httpResponse
+
+    def request(self, method, path, headers='', content=None, content_type=None, onBody=None, bodyBuffer=None):
+        """
+        Do an HTTP request over the kept-alive connection. If no response arrives it's sent once again on a new connection,
+        a POST/PUT only if the ESP didn't take it (no SEND OK), so the server never gets it twice
+
+        Parameter:
+            method (str): HTTP method [ex: "GET", "POST", "PUT"]
+            path (str): URL path [ex: "/ip"]
+            headers (str): Extra headers, for example Authorization. Remember to add "\r\n" at the end.
+            content (str/bytes): Request body, a file, a generator or a RequestBody is streamed in AT+CIPSEND sized slices [Default None]
+            content_type (str): Content type of the body [ex: "application/json"]
+            onBody (function): Stream the response body into this callback instead of returning it, see HttpParser.setBodySink() [Default None]
+            bodyBuffer (bytearray): Caller supplied buffer for onBody [Default None]
+
+        Return:
+            HTTP error code & HTTP response[If error not equal to 200 or the body was streamed then the response is None]
+            On failed return 0 and None
+        """
+        body = None
+        if content != None:
+            body = content if isinstance(content, RequestBody) else RequestBody(content)
+        request, body = self.__esp._buildRequest(method, self.__hostBytes, path, self.__userAgentBytes, headers, b"keep-alive", content_type, body)
+        if request == None:
+            return 0, None
+
+        for attempt in range(2):
+            linkId = self.__esp.pool.acquire(self.host, self.port)
+            if linkId == None:
+                return 0, None
+            self.__httpResponse.reset()
+            self.__httpResponse.setBodySink(onBody, bodyBuffer)
+            if body != None and attempt > 0 and not body.rewind():
+                # A generator can't be sent twice
+                self.__esp.pool.release(linkId, close=True)
+                return 0, None
+            if self.__esp._sendHTTPRequest(request, self.__httpResponse, linkId=linkId, body=body):
+                self.__esp.pool.release(linkId, close=not self.__httpResponse.isKeepAlive())
+                return self.__httpResponse.getHTTPErrCode(), self.__httpResponse.getHTTPResponse()
+            self.__esp.pool.release(linkId, close=True)
+            if self.__httpResponse.getHTTPErrCode() != None:
+                # Response started but the connection went down, a body without length ends with the connection
+                httpCode = self.__httpResponse.finish()
+                return httpCode, self.__httpResponse.getHTTPResponse() if httpCode != 0 else None
+            if self.__esp._requestSent() and method != "GET" and method != "HEAD":
+                # The server may have processed it already, a POST/PUT isn't sent twice
+                return 0, None
+            # Nothing received, most likely the server dropped the idle connection, reconnect & send once again
+        return 0, None
+
+    def get(self, path, headers='', onBody=None, bodyBuffer=None):
+        """
+        Do the HTTP GET request, see request(). Without onBody it goes through the ESP's cache, if one is set
+        """
+        if self.__esp.cache != None and onBody == None:
+            return self.__esp._cachedGet(self.host, self.port, path, headers, lambda headers: self.request("GET", path, headers), self.getParser)
+        return self.request("GET", path, headers, onBody=onBody, bodyBuffer=bodyBuffer)
+
+    def post(self, path, content_type, content, headers=''):
+        """
+        Do the HTTP POST request, see request()
+        """
+        return self.request("POST", path, headers, content, content_type)
+
+    def close(self):
+        """
+        Close the connection, the next request opens a new one
+        """
+        self.__esp.pool.closeHost(self.host, self.port)
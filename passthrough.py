@@ -0,0 +1,80 @@
+class PassthroughStream:
+    """
+    This is a file-like object for the ESP's transparent transmission mode (AT+CIPMODE=1).
+    write() goes straight to the UART & the ESP forwards it to the socket without AT+CIPSEND handshakes, readinto()
+    takes the socket's data straight from the UART. Both go through the ESP object, so the metrics & the trace hook
+    see them. Get it with ESP.openPassthrough(), close() (or leaving the with block) sends "+++" & returns the ESP into
+    AT command mode. No other ESP method may be used while the stream is open.
+    """
+
+    def __init__(self, esp, uartObj):
+        """
+        The constaructor for PassthroughStream class
+
+        Parameters:
+            esp (ESP): The ESP object which opened the passthrough
+            uartObj (obj): The ESP's UART
+        """
+        self.__esp = esp
+        self.__uartObj = uartObj
+        self.__open = True
+
+    def write(self, data):
+        """
+        Send data (bytes, bytearray or memoryview) to the socket
+
+        Return:
+            Number of written bytes
+        """
+        return self.__esp._write(data)
+
+    def readinto(self, buf, nbytes=None):
+        """
+        Read the received socket data into buf, without waiting
+
+        Return:
+            Number of read bytes or None if nothing was received
+        """
+        return self.__esp._readInto(buf, nbytes)
+
+    def read(self, nbytes=None):
+        """
+        Read the received socket data, without waiting
+
+        Return:
+            bytes or None if nothing was received
+        """
+        waiting = self.__uartObj.any()
+        if waiting <= 0:
+            return None
+        if nbytes == None or nbytes > waiting:
+            nbytes = waiting
+        buf = bytearray(nbytes)
+        nbytes = self.__esp._readInto(buf)
+        if not nbytes:
+            return None
+        return bytes(buf[:nbytes])
+
+    def any(self):
+        """
+        Return the number of received bytes waiting in the UART
+        """
+        return self.__uartObj.any()
+
+    def close(self):
+        """
+        Leave the transparent transmission mode & close the socket
+
+        Return:
+            True if the ESP is back in AT command mode
+        """
+        if not self.__open:
+            return True
+        self.__open = False
+        return self.__esp._closePassthrough()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
@@ -0,0 +1,88 @@
+_MSG_ID = 0
+_MSG_TOPIC = 1
+_MSG_DATA = 2
+_MSG_QOS = 3
+_MSG_RETAIN = 4
+
+
+class PublishQueue:
+    """
+    This is a class for publishing many MQTT messages in one go.
+    publish() only queues the message, flush() sends the whole queue with AT+MQTTPUBRAW: the payload goes as raw bytes
+    after the > prompt, so JSON, commas, quotes & binary data need no escaping. QoS 0 messages are pipelined, the next
+    AT+MQTTPUBRAW goes out without waiting for the +MQTTPUB result of the previous one.
+    The ESP object owns the queue, use ESP.mqttQueue instead of creating it directly.
+
+    Attributes:
+        queueLength (int): Maximum number of queued messages, publish() flushes a full queue [Default 32]
+        coalesce (bool): A new QoS 0 message replaces the queued one of the same topic [Default False]
+        onResult (function): Called with (message ID, result) for every sent message [Default None]
+    """
+
+    def __init__(self, esp, queueLength=32, coalesce=False):
+        """
+        The constaructor for PublishQueue class
+
+        Parameters:
+            esp (ESP): The ESP object which sends the messages
+            queueLength (int): Maximum number of queued messages [Default 32]
+            coalesce (bool): A new QoS 0 message replaces the queued one of the same topic [Default False]
+        """
+        self.queueLength = queueLength
+        self.coalesce = coalesce
+        self.onResult = None
+        self.__esp = esp
+        self.__queue = list()
+        self.__nextId = 0
+
+    def publish(self, topic, data, qos=0, retain=0):
+        """
+        Queue a message for the next flush()
+
+        Parameters:
+            topic (str): MQTT topic. Maximum length: 128 bytes.
+            data (str/bytes): MQTT message, sent as it is
+            qos (int): QoS of message, which can be set to 0, 1, or 2 [Default 0]
+            retain (int): retain flag [Default 0]
+
+        Return:
+            Message ID, the key of its result in flush()
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        if self.coalesce and qos == 0:
+            for message in self.__queue:
+                if message[_MSG_TOPIC] == topic and message[_MSG_QOS] == 0:
+                    message[_MSG_DATA] = data
+                    message[_MSG_RETAIN] = retain
+                    return message[_MSG_ID]
+        if len(self.__queue) >= self.queueLength:
+            self.flush()
+        msgId = self.__nextId
+        self.__nextId += 1
+        self.__queue.append([msgId, topic, data, qos, retain])
+        return msgId
+
+    def pending(self):
+        """
+        Return the number of queued messages
+        """
+        return len(self.__queue)
+
+    def flush(self):
+        """
+        Send every queued message
+
+        Return:
+            List of (message ID, result) tuples in publish() order, result is "OK", "FAIL", "ERROR", "ESP BUSY\r\n"
+            or None if the ESP didn't answer
+        """
+        if not self.__queue:
+            return list()
+        queue = self.__queue
+        self.__queue = list()
+        results = self.__esp._mqttPublishRaw(queue)
+        if self.onResult != None:
+            for msgId, result in results:
+                self.onResult(msgId, result)
+        return results
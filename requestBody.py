@@ -0,0 +1,188 @@
+ESP_CIPSEND_MAX = 2048
+
+# Room for the "<hex size>\r\n" line in front of a chunk
+_CHUNK_HEADER_ROOM = 6
+_CHUNK_END = b"0\r\n\r\n"
+
+
+class RequestBody:
+    """
+    This is a class for sending a request body bigger than one AT+CIPSEND (2048 bytes) or bigger than the free heap.
+    The body is cut into slices of at most sliceSize bytes, which are sent one after the other. Only one slice is in RAM.
+
+    The source can be:
+        - a buffer (bytes, bytearray, memoryview or str), sliced without copying
+        - a file opened in binary mode, read with readinto()
+        - a generator or any other iterable of bytes/str pieces
+    When the length is unknown (generators, files which can't seek) the body is sent with
+    "Transfer-Encoding: chunked", otherwise with "Content-Length".
+    """
+
+    def __init__(self, source, length=None, sliceSize=ESP_CIPSEND_MAX):
+        """
+        The constaructor for RequestBody class
+
+        Parameters:
+            source (obj): Buffer, binary file or iterable of bytes, see the class description
+            length (int): Body length in bytes, if the source can't tell it itself [Default None]
+            sliceSize (int): Maximum number of bytes per AT+CIPSEND [Default 2048]
+        """
+        if isinstance(source, str):
+            source = source.encode()
+        self.__sliceSize = sliceSize
+        self.__buf = None
+        self.__pending = None
+        self.__done = False
+        self.__offset = 0
+        self.__file = None
+        self.__filePos = None
+        self.__iter = None
+        self.__source = None
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.__source = memoryview(source)
+            if length == None:
+                length = len(source)
+        elif hasattr(source, "readinto"):
+            self.__file = source
+            self.__filePos = self._filePos(source)
+            if length == None and self.__filePos != None:
+                length = self._fileLength(source)
+        else:
+            self.__iter = iter(source)
+        self.__length = length
+
+    def _filePos(self, fileObj):
+        """
+        Private function for the position of a file, None if it can't seek
+        """
+        try:
+            return fileObj.tell()
+        except (AttributeError, OSError):
+            return None
+
+    def _fileLength(self, fileObj):
+        """
+        Private function for the number of bytes left in a file, None if it can't seek
+        """
+        try:
+            pos = fileObj.tell()
+            end = fileObj.seek(0, 2)
+            if end == None:
+                end = fileObj.tell()
+            fileObj.seek(pos)
+            return end - pos
+        except (AttributeError, OSError):
+            return None
+
+    def isChunked(self):
+        """
+        Return True if the body is sent with chunked transfer-encoding
+        """
+        return self.__length == None
+
+    def getLength(self):
+        """
+        Return the body length in bytes or None if it's unknown
+        """
+        return self.__length
+
+    def rewind(self):
+        """
+        Start the body from the beginning again, ex. for resending it over a new connection
+
+        Return:
+            True on success, False if the source can't go back (generators)
+        """
+        if self.__offset == 0 and not self.__done and self.__pending == None:
+            return True
+        if self.__iter != None:
+            return False
+        if self.__file != None:
+            if self.__filePos == None:
+                return False
+            self.__file.seek(self.__filePos)
+        self.__offset = 0
+        self.__done = False
+        return True
+
+    def _buffer(self):
+        if self.__buf == None:
+            self.__buf = bytearray(self.__sliceSize)
+        return memoryview(self.__buf)
+
+    def _readPiece(self, room):
+        """
+        Private function for the next piece of an iterable source, at most room bytes
+
+        Return:
+            bytes/memoryview or None at the end of the source
+        """
+        while self.__pending == None or len(self.__pending) == 0:
+            try:
+                piece = next(self.__iter)
+            except StopIteration:
+                return None
+            if isinstance(piece, str):
+                piece = piece.encode()
+            self.__pending = memoryview(piece)
+        piece = self.__pending[:room]
+        self.__pending = self.__pending[room:]
+        return piece
+
+    def _fillChunk(self, mv, start, room):
+        """
+        Private function for reading up to room bytes of the source into mv[start:]
+
+        Return:
+            Number of bytes read, 0 at the end of the source
+        """
+        if self.__file != None:
+            return self.__file.readinto(mv[start:start+room]) or 0
+        nbytes = 0
+        while nbytes < room:
+            piece = self._readPiece(room - nbytes)
+            if piece == None:
+                break
+            mv[start+nbytes:start+nbytes+len(piece)] = piece
+            nbytes += len(piece)
+        return nbytes
+
+    def nextSlice(self):
+        """
+        Return the next slice to send (memoryview, only valid until the next call) or None when the body is complete
+        """
+        if self.__done:
+            return None
+
+        if self.__source != None:
+            if self.__offset >= len(self.__source):
+                self.__done = True
+                return None
+            end = min(self.__offset + self.__sliceSize, len(self.__source))
+            data = self.__source[self.__offset:end]
+            self.__offset = end
+            return data
+
+        mv = self._buffer()
+        if not self.isChunked():
+            room = min(self.__sliceSize, self.__length - self.__offset)
+            nbytes = self._fillChunk(mv, 0, room) if room > 0 else 0
+            if nbytes == 0:
+                self.__done = True
+                return None
+            self.__offset += nbytes
+            return mv[:nbytes]
+
+        # Chunked: "<hex size>\r\n<data>\r\n", the last chunk is "0\r\n\r\n"
+        nbytes = self._fillChunk(mv, _CHUNK_HEADER_ROOM, self.__sliceSize - _CHUNK_HEADER_ROOM - 2)
+        if nbytes == 0:
+            self.__done = True
+            return memoryview(_CHUNK_END)
+        header = '{:x}\r\n'.format(nbytes).encode()
+        start = _CHUNK_HEADER_ROOM - len(header)
+        mv[start:_CHUNK_HEADER_ROOM] = header
+        end = _CHUNK_HEADER_ROOM + nbytes
+        mv[end:end+2] = b"\r\n"
+        self.__offset += nbytes
+        return mv[start:end+2]
@@ -0,0 +1,147 @@
+from requestBody import ESP_CIPSEND_MAX
+
+
+class RequestBuilder:
+    """
+    This is a class for building HTTP requests & AT commands in one preallocated bytearray.
+    The pieces are copied into the buffer through a memoryview & numbers are written digit by digit, so building a request
+    doesn't create new strings like str.format() does & the heap doesn't fragment on devices running for days.
+    Pass bytes for the fixed parts (ex. b"GET "), a str is encoded first which costs one temporary object.
+
+    Attributes:
+        overflow (bool): True if a piece didn't fit since the last reset()
+    """
+
+    def __init__(self, bufferLength=ESP_CIPSEND_MAX):
+        """
+        The constaructor for RequestBuilder class
+
+        Parameters:
+            bufferLength (int): Size of the buffer in bytes [Default 2048, one AT+CIPSEND]
+        """
+        self.__buf = bytearray(bufferLength)
+        self.__mv = memoryview(self.__buf)
+        self.__length = 0
+        self.overflow = False
+
+    def reset(self):
+        """
+        Start a new request, the buffer is kept
+        """
+        self.__length = 0
+        self.overflow = False
+
+    def add(self, data):
+        """
+        Append bytes (or a str) to the request
+
+        Return:
+            False if it didn't fit, the request is then incomplete
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        end = self.__length + len(data)
+        if end > len(self.__buf):
+            self.overflow = True
+            return False
+        self.__mv[self.__length:end] = data
+        self.__length = end
+        return True
+
+    def addInt(self, value):
+        """
+        Append a non-negative integer in decimal, without creating a string
+
+        Return:
+            False if it didn't fit
+        """
+        digits = 1
+        rest = value // 10
+        while rest > 0:
+            digits += 1
+            rest //= 10
+        end = self.__length + digits
+        if end > len(self.__buf):
+            self.overflow = True
+            return False
+        pos = end
+        while digits > 0:
+            pos -= 1
+            self.__buf[pos] = 0x30 + value % 10
+            value //= 10
+            digits -= 1
+        self.__length = end
+        return True
+
+    def addHeader(self, name, value):
+        """
+        Append a "<name>: <value>\r\n" header field, value can be str, bytes or int
+
+        Return:
+            False if it didn't fit
+        """
+        self.add(name)
+        self.add(b": ")
+        if isinstance(value, int):
+            self.addInt(value)
+        else:
+            self.add(value)
+        return self.add(b"\r\n")
+
+    def getLength(self):
+        """
+        Return the number of bytes in the request
+        """
+        return self.__length
+
+    def space(self):
+        """
+        Return the number of free bytes in the buffer
+        """
+        return len(self.__buf) - self.__length
+
+    def getRequest(self):
+        """
+        Return the request as memoryview of the buffer, only valid until the next reset()
+        """
+        return self.__mv[:self.__length]
+
+    def httpRequest(self, method, host, path, user_agent, headers, connection, content_type=None, body=None, acceptEncoding=False):
+        """
+        Write an HTTP request, the body is copied behind the header if it fits into one AT+CIPSEND, otherwise it's
+        sent afterwards in slices. Bytes arguments are copied as they are, a str is encoded first.
+
+        Parameters:
+            body (RequestBody): Request body [Default None]
+            acceptEncoding (bool): Ask for a gzip/deflate compressed response [Default False]
+
+        Return:
+            (request memoryview, RequestBody still to send or None), (None, None) if the header itself doesn't fit
+        """
+        self.reset()
+        self.add(method)
+        self.add(b" ")
+        self.add(path)
+        self.add(b" HTTP/1.1\r\n")
+        self.add(headers)
+        self.addHeader(b"Host", host)
+        self.addHeader(b"User-Agent", user_agent)
+        self.addHeader(b"Connection", connection)
+        if acceptEncoding:
+            self.add(b"Accept-Encoding: gzip, deflate\r\n")
+        if body != None:
+            self.addHeader(b"Content-Type", content_type)
+            if body.isChunked():
+                self.addHeader(b"Transfer-Encoding", b"chunked")
+            else:
+                self.addHeader(b"Content-Length", body.getLength())
+        self.add(b"\r\n")
+        if self.overflow:
+            return None, None
+        if body != None and not body.isChunked() and body.getLength() <= self.space():
+            data = body.nextSlice()
+            while data != None:
+                self.add(data)
+                data = body.nextSlice()
+            body = None
+        return self.getRequest(), body
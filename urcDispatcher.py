@@ -0,0 +1,196 @@
+MQTT_SUBRECV_PREFIX = b"+MQTTSUBRECV:"
+
+
+def parseSubRecv(line):
+    """
+    Split a "+MQTTSUBRECV:<LinkID>,"<topic>",<length>,<data>" line, the data may hold any byte (commas, CR/LF, ..)
+
+    Return:
+        (topic, data) tuple, topic as string & data as bytes, or None if the line is malformed
+    """
+    topicStart = line.find(b',"')
+    topicEnd = line.find(b'",', topicStart+2)
+    lengthEnd = line.find(b",", topicEnd+2)
+    if topicStart < 0 or topicEnd < 0 or lengthEnd < 0:
+        return None
+    try:
+        length = int(line[topicEnd+2:lengthEnd])
+        topic = str(line[topicStart+2:topicEnd], "utf-8")
+    except (ValueError, UnicodeError):
+        return None
+    return topic, line[lengthEnd+1:lengthEnd+1+length]
+
+
+def _text(data):
+    try:
+        return str(data, "utf-8")
+    except UnicodeError:
+        return "".join([chr(c) if c < 0x80 else "?" for c in data])
+
+
+def splitURC(line):
+    """
+    Split a URC line into its comma separated fields (str), the listenForIncome() result.
+    The data of +MQTTSUBRECV stays one field: ["+MQTTSUBRECV:<LinkID>", '"<topic>"', "<length>", "<data>"]
+    """
+    if line.startswith(MQTT_SUBRECV_PREFIX):
+        message = parseSubRecv(line)
+        if message != None:
+            return [_text(line[:line.find(b",")]), '"' + message[0] + '"', str(len(message[1])), _text(message[1])]
+    return _text(line).split(",")
+
+
+class URCDispatcher:
+    """
+    This is a class for routing the ESP's unsolicited result codes (URC), like +MQTTSUBRECV, WIFI DISCONNECT or +IPD.
+    The ESP class hands over every URC it reads, so they never end up in the response of the running AT command.
+
+    A URC goes to:
+        - every callback registered for a matching prefix
+        - the queue of its MQTT topic, for +MQTTSUBRECV of a topic added with addQueue()
+        - otherwise the general backlog, read by ESP.listenForIncome(), unless it's part of the running command's reply
+          (ex. WIFI GOT IP during AT+CWJAP)
+    The queues are bounded, when one is full the oldest entry is dropped and counted in dropped.
+
+    Attributes:
+        queueLength (int): Maximum number of entries per queue [Default 8]
+        dropped (int): Number of URCs dropped from full queues
+    """
+
+    def __init__(self, queueLength=8):
+        """
+        The constaructor for URCDispatcher class
+
+        Parameters:
+            queueLength (int): Maximum number of entries per queue [Default 8]
+        """
+        self.queueLength = queueLength
+        self.dropped = 0
+        self.__callbacks = list()
+        self.__queues = dict()
+        self.__backlog = list()
+        self.__message = None
+        self.__messageLeft = 0
+
+    def register(self, prefix, callback):
+        """
+        Call callback(line) for every URC starting with prefix
+
+        Parameters:
+            prefix (str/bytes): URC prefix, ex. "WIFI " or "+MQTTSUBRECV"
+            callback (function): Called with the complete URC line (bytes)
+        """
+        if isinstance(prefix, str):
+            prefix = prefix.encode()
+        self.__callbacks.append((prefix, callback))
+
+    def unregister(self, prefix, callback=None):
+        """
+        Remove the callbacks of prefix, only the given callback if it's not None
+        """
+        if isinstance(prefix, str):
+            prefix = prefix.encode()
+        self.__callbacks = [item for item in self.__callbacks if item[0] != prefix or (callback != None and item[1] != callback)]
+
+    def addQueue(self, topic):
+        """
+        Keep the +MQTTSUBRECV messages of topic in their own queue, read them with getMessage(topic)
+        """
+        if topic not in self.__queues:
+            self.__queues[topic] = list()
+
+    def removeQueue(self, topic):
+        """
+        Drop the queue of topic with its pending messages
+        """
+        if topic in self.__queues:
+            del self.__queues[topic]
+
+    def _append(self, queue, item):
+        if len(queue) >= self.queueLength:
+            queue.pop(0)
+            self.dropped += 1
+        queue.append(item)
+
+    def dispatch(self, line, reply=()):
+        """
+        Route one URC line (bytes, without CR/LF)
+
+        Parameters:
+            reply (tuple): Byte prefixes of the URCs answering the running AT command, those only go to the callbacks [Default ()]
+        """
+        handled = False
+        for prefix, callback in self.__callbacks:
+            if line.startswith(prefix):
+                callback(line)
+                handled = True
+
+        if line.startswith(MQTT_SUBRECV_PREFIX):
+            message = parseSubRecv(line)
+            if message != None and message[0] in self.__queues:
+                self._append(self.__queues[message[0]], message)
+                return
+
+        if not handled:
+            for prefix in reply:
+                if line.startswith(prefix):
+                    # Already answered by the command's response, listenForIncome() would return it stale later
+                    return
+            self._append(self.__backlog, line)
+
+    def beginMessage(self, header, length):
+        """
+        Start a +MQTTSUBRECV longer than the tokenizer's line, its header "+MQTTSUBRECV:<LinkID>,"<topic>",<length>," came
+        as AT_URC & its payload of length bytes follows as AT_DATA events for messageData()
+        """
+        self.__message = bytearray(header)
+        self.__messageLeft = length
+
+    def messageData(self, data):
+        """
+        Append a payload piece of the message started with beginMessage(), the complete message is dispatched
+
+        Return:
+            True if the message was complete & dispatched
+        """
+        if self.__message == None:
+            return False
+        self.__message.extend(data)
+        self.__messageLeft -= len(data)
+        if self.__messageLeft > 0:
+            return False
+        line = bytes(self.__message)
+        self.__message = None
+        self.dispatch(line)
+        return True
+
+    def getMessage(self, topic):
+        """
+        Take the oldest message of a topic queue
+
+        Return:
+            (topic, data) tuple or None if the queue is empty
+        """
+        queue = self.__queues.get(topic)
+        if queue:
+            return queue.pop(0)
+        return None
+
+    def getURC(self):
+        """
+        Take the oldest URC of the general backlog
+
+        Return:
+            URC line (bytes) or None if the backlog is empty
+        """
+        if self.__backlog:
+            return self.__backlog.pop(0)
+        return None
+
+    def pending(self, topic=None):
+        """
+        Return the number of queued entries of the topic queue, or of the general backlog if topic is None
+        """
+        if topic == None:
+            return len(self.__backlog)
+        return len(self.__queues.get(topic, ()))
@@ -0,0 +1,136 @@
+try:
+    from random import getrandbits
+except ImportError:
+    def getrandbits(bits):
+        return 0
+from esp import ESP_WIFI_CONNECTED, ESP_WIFI_AP_WRONG_PWD, ticks_ms, ticks_diff
+
+WIFI_STATE_DISCONNECTED = 0
+WIFI_STATE_CONNECTING = 1
+WIFI_STATE_CONNECTED = 2
+
+
+class WifiSupervisor:
+    """
+    This is a class for keeping the ESP connected to one WiFi AP.
+    The link state follows the WIFI DISCONNECT & WIFI GOT IP URCs, so isConnected() never touches the UART.
+    Call poll() from the main loop: after a drop the first reconnect is tried at once with the cached BSSID of the AP
+    (no scan for the strongest AP of the SSID), failed attempts are repeated after an exponential backoff with jitter.
+
+    Attributes:
+        state (int): WIFI_STATE_DISCONNECTED, WIFI_STATE_CONNECTING or WIFI_STATE_CONNECTED
+        bssid (str): Cached MAC address of the AP, None until the first connection
+        channel (int): Cached WiFi channel of the AP
+        reconnects (int): Number of successful reconnects after a drop
+        lastResult (str): connectWiFi() result of the latest attempt
+    """
+
+    def __init__(self, esp, ssid, pwd, minBackoff=1, maxBackoff=60):
+        """
+        The constaructor for WifiSupervisor class
+
+        Parameters:
+            esp (ESP): The ESP object to keep connected
+            ssid (str): WiFi AP's SSID
+            pwd (str): WiFi AP's Password
+            minBackoff (float): Seconds to wait after the first failed attempt [Default 1]
+            maxBackoff (float): Longest wait between two attempts in seconds [Default 60]
+        """
+        self.minBackoff = minBackoff
+        self.maxBackoff = maxBackoff
+        self.state = WIFI_STATE_DISCONNECTED
+        self.bssid = None
+        self.channel = None
+        self.reconnects = 0
+        self.lastResult = None
+        self.__esp = esp
+        self.__ssid = ssid
+        self.__pwd = pwd
+        self.__failures = 0
+        self.__lastAttempt = ticks_ms()
+        self.__backoff = 0
+        self.__wasConnected = False
+        esp.urc.register(b"WIFI DISCONNECT", self._onDisconnect)
+        esp.urc.register(b"WIFI GOT IP", self._onGotIP)
+
+    def _onDisconnect(self, line):
+        if self.state == WIFI_STATE_CONNECTED:
+            # Fast reconnect: the first attempt goes out with the next poll()
+            self.state = WIFI_STATE_DISCONNECTED
+            self.__failures = 0
+            self.__backoff = 0
+
+    def _onGotIP(self, line):
+        if self.state == WIFI_STATE_CONNECTING:
+            # Our own connectWiFi(), connect() takes its result
+            return
+        if self.state == WIFI_STATE_DISCONNECTED and self.__wasConnected:
+            # The ESP reconnected on its own (AT+CWAUTOCONN)
+            self.reconnects += 1
+        self.state = WIFI_STATE_CONNECTED
+        self.__wasConnected = True
+
+    def isConnected(self):
+        """
+        Return True if the ESP has an IP address, from the latest URCs, without an AT command
+        """
+        return self.state == WIFI_STATE_CONNECTED
+
+    def poll(self):
+        """
+        Dispatch the pending URCs & reconnect once the backoff time is over
+
+        Return:
+            The link state
+        """
+        self.__esp.pollURC()
+        if self.state == WIFI_STATE_CONNECTED or ticks_diff(ticks_ms(), self.__lastAttempt) < self.__backoff:
+            return self.state
+        return self.connect()
+
+    def connect(self):
+        """
+        Try to connect now, whatever the backoff
+
+        Return:
+            The link state
+        """
+        self.state = WIFI_STATE_CONNECTING
+        self.__lastAttempt = ticks_ms()
+        self.lastResult = self.__esp.connectWiFi(self.__ssid, self.__pwd, self.bssid)
+        if self.lastResult == ESP_WIFI_CONNECTED:
+            if self.__wasConnected:
+                self.reconnects += 1
+            self.state = WIFI_STATE_CONNECTED
+            self.__wasConnected = True
+            self.__failures = 0
+            self.__backoff = 0
+            if self.bssid == None:
+                self._cacheAP()
+            return self.state
+
+        if self.lastResult != ESP_WIFI_AP_WRONG_PWD:
+            # The AP may be gone or moved, the next attempt lets the ESP pick the AP of the SSID again
+            self.bssid = None
+            self.channel = None
+        self.__failures += 1
+        backoff = min(self.maxBackoff, self.minBackoff * (1 << min(self.__failures-1, 16))) * 1000
+        # Jitter between 50% & 100%, so devices dropped by the same AP don't retry in step
+        self.__backoff = int(backoff/2 + backoff/2 * getrandbits(8) / 256)
+        self.state = WIFI_STATE_DISCONNECTED
+        return self.state
+
+    def _cacheAP(self):
+        """
+        Private function for remembering the BSSID & channel of the connected AP
+        """
+        ap = self.__esp.getConnectedAP()
+        if ap != None:
+            self.bssid = ap[1]
+            self.channel = ap[2]
+
+    def getBackoff(self):
+        """
+        Return the milliseconds left until the next reconnect attempt
+        """
+        return max(0, self.__backoff - ticks_diff(ticks_ms(), self.__lastAttempt))